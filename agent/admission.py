@@ -0,0 +1,315 @@
+import os
+import json
+import time
+import atexit
+import asyncio
+import logging
+import tempfile
+import threading
+from collections import deque
+
+from livekit.agents import JobRequest
+from livekit.agents.utils.hw import get_cpu_monitor
+
+from persistence import LoopStallMonitor, io_in_flight
+from latency import get_latency_registry
+
+logger = logging.getLogger(__name__)
+
+
+# Admission control settings
+#   ADMISSION_LOAD_THRESHOLD   load at which the worker reports itself full and
+#                              turns away job requests (LiveKit's load_threshold)
+#   ADMISSION_MAX_SESSIONS     calls at which the session signal reads 1.0
+#   ADMISSION_LOOP_LAG_BUDGET  mean heartbeat lateness (s) of the busiest job
+#                              process at which the lag signal reads 1.0
+#   ADMISSION_IO_BUDGET        run_io() calls in flight, summed over job
+#                              processes, at which the I/O signal reads 1.0
+# With the defaults a worker takes calls until it carries 24 sessions, its
+# busiest event loop runs 75 ms late on average, CPU is at 75% or 48 I/O
+# operations are waiting, whichever comes first.
+ADMISSION_LOAD_THRESHOLD = float(os.getenv("ADMISSION_LOAD_THRESHOLD", "0.75"))
+ADMISSION_MAX_SESSIONS = int(os.getenv("ADMISSION_MAX_SESSIONS", "32"))
+ADMISSION_LOOP_LAG_BUDGET = float(os.getenv("ADMISSION_LOOP_LAG_BUDGET", "0.1"))
+ADMISSION_IO_BUDGET = int(os.getenv("ADMISSION_IO_BUDGET", "64"))
+
+# Job processes publish their loop lag and in-flight I/O here, one JSON
+# file per process, every ADMISSION_REPORT_INTERVAL seconds; the worker
+# ignores reports older than ADMISSION_REPORT_STALE seconds.
+ADMISSION_STATE_DIR = os.getenv("ADMISSION_STATE_DIR", os.path.join(tempfile.gettempdir(), "healthline-load"))
+ADMISSION_REPORT_INTERVAL = 0.5
+ADMISSION_REPORT_STALE = 3.0
+CPU_SAMPLE_INTERVAL = 0.5
+CPU_SAMPLES = 5                 # moving average over 2.5 s, as LiveKit's default load
+
+# Job processes inherit this from the worker's main process, which sets it
+# first, so they know whose directory to report to
+os.environ.setdefault("HEALTHLINE_WORKER_PID", str(os.getpid()))
+
+
+def _reports_dir() -> str:
+    return os.path.join(ADMISSION_STATE_DIR, os.environ["HEALTHLINE_WORKER_PID"])
+
+
+class LoadSignals:
+    """One reading of what limits call quality on this worker."""
+
+    def __init__(self, cpu: float = 0.0, loop_lag: float = 0.0, sessions: int = 0, io_in_flight: int = 0) -> None:
+        self.cpu = cpu
+        self.loop_lag = loop_lag
+        self.sessions = sessions
+        self.io_in_flight = io_in_flight
+
+    def load(self) -> float:
+        """0..1: the most saturated signal against its budget."""
+        return min(1.0, max(
+            self.cpu,
+            self.loop_lag / ADMISSION_LOOP_LAG_BUDGET,
+            self.sessions / ADMISSION_MAX_SESSIONS,
+            self.io_in_flight / ADMISSION_IO_BUDGET,
+        ))
+
+    def as_dict(self) -> dict:
+        return {
+            "load": round(self.load(), 3),
+            "cpu": round(self.cpu, 3),
+            "loop_lag_ms": round(self.loop_lag * 1000, 1),
+            "sessions": self.sessions,
+            "io_in_flight": self.io_in_flight,
+        }
+
+
+class CpuSampler:
+    """Moving average of the worker's CPU use (cgroup-aware), sampled on a daemon thread."""
+
+    def __init__(self) -> None:
+        self._monitor = get_cpu_monitor()
+        self._samples: deque[float] = deque(maxlen=CPU_SAMPLES)
+        self._thread = threading.Thread(target=self._run, name="healthline-cpu-load", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            # Blocks for the sampling interval
+            self._samples.append(self._monitor.cpu_percent(interval=CPU_SAMPLE_INTERVAL))
+
+    def average(self) -> float:
+        samples = list(self._samples)
+        return sum(samples) / len(samples) if samples else 0.0
+
+
+class LoadReporter:
+    """
+    Publishes a job process's event-loop lag and in-flight I/O for the
+    worker's main process, which decides on admission (see
+    AdmissionController). A daemon thread rewrites the report, so a loop
+    that is blocked outright still shows up as lagging.
+    """
+
+    def __init__(self) -> None:
+        self.path = os.path.join(_reports_dir(), f"{os.getpid()}.json")
+        self._monitor: LoopStallMonitor | None = None
+        self._thread: threading.Thread | None = None
+
+    def start(self, loop_monitor: LoopStallMonitor) -> None:
+        self._monitor = loop_monitor
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="healthline-load-report", daemon=True)
+            self._thread.start()
+            atexit.register(self._remove)
+
+    def _run(self) -> None:
+        while True:
+            # One bad sample must not end the thread: the worker would stop seeing this process
+            try:
+                report = {
+                    "pid": os.getpid(),
+                    "at": time.time(),
+                    "loop_lag": self._monitor.recent_lag(),
+                    "io_in_flight": io_in_flight(),
+                }
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(self.path + ".tmp", "w") as f:
+                    f.write(json.dumps(report))
+                os.replace(self.path + ".tmp", self.path)
+            except Exception as e:
+                logger.warning(f"Failed to write load report {self.path}: {e}", exc_info=True)
+            time.sleep(ADMISSION_REPORT_INTERVAL)
+
+    def _remove(self) -> None:
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def read_reports(now: float | None = None) -> list[dict]:
+    """Fresh load reports of this worker's job processes."""
+    now = time.time() if now is None else now
+    reports = []
+    try:
+        names = os.listdir(_reports_dir())
+    except FileNotFoundError:
+        return reports
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(_reports_dir(), name)) as f:
+                report = json.loads(f.read())
+        except (OSError, ValueError):
+            continue
+        if now - report.get("at", 0) <= ADMISSION_REPORT_STALE:
+            reports.append(report)
+    return reports
+
+
+class AdmissionController:
+    """
+    Decides in the worker's main process whether to take a new call.
+
+    load() combines CPU, the worst event-loop lag and the total in-flight
+    I/O reported by job processes, and the number of sessions; LiveKit
+    polls it every 0.5 s and stops dispatching to the worker once it
+    reaches ADMISSION_LOAD_THRESHOLD. Requests that still arrive (several
+    dispatched between two polls, or a spike since the last one) are
+    checked against a fresh reading that also counts the jobs accepted
+    since, and rejected so the server offers them to another worker.
+
+    With local_monitor, this process's own loop lag and I/O are counted
+    too (single-process runs such as benchmarks/load_test.py).
+    """
+
+    def __init__(self, threshold: float = ADMISSION_LOAD_THRESHOLD, local_monitor: LoopStallMonitor | None = None) -> None:
+        self.threshold = threshold
+        self.local_monitor = local_monitor
+        self.last = LoadSignals()
+        self.accepted = 0
+        self.rejected = 0
+        self._active_jobs = 0
+        self._accepted_since_poll = 0
+        self._lock = threading.Lock()
+
+    def signals(self, sessions: int) -> LoadSignals:
+        reports = read_reports()
+        lags = [report.get("loop_lag", 0.0) for report in reports]
+        io = sum(report.get("io_in_flight", 0) for report in reports)
+        if self.local_monitor is not None:
+            lags.append(self.local_monitor.recent_lag())
+            io += io_in_flight()
+        return LoadSignals(
+            cpu=get_cpu_sampler().average(),
+            loop_lag=max(lags, default=0.0),
+            sessions=sessions,
+            io_in_flight=io,
+        )
+
+    def load(self, active_jobs: int) -> float:
+        """Current load, for LiveKit's load_fnc; called from an executor thread."""
+        with self._lock:
+            self._active_jobs = active_jobs
+            self._accepted_since_poll = 0
+        self.last = self.signals(active_jobs)
+        return self.last.load()
+
+    def admit(self, sessions: int | None = None) -> bool:
+        """
+        Whether a new call fits, given the sessions already running
+        (default: active jobs at the last poll plus those accepted since).
+        """
+        if sessions is None:
+            with self._lock:
+                sessions = self._active_jobs + self._accepted_since_poll
+        signals = self.last = self.signals(sessions)
+        admitted = signals.load() < self.threshold
+        with self._lock:
+            if admitted:
+                self.accepted += 1
+                self._accepted_since_poll += 1
+            else:
+                self.rejected += 1
+        get_latency_registry().increment("admission_accepted" if admitted else "admission_rejected")
+        if not admitted:
+            logger.info(f"Rejecting job at load {signals.as_dict()}")
+        return admitted
+
+
+_cpu_sampler: CpuSampler | None = None
+_controller: AdmissionController | None = None
+_reporter: LoadReporter | None = None
+
+
+def get_cpu_sampler() -> CpuSampler:
+    global _cpu_sampler
+
+    if _cpu_sampler is None:
+        _cpu_sampler = CpuSampler()
+    return _cpu_sampler
+
+
+def get_admission_controller() -> AdmissionController:
+    global _controller
+
+    if _controller is None:
+        _controller = AdmissionController()
+    return _controller
+
+
+def get_load_reporter() -> LoadReporter:
+    global _reporter
+
+    if _reporter is None:
+        _reporter = LoadReporter()
+    return _reporter
+
+
+def load_fnc(worker) -> float:
+    """WorkerOptions.load_fnc: combined load of this worker (0..1)."""
+    return get_admission_controller().load(len(worker.active_jobs))
+
+
+async def request_fnc(req: JobRequest) -> None:
+    """
+    WorkerOptions.request_fnc: accept the job if the worker has room for
+    it, otherwise reject it without terminating, so it goes to another worker.
+    """
+    get_latency_registry().start()
+    if get_admission_controller().admit():
+        await req.accept()
+    else:
+        await req.reject(terminate=False)
+
+
+# How long main() blocks the event loop
+CHECK_STALL_SECONDS = 1.5
+
+
+def main() -> None:
+    """
+    Check the load signals end to end: start a reporter for this process,
+    block its event loop, and read the signals back through the report
+    files as the worker's main process does. Fails if that raises, or if
+    the stall does not push the loop-lag signal to its budget.
+    """
+    logging.basicConfig(level=logging.WARNING)
+
+    async def stalled_signals() -> LoadSignals:
+        monitor = LoopStallMonitor()
+        monitor.start()
+        get_load_reporter().start(monitor)
+        await asyncio.sleep(1.0)
+        time.sleep(CHECK_STALL_SECONDS)
+        # Still blocked: the reporter thread has published the stall meanwhile
+        signals = AdmissionController().signals(sessions=1)
+        await monitor.stop()
+        return signals
+
+    signals = asyncio.run(stalled_signals())
+    print(f"signals with the loop stalled for {CHECK_STALL_SECONDS}s: {signals.as_dict()}")
+    if signals.loop_lag < ADMISSION_LOOP_LAG_BUDGET or signals.load() < ADMISSION_LOAD_THRESHOLD:
+        print("FAILED: the stalled loop did not show up in the worker's load")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
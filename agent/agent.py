@@ -1,31 +1,138 @@
 from dotenv import load_dotenv
 import os
+import time
+import asyncio
+import logging
 
 from livekit import agents, rtc
-from livekit.agents import AgentServer, AgentSession, Agent, room_io
+from livekit.agents import AgentServer, AgentSession, Agent, ModelSettings, room_io, llm
 
 from livekit.plugins import noise_cancellation, silero
 from livekit.plugins.turn_detector.multilingual import MultilingualModel
 
 # Imports from your project modules
-from prompt import GENERAL_INSTRUCTIONS, SESSION_GREETING
-from functions import transfer_to_human, end_call, save_appointment, save_medicine_refill_order, get_doctors_list
+from prompt import SESSION_GREETING, RED_FLAG_NOTE, caller_on_file
+from flows import ConversationFlows, set_turn_instructions
+from functions import (
+    transfer_to_human, end_call, save_appointment, save_medicine_refill_order, get_doctors_list, find_available_slots,
+    suggest_specialist, check_appointment, check_refill_order, cancel_appointment, reschedule_appointment,
+)
+from persistence import get_loop_monitor
+from latency import TurnTracer, get_latency_registry
+from idle import IdleMonitor
+from prefetch import AvailabilityPrefetcher
+from patient import PatientProfileLoader, get_patient_profile
+from summaries import CallSummaryRecorder
+from recordings import archive_call_recording, get_recording_archiver
+from admission import ADMISSION_LOAD_THRESHOLD, get_load_reporter, load_fnc, request_fnc
+from specialties import classify
+from tts_cache import cached_tts_node, get_tts_cache
+from inventory import get_inventory
+from records import get_appointment_index, get_refill_index
 
 
 load_dotenv(".env.local")
 
+logger = logging.getLogger(__name__)
+
+# Model and voice; also keys the cached audio of scripted lines
+TTS_VOICE = "elevenlabs/eleven_turbo_v2_5:cgSgspJ2msm6clMCkdW9"
+
 
 class VoiceAssistant(Agent):
     """
     Core Agent class. Loads instructions and function-calling map.
+
+    Instructions start as the core prompt; a flow's steps are added once
+    the caller asks for it or one of its tools runs (see flows.py).
+    Scripted lines are played from the TTS cache (see tts_cache.py).
+    A caller turn mentioning a red-flag symptom gets a note steering the
+    reply towards transfer_to_human (see specialties.py). Caller details
+    already known (see patient.py) are listed so they aren't asked again.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, tts_voice: str = TTS_VOICE) -> None:
+        self.tts_voice = tts_voice
+        self.flows = ConversationFlows()
+        self._instructions_task: asyncio.Task | None = None
         super().__init__(
-            instructions=GENERAL_INSTRUCTIONS,
-            tools = [transfer_to_human, end_call, save_appointment, save_medicine_refill_order, get_doctors_list]
+            instructions=self.flows.instructions,
+            tools = [
+                transfer_to_human, end_call, save_appointment, save_medicine_refill_order, get_doctors_list, find_available_slots,
+                suggest_specialist, check_appointment, check_refill_order, cancel_appointment, reschedule_appointment,
+            ]
         )
 
+    async def on_enter(self) -> None:
+        self.session.on("function_tools_executed", self._on_tools_executed)
+
+    async def on_exit(self) -> None:
+        self.session.off("function_tools_executed", self._on_tools_executed)
+
+    async def on_user_turn_completed(self, turn_ctx: llm.ChatContext, new_message: llm.ChatMessage) -> None:
+        text = new_message.text_content or ""
+        self.flows.enter_from_text(text)
+        instructions = self._current_instructions()
+        if instructions != self.instructions:
+            # Applies to the reply to this turn as well as later ones
+            await self.update_instructions(instructions)
+            set_turn_instructions(turn_ctx, instructions)
+
+        # Escalate severe symptoms without waiting for the LLM to classify them
+        red_flags = classify(text).red_flags
+        if red_flags:
+            get_latency_registry().increment("red_flag_escalations")
+            turn_ctx.add_message(role="system", content=RED_FLAG_NOTE.format(symptoms=", ".join(red_flags)))
+
+    def tts_node(self, text, model_settings: ModelSettings):
+        return cached_tts_node(self, text, model_settings, self.tts_voice)
+
+    def _current_instructions(self) -> str:
+        """Instructions for the flows entered so far and what is known about the caller."""
+        return self.flows.instructions + caller_on_file(get_patient_profile(self.session).known())
+
+    def _on_tools_executed(self, ev) -> None:
+        self.flows.enter_from_tools(call.name for call in ev.function_calls)
+        instructions = self._current_instructions()
+        if instructions != self.instructions:
+            self._instructions_task = asyncio.create_task(self.update_instructions(instructions))
+
+
+def prewarm(proc: agents.JobProcess):
+    """
+    Runs once per worker process, before it is handed any job.
+    Loads the VAD model, the doctor inventory, the booking/refill
+    indexes and the cached audio of scripted lines so calls don't pay for them.
+    Resumes uploads of recordings a previous process left unfinished.
+    """
+
+    started = time.perf_counter()
+
+    proc.userdata["vad"] = silero.VAD.load()
+    get_inventory()
+    get_appointment_index().refresh()
+    get_refill_index().refresh()
+    get_tts_cache().preload(TTS_VOICE)
+    if get_recording_archiver().enabled:
+        get_recording_archiver().resume_pending()
+
+    proc.userdata["prewarm_seconds"] = time.perf_counter() - started
+    logger.info(f"Worker process {proc.pid} prewarmed in {proc.userdata['prewarm_seconds']:.2f}s")
+
+
+def turn_detector(proc: agents.JobProcess) -> MultilingualModel:
+    """
+    The turn detector binds to the process's inference executor through the
+    job context, so it can only be built inside a job; later jobs handled by
+    the same process reuse it.
+    """
+
+    model = proc.userdata.get("turn_detection")
+    if model is None:
+        model = MultilingualModel()
+        proc.userdata["turn_detection"] = model
+    return model
+
 
 async def healthline_agent(ctx: agents.JobContext):
     """
@@ -33,21 +140,65 @@ async def healthline_agent(ctx: agents.JobContext):
     Defines STT, TTS, LLM, VAD, turn detection, noise cancellation settings.
     """
 
+    job_started = time.time()
+
     await ctx.connect(auto_subscribe=agents.AutoSubscribe.AUDIO_ONLY)
 
     print("==================Agent Starting============")
 
+    # Report how long the event loop was blocked while this call was up
+    loop_monitor = get_loop_monitor()
+    stalls_before = loop_monitor.mark()
+    # ... and publish its lag and in-flight I/O for the worker's admission control
+    get_load_reporter().start(loop_monitor)
+
+    async def log_loop_stalls():
+        logger.info(f"Event loop stalls during the call in room {ctx.room.name}: {loop_monitor.stats(stalls_before)}")
+
+    ctx.add_shutdown_callback(log_loop_stalls)
+
     # Create session
     session = AgentSession(
         stt="deepgram/nova-3-medical:en",
         llm="openai/gpt-4.1",
-        tts="elevenlabs/eleven_turbo_v2_5:cgSgspJ2msm6clMCkdW9",
+        tts=TTS_VOICE,
 
-        # VAD + Turn Detection
-        vad=silero.VAD.load(),
-        turn_detection=MultilingualModel(),
+        # VAD + Turn Detection (loaded once per process in prewarm)
+        vad=ctx.proc.userdata.get("vad") or silero.VAD.load(),
+        turn_detection=turn_detector(ctx.proc),
     )
 
+    # Per-turn STT / LLM / tool / TTS / mouth-to-ear latency, plus time to the first greeting
+    tracer = TurnTracer(session, ctx.room.name, job_started_at=job_started)
+    tracer.attach()
+    ctx.add_shutdown_callback(tracer.close)
+
+    # Fetch availability as soon as the caller names a specialty or symptom
+    prefetcher = AvailabilityPrefetcher(session, ctx.room.name)
+    prefetcher.attach()
+    ctx.add_shutdown_callback(prefetcher.close)
+
+    # Look up a returning caller's details from their number
+    profile_loader = PatientProfileLoader(session, ctx.room)
+    profile_loader.attach()
+    ctx.add_shutdown_callback(profile_loader.close)
+
+    # Queue a structured summary of the call once it ends
+    summary_recorder = CallSummaryRecorder(session, ctx.room.name, started_at=job_started)
+    summary_recorder.attach()
+    ctx.add_shutdown_callback(summary_recorder.close)
+
+    # Hand the call's recording to the background archiver
+    async def archive_recording():
+        await archive_call_recording(ctx, session, job_started)
+
+    ctx.add_shutdown_callback(archive_recording)
+
+    # Prompt a silent caller, then end the call if they stay silent
+    idle_monitor = IdleMonitor(session, ctx.room.name)
+    idle_monitor.start()
+    ctx.add_shutdown_callback(idle_monitor.stop)
+
     # Start the agent with audio config
     await session.start(
         room=ctx.room,
@@ -70,6 +221,11 @@ if __name__ == "__main__":
     agents.cli.run_app(
         agents.WorkerOptions(
             entrypoint_fnc=healthline_agent,
+            prewarm_fnc=prewarm,
+            # Take calls only while CPU, loop lag, sessions and I/O leave room (see admission.py)
+            load_fnc=load_fnc,
+            load_threshold=ADMISSION_LOAD_THRESHOLD,
+            request_fnc=request_fnc,
             agent_name="Health-Line-Assistant"
         )
     )
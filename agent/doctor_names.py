@@ -0,0 +1,172 @@
+import re
+
+
+# Words around a name that don't identify the doctor
+TITLES = {"dr", "doctor", "doc", "prof", "professor", "mr", "mrs", "ms", "miss", "madam", "mam", "maam", "sir", "ji"}
+
+_TOKEN = re.compile(r"[a-z]+")
+
+# Soundex-style consonant classes; vowels, h, w and y carry no code
+_CODES = {
+    **dict.fromkeys("bfpv", "1"),
+    **dict.fromkeys("cgjkqsxz", "2"),
+    **dict.fromkeys("dt", "3"),
+    "l": "4",
+    **dict.fromkeys("mn", "5"),
+    "r": "6",
+}
+
+
+def name_tokens(name: str) -> list[str]:
+    return [token for token in _TOKEN.findall(name.casefold()) if token not in TITLES]
+
+
+def normalize_name(name: str) -> str:
+    """ "Dr. Sneha  Rao" → "sneha rao"; also the idempotency form of doctor_name arguments."""
+    return " ".join(name_tokens(name))
+
+
+def doctor_id_for(name: str) -> str:
+    """Stable ID of a doctor listed without one in doctors.json: "Dr. Sneha Rao" → "sneha-rao"."""
+    return "-".join(name_tokens(name))
+
+
+def phonetic_key(token: str) -> str:
+    """
+    Soundex variant that codes the first letter too, so STT spellings
+    such as "Row"/"Rao", "Cavitha"/"Kavitha" and "Nydu"/"Naidu" agree.
+    """
+    # A leading vowel keeps "Iyer" apart from "Rao"
+    key = ["0"] if token[:1] in "aeiouy" else []
+    last = ""
+    for char in token:
+        code = _CODES.get(char, "")
+        if code and code != last:
+            key.append(code)
+        # h and w don't separate repeated codes; vowels do
+        if char not in "hw":
+            last = code
+    return "".join(key[:4])
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance, or limit + 1 once it is known to exceed limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b),
+            ))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def _typo_limit(token: str) -> int:
+    return 0 if len(token) < 4 else 1 if len(token) < 7 else 2
+
+
+class NameMatch:
+    """
+    Outcome of DoctorNameIndex.resolve(): the doctor's ID, or None with
+    the IDs of every doctor the name could mean (none if it matched nobody).
+    """
+
+    def __init__(self, doctor_id: str | None, candidates: list[str] | None = None) -> None:
+        self.doctor_id = doctor_id
+        self.candidates = candidates or []
+
+    @property
+    def ambiguous(self) -> bool:
+        return self.doctor_id is None and len(self.candidates) > 1
+
+    def __bool__(self) -> bool:
+        return self.doctor_id is not None
+
+    def __repr__(self) -> str:
+        return f"NameMatch({self.doctor_id!r}, candidates={self.candidates!r})"
+
+
+class DoctorNameIndex:
+    """
+    Resolves spoken or transcribed doctor names to doctor IDs.
+
+    Every name token is indexed as written and by phonetic key when the
+    index is built. A name resolves when each of its tokens (titles
+    dropped) matches a token of one doctor exactly, phonetically or
+    within a small edit distance, and that doctor matches strictly better
+    than any other. "Dr Row" finds Dr. Sneha Rao; "Dr Sharma" with two
+    Sharmas on staff resolves to nobody and lists both.
+    """
+
+    def __init__(self, doctors: list[tuple[str, str]]) -> None:
+        # doctor ID → (display name, tokens)
+        self._doctors: dict[str, tuple[str, list[str]]] = {}
+        self._exact: dict[str, list[str]] = {}
+        self._by_token: dict[str, set[str]] = {}
+        self._by_phonetic: dict[str, set[str]] = {}
+
+        for doctor_id, name in doctors:
+            tokens = name_tokens(name)
+            self._doctors[doctor_id] = (name, tokens)
+            self._exact.setdefault(" ".join(tokens), []).append(doctor_id)
+            for token in tokens:
+                self._by_token.setdefault(token, set()).add(doctor_id)
+                self._by_phonetic.setdefault(phonetic_key(token), set()).add(doctor_id)
+
+    def __contains__(self, doctor_id: str) -> bool:
+        return doctor_id in self._doctors
+
+    def display_name(self, doctor_id: str) -> str:
+        return self._doctors[doctor_id][0]
+
+    def resolve(self, name: str) -> NameMatch:
+        if name in self._doctors:
+            return NameMatch(name)
+
+        tokens = name_tokens(name)
+        if not tokens:
+            return NameMatch(None)
+
+        exact = self._exact.get(" ".join(tokens), [])
+        if len(exact) == 1:
+            return NameMatch(exact[0])
+
+        # doctor ID → summed cost of matching each spoken token
+        costs: dict[str, int] | None = None
+        for token in tokens:
+            token_costs = self._token_costs(token)
+            if costs is None:
+                costs = token_costs
+            else:
+                costs = {doctor_id: cost + token_costs[doctor_id] for doctor_id, cost in costs.items() if doctor_id in token_costs}
+            if not costs:
+                return NameMatch(None)
+
+        ranked = sorted(costs, key=lambda doctor_id: (costs[doctor_id], doctor_id))
+        if len(ranked) == 1 or costs[ranked[0]] < costs[ranked[1]]:
+            return NameMatch(ranked[0])
+        best = costs[ranked[0]]
+        return NameMatch(None, [doctor_id for doctor_id in ranked if costs[doctor_id] == best])
+
+    def _token_costs(self, token: str) -> dict[str, int]:
+        """Doctors with a token like this one: 0 if spelled the same, 1 if it sounds the same, else 1 + typos."""
+        costs = dict.fromkeys(self._by_token.get(token, ()), 0)
+        for doctor_id in self._by_phonetic.get(phonetic_key(token), ()):
+            costs.setdefault(doctor_id, 1)
+
+        # Correctly heard tokens skip the scan for near misses, as do short ones
+        limit = _typo_limit(token)
+        if limit and token not in self._by_token:
+            for known, doctor_ids in self._by_token.items():
+                distance = edit_distance(token, known, limit)
+                if distance <= limit:
+                    for doctor_id in doctor_ids:
+                        costs[doctor_id] = min(costs.get(doctor_id, distance + 1), distance + 1)
+        return costs
@@ -0,0 +1,94 @@
+import os
+import re
+
+from livekit.agents import llm
+
+from prompt import BOOKING, REFILL, RECORDS, ALL_FLOWS, build_instructions
+
+
+# Set FLOW_PROMPTS=0 to send every flow on every turn (the unsplit prompt),
+# e.g. to compare prompt tokens and TTFT in latency_calls.jsonl
+FLOW_PROMPTS = os.getenv("FLOW_PROMPTS", "1") != "0"
+
+# What a caller says that puts the call into a flow, checked on every turn
+FLOW_TRIGGERS = {
+    BOOKING: re.compile(
+        r"\b(appointments?|book(?:ing)?|doctors?|dr|consult\w*|specialists?|check-?ups?|slots?"
+        r"|\w*(?:ologist|ician|iatrist|edist|edic|opath|surgeon)s?|gp|dentists?"
+        r"|symptoms?|pain\w*|aches?|fever|rash\w*|cough\w*|sick|hurts?|hurting|unwell)\b"
+    ),
+    REFILL: re.compile(
+        r"\b(refills?|prescriptions?|prescribed|medicines?|medications?|tablets?|pills?|pharmacy"
+        r"|ran out|running out)\b"
+    ),
+    RECORDS: re.compile(
+        r"\b(cancel\w*|reschedul\w*|postpone\w*|my (?:appointment|booking|order|refill)s?"
+        r"|booking id|refill id|order id|go through|went through|status)\b"
+    ),
+}
+
+# Running one of these tools means the call is in its flow, whatever was said
+TOOL_FLOWS = {
+    "suggest_specialist": BOOKING,
+    "get_doctors_list": BOOKING,
+    "find_available_slots": BOOKING,
+    "save_appointment": BOOKING,
+    "save_medicine_refill_order": REFILL,
+    "check_appointment": RECORDS,
+    "check_refill_order": RECORDS,
+    "cancel_appointment": RECORDS,
+    "reschedule_appointment": RECORDS,
+}
+
+
+def detect_flows(text: str) -> set[str]:
+    text = text.casefold()
+    return {flow for flow, pattern in FLOW_TRIGGERS.items() if pattern.search(text)}
+
+
+class ConversationFlows:
+    """
+    Flows one call has entered, and the instructions that go with them.
+
+    A flow is never left once entered: details collected in it (name,
+    phone, the booking just made) stay relevant for the rest of the call.
+    """
+
+    def __init__(self, enabled: bool | None = None) -> None:
+        enabled = FLOW_PROMPTS if enabled is None else enabled
+        self.active: frozenset[str] = frozenset() if enabled else ALL_FLOWS
+
+    @property
+    def instructions(self) -> str:
+        return build_instructions(self.active)
+
+    def enter(self, flows) -> bool:
+        """Add flows; True if that changed the instructions."""
+        active = self.active | frozenset(flows)
+        if active == self.active:
+            return False
+        self.active = active
+        return True
+
+    def enter_from_text(self, text: str) -> bool:
+        return self.enter(detect_flows(text))
+
+    def enter_from_tools(self, tool_names) -> bool:
+        return self.enter(TOOL_FLOWS[name] for name in tool_names if name in TOOL_FLOWS)
+
+
+def set_turn_instructions(chat_ctx: llm.ChatContext, instructions: str) -> None:
+    """
+    Replace the instructions in a chat context copy. The one passed to
+    on_user_turn_completed is taken before the hook runs, so
+    Agent.update_instructions alone only reaches the next turn.
+    """
+    for i, item in enumerate(chat_ctx.items):
+        if item.type == "message" and item.role == "system":
+            chat_ctx.items[i] = llm.ChatMessage(
+                id=item.id,
+                role="system",
+                content=[instructions],
+                created_at=item.created_at,
+            )
+            return
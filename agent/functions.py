@@ -1,77 +1,37 @@
 import os
 import json
 import datetime
-import boto3
 from livekit import api
 from livekit.agents import function_tool, RunContext, get_job_context
 import logging
-import random
 
-logger = logging.getLogger(__name__)
-
-
-SUMMARY_FILE_PATH = "call_summaries.log"   # all summaries stored here
-
-doctor_file_path = os.path.join(os.path.dirname(__file__), "doctors.json")
-
-
-
-def generate_id() -> int:
-    """Generate a unique positive random ID."""
-    return random.randint(100000, 999999)  # 6-digit ID
-
-
-def write_session_summary(summary_text: str) -> None:
-    """
-    Appends a structured summary of the call to a single log file.
-    Each entry includes:
-        - Timestamp
-        - Call ID
-        - Summary text
-    """
-
-    try:
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        call_id = generate_id()
-
-        entry = (
-            "\n" +
-            "============================================================\n"
-            f"CALL SUMMARY — {timestamp}\n"
-            f"CALL ID: {call_id}\n"
-            "------------------------------------------------------------\n"
-            f"{summary_text}\n"
-            "============================================================\n"
-        )
-
-        # Append to the file (creates the file if it doesn't exist)
-        with open(SUMMARY_FILE_PATH, "a", encoding="utf-8") as file:
-            file.write(entry)
-
-    except Exception as e:
-        print(f"[ERROR] Failed to write call summary: {e}")
+from inventory import get_inventory
+from persistence import run_io, get_append_log
+from ids import allocate_id
+from slots import parse_slot, parse_date, format_date, format_slot
+from idempotency import idempotent, normalize_text, get_idempotency_cache
+from latency import traced_tool
+from prefetch import get_availability_cache
+from specialties import SPECIALTY_NAMES, classify, resolve_specialty
+from doctor_names import normalize_name
+from patient import get_patient_profile
+from records import (
+    APPOINTMENTS_FILE_PATH,
+    PRESCRIPTIONS_FILE_PATH,
+    get_appointment_index,
+    get_refill_index,
+    normalize_phone,
+)
 
+logger = logging.getLogger(__name__)
 
-# --------------------------
-# AWS S3 CONFIGURATION
-# --------------------------
-# AWS_ACCESS_KEY = os.getenv("AWS_ACCESS_KEY_ID")
-# AWS_SECRET_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-# AWS_REGION = os.getenv("AWS_REGION", "ap-south-1")
-# AWS_BUCKET_NAME = os.getenv("AWS_BUCKET_NAME")
-
-# s3_client = boto3.client(
-#     "s3",
-#     aws_access_key_id=AWS_ACCESS_KEY,
-#     aws_secret_access_key=AWS_SECRET_KEY,
-#     region_name=AWS_REGION,
-# )
 
 # --------------------------
 # FUNCTIONS
 # --------------------------
 
 @function_tool()
+@traced_tool
 async def transfer_to_human(ctx: RunContext) -> str:
     """
     Transfers the active SIP participant in the current room
@@ -161,6 +121,7 @@ async def transfer_to_human(ctx: RunContext) -> str:
 
 
 @function_tool()
+@traced_tool
 async def end_call(ctx: RunContext) -> str:
     """
     Ends the current LiveKit room call.
@@ -168,6 +129,15 @@ async def end_call(ctx: RunContext) -> str:
     or all questions are answered.
     """
 
+    return await hang_up()
+
+
+async def hang_up() -> str:
+    """
+    Deletes the current room, which disconnects the caller and ends the job.
+    Shared by end_call and the idle monitor.
+    """
+
     # 1. Get RTC Job Context
     job_ctx = get_job_context()
     if job_ctx is None:
@@ -193,69 +163,106 @@ async def end_call(ctx: RunContext) -> str:
         return "error"
 
 
+def _slot_argument(time_slot: str) -> str:
+    """time_slot normalised for idempotency keys: "tomorrow 10 am" and "2025-06-02 10:00 AM" match."""
+    try:
+        return format_slot(parse_slot(time_slot))
+    except ValueError:
+        return normalize_text(time_slot)
+
+
+def _saved(result: str) -> bool:
+    """save_appointment / save_medicine_refill_order returned an ID."""
+    return result.isdigit()
+
+
+def _no_error(result: str) -> bool:
+    return "error" not in json.loads(result)
+
+
+def _forget_booking_results(booking_id) -> None:
+    """
+    Drop cached results that describe a booking before its latest change:
+    the save_appointment that returned its ID, and earlier cancels and
+    reschedules of it (moving A→B→A→B must move it the third time too).
+    """
+    cache = get_idempotency_cache()
+    cache.discard_result(str(booking_id))
+    cache.discard_tag(normalize_text(booking_id))
+
+
+def _missing_details(details: dict[str, str]) -> str:
+    """Caller details a booking or refill can't be saved without, as words ("age and address")."""
+    missing = [field.replace("customer_", "") for field, value in details.items() if not value]
+    return " and ".join([", ".join(missing[:-1]), missing[-1]] if len(missing) > 1 else missing)
+
+
 @function_tool()
+@traced_tool
+@idempotent(_saved, phone=normalize_phone, time_slot=_slot_argument, doctor_name=normalize_name)
 async def save_appointment(
-    customer_name: str,
-    age: str,
-    phone: str,
-    address: str,
+    ctx: RunContext,
     symptoms: str,
     doctor_name: str,
-    time_slot: str
+    time_slot: str,
+    doctor_id: str = "",
+    customer_name: str = "",
+    age: str = "",
+    phone: str = "",
+    address: str = ""
 ) -> str:
     """
-    Save appointment, update doctor availability,
-    and return booking_id. If error → return -1.
+    Claim the time slot, save appointment and return booking_id.
+    time_slot is a date and time, e.g. the "time_slot" of a slot
+    returned by find_available_slots; doctor_id is that slot's
+    "doctor_id". Without it, doctor_name is matched as heard.
+    customer_name, age, phone and address may be left empty if
+    they are already on file or were given earlier in the call.
+    If the slot is already taken → return the nearest free alternatives.
+    If error → return -1.
     """
     try:
         timestamp = datetime.datetime.now().isoformat()
-        booking_id = generate_id()
+
+        profile = get_patient_profile(ctx.session)
+        details = profile.fill(customer_name=customer_name, age=age, phone=phone, address=address)
+        missing = _missing_details(details)
+        if missing:
+            return json.dumps({"error": f"Ask the caller for their {missing} first."})
+
+        try:
+            slot = parse_slot(time_slot)
+        except ValueError:
+            return json.dumps({"error": f"Could not understand the time slot {time_slot!r}. Give a date and a time."})
+
+        booking_id = await allocate_id("booking")
+
+        # ---------------------------
+        # 1. Claim the time slot
+        # ---------------------------
+        reservation = await run_io(_reserve_slot, doctor_id or doctor_name, slot, booking_id)
+        if not reservation:
+            return json.dumps({
+                "error": f"The {format_slot(slot)} slot with {reservation.doctor_name} is not available ({reservation.reason}).",
+                "alternatives": reservation.alternatives
+            })
 
         # ---------------------------
-        # 1. Save appointment details
+        # 2. Save appointment details
         # ---------------------------
         data = {
             "booking_id": booking_id,
-            "customer_name": customer_name,
-            "age": age,
-            "phone": phone,
-            "address": address,
+            **details,
             "symptoms": symptoms,
-            "doctor_name": doctor_name,
-            "time_slot": time_slot,
+            "doctor_id": reservation.doctor_id,
+            "doctor_name": reservation.doctor_name,
+            "time_slot": reservation.time_slot,
+            "status": "booked",
             "saved_at": timestamp
         }
 
-        with open("appointments.jsonl", "a") as f:
-            f.write(json.dumps(data) + "\n")
-
-        # ---------------------------
-        # 2. Remove booked time slot
-        # ---------------------------
-        try:
-            slot_date, slot_time = time_slot.split(" | ")
-        except ValueError:
-            # Slot format wrong → Return ID anyway but warn in logs
-            return str(booking_id)
-
-        with open(doctor_file_path, "r") as f:
-            doctors_data = json.load(f)
-
-        for specialist, doctors in doctors_data.items():
-            for doctor in doctors:
-                if doctor["doctor_name"] == doctor_name:
-
-                    if slot_date in doctor["available_slots"]:
-                        if slot_time in doctor["available_slots"][slot_date]:
-                            doctor["available_slots"][slot_date].remove(slot_time)
-
-                            if len(doctor["available_slots"][slot_date]) == 0:
-                                del doctor["available_slots"][slot_date]
-
-                    break
-
-        with open(doctor_file_path, "w") as f:
-            json.dump(doctors_data, f, indent=4)
+        await get_append_log(APPOINTMENTS_FILE_PATH).append(data)
+        profile.remember("call", customer_name=customer_name, age=age, phone=phone, address=address)
 
         return str(booking_id)
 
@@ -265,29 +272,40 @@ async def save_appointment(
 
 
 @function_tool()
+@traced_tool
+@idempotent(_saved, phone=normalize_phone)
 async def save_medicine_refill_order(
-    customer_name: str,
-    age: str,
-    address: str,
+    ctx: RunContext,
     medicine_name: str,
     quantity: str,
     usage_duration: str,
     consulted_doctor: str,
-    instructions: str
+    instructions: str,
+    customer_name: str = "",
+    age: str = "",
+    phone: str = "",
+    address: str = ""
 ) -> str:
     """
     Save prescription order with unique refill_id.
+    customer_name, age, phone and address may be left empty if
+    they are already on file or were given earlier in the call.
     Return refill_id if success, else -1.
     """
     try:
         timestamp = datetime.datetime.now().isoformat()
-        refill_id = generate_id()
+
+        profile = get_patient_profile(ctx.session)
+        details = profile.fill(customer_name=customer_name, age=age, phone=phone, address=address)
+        missing = _missing_details(details)
+        if missing:
+            return json.dumps({"error": f"Ask the caller for their {missing} first."})
+
+        refill_id = await allocate_id("refill")
 
         data = {
             "refill_id": refill_id,
-            "customer_name": customer_name,
-            "age": age,
-            "address": address,
+            **details,
             "medicine_name": medicine_name,
             "quantity": quantity,
             "usage_duration": usage_duration,
@@ -296,8 +314,8 @@ async def save_medicine_refill_order(
             "saved_at": timestamp
         }
 
-        with open("prescriptions.jsonl", "a") as f:
-            f.write(json.dumps(data) + "\n")
+        await get_append_log(PRESCRIPTIONS_FILE_PATH).append(data)
+        profile.remember("call", customer_name=customer_name, age=age, phone=phone, address=address)
 
         return str(refill_id)
 
@@ -305,64 +323,442 @@ async def save_medicine_refill_order(
         print(f"[ERROR] Failed to save refill order: {e}")
         return "-1"
 
+
+APPOINTMENT_FIELDS = ("booking_id", "customer_name", "doctor_name", "time_slot", "symptoms", "status")
+REFILL_FIELDS = ("refill_id", "customer_name", "medicine_name", "quantity", "address", "saved_at", "status")
+
+
+def _brief(record: dict, fields: tuple) -> dict:
+    """Only the fields the assistant needs to read back to the caller."""
+    brief = {field: record[field] for field in fields if field in record}
+    brief.setdefault("status", "booked" if "booking_id" in record else "placed")
+    return brief
+
+
+@function_tool()
+@traced_tool
+async def check_appointment(phone: str = "", booking_id: str = "", date: str = "") -> str:
+    """
+    Looks up a caller's existing appointments by booking ID or phone number.
+
+    Args:
+        phone: Caller's phone number.
+        booking_id: Booking ID, if the caller has it.
+        date: Only appointments on this date (YYYY-MM-DD).
+    """
+
+    index = get_appointment_index()
+    try:
+        if booking_id:
+            record = await run_io(index.get, booking_id)
+            records = [record] if record else []
+        elif phone:
+            record_date = format_date(parse_date(date)) if date else None
+            records = await run_io(index.find, phone=phone, record_date=record_date)
+        else:
+            return json.dumps({"error": "Please provide a booking ID or phone number."})
+    except ValueError:
+        return json.dumps({"error": f"Could not understand the date {date!r}."})
+    except Exception as e:
+        logger.error(f"Failed to look up appointments: {e}", exc_info=True)
+        return json.dumps({"error": "Failed to look up appointments."})
+
+    if not records:
+        return json.dumps({"appointments": [], "message": "No appointments found."})
+
+    return json.dumps({"appointments": [_brief(r, APPOINTMENT_FIELDS) for r in records]})
+
+
+async def _load_own_booking(booking_id: str, phone: str) -> tuple[dict | None, str | None]:
+    """The latest version of a booking if the phone number matches it, else an error message."""
+    record = await run_io(get_appointment_index().get, booking_id)
+    if record is None:
+        return None, f"No appointment found with booking ID {booking_id}."
+    if normalize_phone(phone) != normalize_phone(record.get("phone", "")):
+        return None, "The phone number does not match this booking."
+    if record.get("status") == "cancelled":
+        return None, f"Booking {booking_id} is already cancelled."
+    return record, None
+
+
 @function_tool()
-async def get_doctors_list(specialist: str) -> str:
+@traced_tool
+@idempotent(_no_error, tag_with="booking_id", phone=normalize_phone)
+async def cancel_appointment(booking_id: str, phone: str) -> str:
+    """
+    Cancels an existing appointment and frees its time slot.
+
+    Args:
+        booking_id: Booking ID of the appointment.
+        phone: Phone number the appointment was booked with.
+    """
+
+    try:
+        record, error = await _load_own_booking(booking_id, phone)
+        if error:
+            return json.dumps({"error": error})
+
+        # ---------------------------
+        # 1. Free the time slot
+        # ---------------------------
+        slot = _record_slot(record)
+        released = False
+        if slot is not None:
+            released = await run_io(_release_slot, _record_doctor(record), slot, record["booking_id"])
+
+        # ---------------------------
+        # 2. Record the cancellation
+        # ---------------------------
+        data = {**record, "status": "cancelled", "updated_at": datetime.datetime.now().isoformat()}
+        # Only the reschedule itself moved the booking from that slot
+        data.pop("previous_time_slot", None)
+        try:
+            await get_append_log(APPOINTMENTS_FILE_PATH).append(data)
+        except Exception:
+            # Booking still stands → take its slot back
+            if released:
+                await run_io(_reserve_slot, _record_doctor(record), slot, record["booking_id"])
+            raise
+
+        # A new booking with the same details must not get this booking_id back
+        _forget_booking_results(record["booking_id"])
+        return json.dumps({"booking_id": record["booking_id"], "status": "cancelled"})
+
+    except Exception as e:
+        logger.error(f"Failed to cancel appointment {booking_id}: {e}", exc_info=True)
+        return json.dumps({"error": "Failed to cancel the appointment."})
+
+
+@function_tool()
+@traced_tool
+@idempotent(
+    _no_error, tag_with="booking_id",
+    phone=normalize_phone, new_time_slot=_slot_argument, new_doctor_name=normalize_name,
+)
+async def reschedule_appointment(
+    booking_id: str,
+    phone: str,
+    new_time_slot: str,
+    new_doctor_name: str = "",
+    new_doctor_id: str = ""
+) -> str:
+    """
+    Moves an existing appointment to a new time slot, keeping its booking ID.
+    The old slot is freed only if the new one could be claimed.
+
+    Args:
+        booking_id: Booking ID of the appointment.
+        phone: Phone number the appointment was booked with.
+        new_time_slot: New date and time, e.g. the "time_slot" of a slot from find_available_slots.
+        new_doctor_name: New doctor, if the caller wants to change doctors as well.
+        new_doctor_id: The new slot's "doctor_id", when changing doctors.
+    """
+
+    try:
+        record, error = await _load_own_booking(booking_id, phone)
+        if error:
+            return json.dumps({"error": error})
+
+        try:
+            new_slot = parse_slot(new_time_slot)
+        except ValueError:
+            return json.dumps({"error": f"Could not understand the new time slot {new_time_slot!r}. Give a date and a time."})
+
+        doctor = new_doctor_id or new_doctor_name or _record_doctor(record)
+        old_slot = _record_slot(record)
+        old = (_record_doctor(record), old_slot) if old_slot is not None else None
+        new = (doctor, new_slot)
+
+        # ---------------------------
+        # 1. Swap the slots in one step
+        # ---------------------------
+        reservation = await run_io(_move_slot, record["booking_id"], old, new)
+        if not reservation:
+            return json.dumps({
+                "error": f"The {format_slot(new_slot)} slot with {reservation.doctor_name} is not available ({reservation.reason}).",
+                "alternatives": reservation.alternatives
+            })
+
+        # ---------------------------
+        # 2. Record the new slot
+        # ---------------------------
+        data = {
+            **record,
+            "doctor_id": reservation.doctor_id,
+            "doctor_name": reservation.doctor_name,
+            "time_slot": reservation.time_slot,
+            "status": "rescheduled",
+            "previous_time_slot": record.get("time_slot"),
+            "updated_at": datetime.datetime.now().isoformat()
+        }
+        try:
+            await get_append_log(APPOINTMENTS_FILE_PATH).append(data)
+        except Exception:
+            # Booking still points at the old slot → move it back
+            moved = (reservation.doctor_id, reservation.slot)
+            if old and not await run_io(_move_slot, record["booking_id"], moved, old):
+                logger.error(f"Could not restore slot {old} for booking {booking_id}")
+            raise
+
+        _forget_booking_results(record["booking_id"])
+        return json.dumps({
+            "booking_id": record["booking_id"],
+            "doctor_name": data["doctor_name"],
+            "time_slot": data["time_slot"],
+            "status": "rescheduled"
+        })
+
+    except Exception as e:
+        logger.error(f"Failed to reschedule appointment {booking_id}: {e}", exc_info=True)
+        return json.dumps({"error": "Failed to reschedule the appointment."})
+
+
+@function_tool()
+@traced_tool
+async def check_refill_order(phone: str = "", refill_id: str = "") -> str:
+    """
+    Looks up a caller's medicine refill orders by refill ID or phone number.
+
+    Args:
+        phone: Caller's phone number.
+        refill_id: Refill ID, if the caller has it.
+    """
+
+    index = get_refill_index()
+    try:
+        if refill_id:
+            record = await run_io(index.get, refill_id)
+            records = [record] if record else []
+        elif phone:
+            records = await run_io(index.find, phone=phone)
+        else:
+            return json.dumps({"error": "Please provide a refill ID or phone number."})
+    except Exception as e:
+        logger.error(f"Failed to look up refill orders: {e}", exc_info=True)
+        return json.dumps({"error": "Failed to look up refill orders."})
+
+    if not records:
+        return json.dumps({"refill_orders": [], "message": "No refill orders found."})
+
+    return json.dumps({"refill_orders": [_brief(r, REFILL_FIELDS) for r in records]})
+
+
+@function_tool()
+@traced_tool
+async def suggest_specialist(symptoms: str) -> str:
+    """
+    Maps the caller's symptoms, or what they called the doctor
+    ("skin doctor", "heart"), to the specialization to book.
+
+    Args:
+        symptoms: The caller's own words about the problem.
+    """
+
+    result = classify(symptoms)
+
+    if result.red_flags:
+        return json.dumps({
+            "urgent": True,
+            "red_flags": result.red_flags,
+            "action": "Do not book. Express concern and offer to connect the caller to a human "
+                      "representative now; if they agree, call transfer_to_human."
+        })
+
+    if result.specialty is None:
+        return json.dumps({
+            "specialization": None,
+            "message": "No specialization matched. Ask one more question about the symptoms, "
+                       "or suggest a general_physician."
+        })
+
+    return json.dumps({
+        "specialization": result.specialty,
+        "alternatives": result.ranked[1:3],
+        "matched": result.matched
+    })
+
+
+@function_tool()
+@traced_tool
+async def get_doctors_list(ctx: RunContext, specialist: str) -> str:
     """
     Returns list of doctors and their available time slots
     from the doctors.json file for the specified specialist.
     """
 
-    # -------- Load doctor data from JSON file --------
-    # doctor_file_path = doctor_file_path
+    # Map whatever the caller called it ("skin doctor") onto a doctors.json key
+    specialist_key = resolve_specialty(specialist)
+    if specialist_key is None:
+        return _unknown_specialty(specialist)
 
-    if not os.path.exists(doctor_file_path):
+    # -------- Load doctor data from the prefetched snapshot or the in-memory inventory --------
+    try:
+        snapshot = await _prefetched(ctx, specialist_key)
+        if snapshot is not None:
+            doctors = _doctors_for_specialty(specialist_key, snapshot)
+        else:
+            doctors = await run_io(_doctors_for_specialty, specialist_key)
+    except FileNotFoundError:
         return json.dumps({
             "error": "doctors.json file not found in project directory."
         })
-
-    try:
-        with open(doctor_file_path, "r") as f:
-            doctors_db = json.load(f)
     except Exception as e:
         return json.dumps({
             "error": f"Failed to read doctors.json: {str(e)}"
         })
 
-    # Convert specialist input into key format
-    specialist_key = specialist.lower().replace(" ", "_")
-
-    if specialist_key not in doctors_db:
+    if doctors is None:
         return json.dumps({
             "error": f"No doctors found for specialization '{specialist}'."
         })
 
     # -------- Return filtered doctor list --------
     return json.dumps({
-        "specialization": specialist,
-        "doctors": doctors_db[specialist_key]
+        "specialization": specialist_key,
+        "doctors": doctors
+    })
+
+
+@function_tool()
+@traced_tool
+async def find_available_slots(
+    ctx: RunContext,
+    specialist: str,
+    date: str,
+    preferred_time: str = "",
+    end_date: str = "",
+    earliest_time: str = "",
+    latest_time: str = "",
+    limit: int = 3
+) -> str:
+    """
+    Returns only the free slots closest to what the caller asked for,
+    nearest to preferred_time first.
+
+    Args:
+        specialist: Specialization, e.g. "dermatologist".
+        date: Preferred date as YYYY-MM-DD.
+        preferred_time: Preferred time such as "10:00 AM". Leave empty if any time works.
+        end_date: Last acceptable date (YYYY-MM-DD) when the caller gave a range.
+        earliest_time: Earliest acceptable time, e.g. "12:00 PM" for "afternoon".
+        latest_time: Latest acceptable time, e.g. "5:00 PM" for "afternoon".
+        limit: Number of slots to return.
+    """
+
+    specialist_key = resolve_specialty(specialist)
+    if specialist_key is None:
+        return _unknown_specialty(specialist)
+
+    try:
+        snapshot = await _prefetched(ctx, specialist_key)
+        if snapshot is not None:
+            slots, nearest = _find_slots(
+                specialist_key, date, end_date, preferred_time, earliest_time, latest_time, limit, snapshot
+            )
+        else:
+            slots, nearest = await run_io(
+                _find_slots, specialist_key, date, end_date, preferred_time, earliest_time, latest_time, limit
+            )
+    except ValueError as e:
+        return json.dumps({"error": f"Could not understand the requested date or time: {e}"})
+    except Exception as e:
+        return json.dumps({"error": f"Failed to check availability: {str(e)}"})
+
+    if slots is None:
+        return json.dumps({
+            "error": f"No doctors found for specialization '{specialist}'."
+        })
+
+    if slots:
+        return json.dumps({"specialization": specialist_key, "slots": slots})
+
+    # Nothing inside the requested window → offer the closest slots outside it
+    return json.dumps({
+        "specialization": specialist_key,
+        "slots": [],
+        "nearest_outside_request": nearest
     })
 
 
+def _find_slots(
+    specialist_key: str,
+    date: str,
+    end_date: str,
+    preferred_time: str,
+    earliest_time: str,
+    latest_time: str,
+    limit: int,
+    inventory=None,
+) -> tuple[list[dict] | None, list[dict]]:
+    """Availability search; blocking (run through run_io()) unless given a prefetched snapshot."""
+    inventory = inventory or get_inventory()
+    if not inventory.has_specialty(specialist_key):
+        return None, []
+
+    limit = max(1, min(int(limit), 10))
+    slots = inventory.nearest_slots(
+        specialist_key,
+        date,
+        end_date=end_date or None,
+        around=preferred_time or None,
+        earliest=earliest_time or None,
+        latest=latest_time or None,
+        limit=limit,
+    )
+    if slots:
+        return slots, []
+
+    # Search the full horizon around the requested date and time instead
+    nearest = inventory.nearest_slots(
+        specialist_key, date, around=preferred_time or earliest_time or None, limit=limit, any_date=True
+    )
+    return [], nearest
+
+
+def _unknown_specialty(specialist: str) -> str:
+    return json.dumps({
+        "error": f"No doctors found for specialization '{specialist}'.",
+        "specializations": list(SPECIALTY_NAMES),
+    })
+
+
+async def _prefetched(ctx: RunContext, specialist_key: str):
+    """The session's prefetched availability snapshot for a specialty, if any."""
+    cache = get_availability_cache(ctx.session)
+    return await cache.lookup(specialist_key) if cache is not None else None
+
+
+def _doctors_for_specialty(specialist_key: str, inventory=None) -> list[dict] | None:
+    """Inventory lookup; blocking (run through run_io()) unless given a prefetched snapshot."""
+    inventory = inventory or get_inventory()
+    if not inventory.has_specialty(specialist_key):
+        return None
+    return inventory.doctors_for(specialist_key)
+
+
+def _record_slot(record: dict) -> int | None:
+    """Slot key of a saved appointment, or None if its time_slot is unreadable."""
+    try:
+        return parse_slot(record.get("time_slot", ""))
+    except ValueError:
+        return None
+
+
+def _record_doctor(record: dict) -> str:
+    """Doctor of a saved appointment; records from before doctor IDs only have the name."""
+    return record.get("doctor_id") or record["doctor_name"]
+
 
-# @function_tool()
-# async def save_audio_recording(recording_url: str) -> str:
-#     """
-#     Save audio recording to S3 from a recording URL.
-#     """
-#     import requests
+def _reserve_slot(doctor_ref: str, slot: int, booking_id: int | None = None):
+    """Blocking slot claim (may wait on the inventory flock); run through run_io()."""
+    return get_inventory().reserve(doctor_ref, slot, booking_id)
 
-#     try:
-#         audio_data = requests.get(recording_url).content
-#         file_key = f"recordings/{datetime.datetime.now().timestamp()}.wav"
 
-#         s3_client.put_object(
-#             Bucket=AWS_BUCKET_NAME,
-#             Key=file_key,
-#             Body=audio_data,
-#             ContentType="audio/wav"
-#         )
+def _release_slot(doctor_ref: str, slot: int, booking_id: int) -> bool:
+    """Blocking slot release; run through run_io()."""
+    return get_inventory().release(doctor_ref, slot, booking_id)
 
-#         return f"Recording saved to S3 as {file_key}"
 
-#     except Exception as e:
-#         return f"Failed to save recording: {str(e)}"
+def _move_slot(booking_id: int, old: tuple | None, new: tuple):
+    """Blocking release-and-claim in one inventory transaction; run through run_io()."""
+    return get_inventory().move(booking_id, old, new)
@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import inspect
+import logging
+import functools
+from collections import OrderedDict
+
+from livekit.agents import RunContext, get_job_context
+
+logger = logging.getLogger(__name__)
+
+
+# How long a successful tool result is replayed for a repeated call
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "900"))
+
+# Results kept per process across all sessions, oldest dropped first
+IDEMPOTENCY_MAX_ENTRIES = 10_000
+
+
+def normalize_text(value) -> str:
+    """Case- and whitespace-insensitive form of a tool argument."""
+    return " ".join(str(value).split()).casefold()
+
+
+def _session_scope() -> str:
+    """Idempotency keys are per session; one session runs per room."""
+    try:
+        return get_job_context().room.name
+    except RuntimeError:
+        return "-"
+
+
+def idempotency_key(scope: str, tool_name: str, arguments: dict) -> str:
+    payload = json.dumps([scope, tool_name, arguments], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class IdempotencyCache:
+    """
+    Results of side-effecting tool calls, by idempotency key, for `ttl` seconds.
+
+    A call whose key is already cached gets the first call's result
+    without running again. A call whose key is still in flight waits for
+    that call and shares its result. Only results accepted by the
+    caller's `succeeded` check are kept, so a call that failed can still
+    be retried for real. An entry can carry a tag (e.g. the booking it
+    changed) so that every result about that thing can be dropped at once.
+    """
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL, max_entries: int = IDEMPOTENCY_MAX_ENTRIES) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        # key → (expires at, future of the result, tag); ordered by insertion, so by expiry
+        self._entries: OrderedDict[str, tuple[float, asyncio.Future, str | None]] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    async def run(self, key: str, call, succeeded, name: str = "call", tag: str | None = None) -> str:
+        """Return the cached result for key, or await call() and cache it if it succeeded."""
+        now = time.monotonic()
+        self._expire(now)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            logger.info(f"Repeated {name} answered from the idempotency cache")
+            return await asyncio.shield(entry[1])
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._entries[key] = (now + self.ttl, future, tag)
+
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            self._entries.pop(key, None)
+            future.cancel()
+            raise
+        except Exception as e:
+            self._entries.pop(key, None)
+            future.set_exception(e)
+            # Nobody else may be waiting; don't warn about an unretrieved exception
+            future.exception()
+            raise
+
+        if not succeeded(result):
+            self._entries.pop(key, None)
+        future.set_result(result)
+        return result
+
+    def _expire(self, now: float) -> None:
+        while self._entries:
+            key, (expires_at, future, _) = next(iter(self._entries.items()))
+            if expires_at > now and len(self._entries) < self.max_entries:
+                break
+            if not future.done():
+                # Still in flight; stop here rather than orphan its waiters
+                break
+            self._entries.popitem(last=False)
+
+    def discard_result(self, result: str) -> None:
+        """Forget every cached call that returned `result` (e.g. a booking_id that was since cancelled)."""
+        for key, (_, future, _) in list(self._entries.items()):
+            if future.done() and not future.cancelled() and future.exception() is None and future.result() == result:
+                del self._entries[key]
+
+    def discard_tag(self, tag: str) -> None:
+        """
+        Forget every finished call tagged `tag`, e.g. earlier reschedules and
+        cancels of a booking that has just changed, so repeating one of them
+        runs again. Calls still in flight (the one making the change) stay.
+        """
+        for key, (_, future, entry_tag) in list(self._entries.items()):
+            if entry_tag == tag and future.done():
+                del self._entries[key]
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_cache = IdempotencyCache()
+
+
+def get_idempotency_cache() -> IdempotencyCache:
+    return _cache
+
+
+def idempotent(succeeded, tag_with: str | None = None, **normalizers):
+    """
+    Make a tool safe to call twice with the same arguments in a session.
+
+    Arguments are normalised (normalize_text, or the given per-argument
+    normaliser) into a key, so a retry of e.g. save_appointment returns
+    the original booking_id without touching the inventory or the logs.
+    With tag_with, the cached result is tagged with that argument's
+    normalised value (see IdempotencyCache.discard_tag).
+    Goes below @function_tool(); the tool's signature is preserved.
+    """
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = {
+                name: normalizers.get(name, normalize_text)(value)
+                for name, value in bound.arguments.items()
+                if not isinstance(value, RunContext)
+            }
+
+            key = idempotency_key(_session_scope(), fn.__name__, arguments)
+            tag = arguments[tag_with] if tag_with else None
+            return await get_idempotency_cache().run(key, lambda: fn(*args, **kwargs), succeeded, fn.__name__, tag)
+
+        return wrapper
+
+    return decorator
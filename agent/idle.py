@@ -0,0 +1,122 @@
+import os
+import asyncio
+import logging
+
+from livekit.agents import AgentSession
+
+from prompt import IDLE_PROMPT, IDLE_GOODBYE
+from functions import hang_up
+from latency import get_latency_registry
+
+logger = logging.getLogger(__name__)
+
+
+# Seconds of silence before the caller is asked whether they are still
+# there, then before the call is ended if they still don't answer
+IDLE_PROMPT_AFTER = float(os.getenv("IDLE_PROMPT_AFTER", "60"))
+IDLE_END_AFTER = float(os.getenv("IDLE_END_AFTER", "10"))
+
+
+class IdleMonitor:
+    """
+    Ends calls the caller has walked away from.
+
+    Silence is counted while the caller is not speaking (from the VAD's
+    user_state_changed events) and the agent is listening, i.e. not
+    thinking, running a tool or speaking. After `prompt_after` seconds the
+    caller is asked if they are still there; after `end_after` more
+    seconds, counted from the end of that question, the goodbye is played
+    and the room is deleted through the end_call path. Anything the
+    caller says starts over.
+    """
+
+    def __init__(
+        self,
+        session: AgentSession,
+        room: str,
+        prompt_after: float = IDLE_PROMPT_AFTER,
+        end_after: float = IDLE_END_AFTER,
+        end_call=hang_up,
+    ) -> None:
+        self.session = session
+        self.room = room
+        self.prompt_after = prompt_after
+        self.end_after = end_after
+        self._end_call = end_call
+
+        self._user_state = "listening"
+        self._agent_state = "initializing"
+        self._prompted = False
+        self._ending = False
+        self._closed = False
+        self._timer: asyncio.TimerHandle | None = None
+        self._end_task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self.session.on("user_state_changed", self._on_user_state)
+        self.session.on("agent_state_changed", self._on_agent_state)
+        self.session.on("user_input_transcribed", self._on_user_input)
+        self._reschedule()
+
+    async def stop(self) -> None:
+        self._closed = True
+        self.session.off("user_state_changed", self._on_user_state)
+        self.session.off("agent_state_changed", self._on_agent_state)
+        self.session.off("user_input_transcribed", self._on_user_input)
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _on_user_state(self, ev) -> None:
+        self._user_state = ev.new_state
+        if ev.new_state == "speaking":
+            self._prompted = False
+        self._reschedule()
+
+    def _on_agent_state(self, ev) -> None:
+        self._agent_state = ev.new_state
+        self._reschedule()
+
+    def _on_user_input(self, ev) -> None:
+        # Speech the VAD missed still counts as the caller being there
+        self._prompted = False
+        self._reschedule()
+
+    def _reschedule(self) -> None:
+        """Restart the silence countdown if nobody is active, otherwise stop it."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._closed or self._ending:
+            return
+        if self._user_state == "speaking" or self._agent_state != "listening":
+            return
+
+        delay = self.end_after if self._prompted else self.prompt_after
+        self._timer = asyncio.get_running_loop().call_later(delay, self._on_silence)
+
+    def _on_silence(self) -> None:
+        self._timer = None
+        if not self._prompted:
+            self._prompted = True
+            logger.info(f"Caller silent for {self.prompt_after:.0f}s in room {self.room}, prompting")
+            get_latency_registry().increment("idle_prompts")
+            # The end countdown starts once the agent is back to listening
+            self.session.say(IDLE_PROMPT)
+            return
+
+        self._ending = True
+        self._end_task = asyncio.create_task(self._end())
+
+    async def _end(self) -> None:
+        logger.info(f"Caller still silent in room {self.room}, ending the call")
+        try:
+            handle = self.session.say(IDLE_GOODBYE, allow_interruptions=False)
+            await handle.wait_for_playout()
+        except RuntimeError:
+            # Session already closing; the room still has to go
+            pass
+
+        if await self._end_call() == "ended":
+            get_latency_registry().increment("idle_rooms_reclaimed")
+            logger.info(f"Reclaimed idle room {self.room}")
@@ -0,0 +1,105 @@
+import os
+import json
+import time
+import fcntl
+import threading
+import logging
+
+from persistence import run_io
+
+logger = logging.getLogger(__name__)
+
+
+IDS_FILE_PATH = os.path.join(os.path.dirname(__file__), "ids.json")
+
+# IDs start above the 6-digit range that the old random generator used,
+# so new IDs can never collide with booking/refill IDs already on file.
+ID_START = 1_000_000
+
+# IDs leased from the shared counter per round-trip to ids.json
+ID_BLOCK_SIZE = 20
+
+# Unused IDs of a lease older than this are dropped, so IDs handed out by
+# different worker processes are at most this far out of creation order.
+ID_LEASE_TTL = 30.0
+
+
+class IdAllocator:
+    """
+    Short, unique, creation-ordered numeric IDs for bookings, refills and calls.
+
+    Each process leases blocks of ID_BLOCK_SIZE consecutive IDs per kind
+    from a counter in ids.json (under an flock), then hands them out from
+    memory. IDs are unique across sessions and worker processes, strictly
+    increasing within a process, and ordered by creation time across
+    processes to within ID_LEASE_TTL seconds.
+    """
+
+    def __init__(
+        self,
+        path: str = IDS_FILE_PATH,
+        block_size: int = ID_BLOCK_SIZE,
+        lease_ttl: float = ID_LEASE_TTL,
+    ) -> None:
+        self.path = path
+        self.block_size = block_size
+        self.lease_ttl = lease_ttl
+
+        self._lock = threading.Lock()
+        # kind → [next id, end of block (exclusive), lease time]
+        self._blocks: dict[str, list] = {}
+
+    def try_next(self, kind: str) -> int | None:
+        """Next ID from the current lease, or None if a new lease is needed."""
+        with self._lock:
+            block = self._blocks.get(kind)
+            if block is None or block[0] >= block[1] or time.monotonic() - block[2] > self.lease_ttl:
+                return None
+            block[0] += 1
+            return block[0] - 1
+
+    def next_id(self, kind: str) -> int:
+        """Next ID, leasing a new block from ids.json if needed (blocking)."""
+        with self._lock:
+            block = self._blocks.get(kind)
+            if block is None or block[0] >= block[1] or time.monotonic() - block[2] > self.lease_ttl:
+                start = self._lease(kind)
+                block = [start, start + self.block_size, time.monotonic()]
+                self._blocks[kind] = block
+            block[0] += 1
+            return block[0] - 1
+
+    def _lease(self, kind: str) -> int:
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        with os.fdopen(fd, "r+") as f:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                raw = f.read()
+                counters = json.loads(raw) if raw.strip() else {}
+                start = max(int(counters.get(kind, ID_START)), ID_START)
+                counters[kind] = start + self.block_size
+
+                f.seek(0)
+                f.write(json.dumps(counters))
+                f.truncate()
+                f.flush()
+                os.fsync(fd)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+        logger.debug(f"Leased {kind} IDs {start}..{start + self.block_size - 1}")
+        return start
+
+
+_allocator = IdAllocator()
+
+
+async def allocate_id(kind: str) -> int:
+    """
+    Allocate an ID of the given kind ("booking", "refill", "call").
+    Served from memory; only a new lease touches ids.json, off the event loop.
+    """
+    new_id = _allocator.try_next(kind)
+    if new_id is None:
+        new_id = await run_io(_allocator.next_id, kind)
+    return new_id
@@ -0,0 +1,874 @@
+import os
+import json
+import fcntl
+import heapq
+import datetime
+import functools
+import threading
+import logging
+from contextlib import contextmanager
+
+from doctor_names import DoctorNameIndex, doctor_id_for
+from slots import (
+    MINUTES_PER_DAY,
+    parse_date,
+    parse_time,
+    slot_key,
+    split_key,
+    format_date,
+    format_time,
+    format_slot,
+    slot_dict,
+)
+
+logger = logging.getLogger(__name__)
+
+
+DOCTORS_FILE_PATH = os.path.join(os.path.dirname(__file__), "doctors.json")
+JOURNAL_FILE_PATH = os.path.join(os.path.dirname(__file__), "doctors.journal.jsonl")
+LOCK_FILE_PATH = os.path.join(os.path.dirname(__file__), "doctors.lock")
+
+# Number of journal entries after which bookings are folded into the snapshot
+COMPACT_EVERY = 200
+
+# Alternatives offered when a requested slot is already taken
+MAX_ALTERNATIVES = 3
+
+# How far ahead slots can be booked, and how much of it get_doctors_list shows
+BOOKING_HORIZON_DAYS = int(os.getenv("BOOKING_HORIZON_DAYS", "90"))
+DOCTOR_LIST_DAYS = 7
+
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+def _parse_slot_times(times: list[str]) -> list[int]:
+    minutes = []
+    for slot_time in times:
+        try:
+            minutes.append(parse_time(slot_time))
+        except ValueError:
+            logger.warning(f"Skipping unreadable slot time {slot_time!r} in doctors.json")
+    return sorted(set(minutes))
+
+
+def _ordinal(slot_date: str) -> int:
+    return datetime.date.fromisoformat(slot_date).toordinal()
+
+
+def _entry_slot(entry: dict) -> int | None:
+    """Slot key of a journal or snapshot entry; older entries carry date and time strings."""
+    if "slot" in entry:
+        return int(entry["slot"])
+    try:
+        return slot_key(_ordinal(entry["date"]), parse_time(entry["time"]))
+    except (KeyError, ValueError):
+        return None
+
+
+def _weekday(ordinal: int) -> int:
+    # date.fromordinal(1) is a Monday
+    return (ordinal - 1) % 7
+
+
+def _free_minutes(doctor: dict, booked: dict, ordinal: int, today: int, now_minute: int) -> list[int]:
+    """Free slots of one day: template or override, minus bookings and, today, times already past."""
+    minutes = doctor["overrides"].get(ordinal)
+    if minutes is None:
+        minutes = doctor["weekly"][_weekday(ordinal)]
+
+    if booked:
+        base = slot_key(ordinal, 0)
+        minutes = [minute for minute in minutes if base + minute not in booked]
+
+    if ordinal == today:
+        minutes = [minute for minute in minutes if minute > now_minute]
+
+    return minutes
+
+
+def _now() -> tuple[int, int]:
+    """(today's ordinal, minutes since midnight)."""
+    now = datetime.datetime.now()
+    return now.date().toordinal(), now.hour * 60 + now.minute
+
+
+def _compile_schedule(doctor: dict) -> tuple[list[list[int]], dict[int, list[int]]]:
+    """
+    Turn a doctor's availability rules into a weekly template (Monday first)
+    and per-date overrides.
+
+    "weekly_availability" maps "mon".."sun" (or "daily" for every day not
+    listed) to slot times. "exceptions" entries close a "date" or a
+    "from"/"to" range (leave, holidays), or replace that date's slots when
+    they carry "slots". Legacy "available_slots" dates are treated as
+    overrides too.
+    """
+    rules = doctor.get("weekly_availability", {})
+    daily = _parse_slot_times(rules.get("daily", []))
+    weekly = [
+        _parse_slot_times(rules[day]) if day in rules else daily
+        for day in WEEKDAYS
+    ]
+
+    overrides: dict[int, list[int]] = {}
+    for slot_date, times in doctor.get("available_slots", {}).items():
+        overrides[_ordinal(slot_date)] = _parse_slot_times(times)
+
+    for exception in doctor.get("exceptions", []):
+        first = _ordinal(exception.get("date") or exception["from"])
+        last = _ordinal(exception.get("to") or exception.get("date") or exception["from"])
+        slots = _parse_slot_times(exception.get("slots", []))
+        for ordinal in range(first, last + 1):
+            overrides[ordinal] = slots
+
+    return weekly, overrides
+
+
+class Reservation:
+    """
+    Outcome of SlotInventory.reserve() or move().
+    On conflict, `alternatives` holds the nearest free slots as
+    {"doctor_id", "doctor_name", "date", "time", "time_slot"} dicts.
+    """
+
+    def __init__(
+        self,
+        ok: bool,
+        doctor_name: str,
+        slot: int,
+        alternatives: list[dict] | None = None,
+        reason: str = "",
+        doctor_id: str | None = None,
+    ) -> None:
+        self.ok = ok
+        self.doctor_name = doctor_name
+        self.doctor_id = doctor_id
+        self.slot = slot
+        self.alternatives = alternatives or []
+        self.reason = reason
+
+    @property
+    def time_slot(self) -> str:
+        return format_slot(self.slot)
+
+    def __bool__(self) -> bool:
+        return self.ok
+
+    def __repr__(self) -> str:
+        state = "ok" if self.ok else f"conflict: {self.reason}"
+        return f"Reservation({self.doctor_name!r}, {self.time_slot}, {state})"
+
+
+class SlotInventory:
+    """
+    Process-resident view of doctors.json.
+
+    Doctors are indexed by specialty and by ID; names as callers say them
+    resolve to IDs through a DoctorNameIndex. Their availability is
+    kept as compiled weekly templates plus per-date exceptions, and the
+    free slots of a day are generated on demand by removing booked slot
+    keys (see slots.py), so memory and load time don't depend on how far
+    ahead bookings are open. Only today (from the current time) up to
+    BOOKING_HORIZON_DAYS ahead is ever offered or bookable.
+
+    doctors.json is never rewritten. Bookings are appended to a journal;
+    every COMPACT_EVERY entries the still-relevant bookings are folded
+    into a snapshot file (doctors.bookings.json) and the journal starts
+    over, which also drops bookings for dates that have passed.
+
+    The journal is also how worker processes on the same host stay in
+    step: every mutation takes an exclusive flock on LOCK_FILE_PATH,
+    applies journal entries written by other processes since the last
+    read, and only then checks and claims the slot.
+    """
+
+    def __init__(
+        self,
+        doctors_path: str = DOCTORS_FILE_PATH,
+        journal_path: str = JOURNAL_FILE_PATH,
+        lock_path: str = LOCK_FILE_PATH,
+        compact_every: int = COMPACT_EVERY,
+        horizon_days: int = BOOKING_HORIZON_DAYS,
+    ) -> None:
+        self.doctors_path = doctors_path
+        self.snapshot_path = os.path.splitext(doctors_path)[0] + ".bookings.json"
+        self.journal_path = journal_path
+        self.lock_path = lock_path
+        self.compact_every = compact_every
+        self.horizon_days = horizon_days
+
+        self._lock = threading.RLock()
+        self._specialties: dict[str, list[dict]] = {}
+        self._by_id: dict[str, dict] = {}
+        self._names = DoctorNameIndex([])
+        self._journal_entries = 0
+        self._journal_offset = 0
+        self._generation = 0
+        self._lock_file = None
+        self._loaded = False
+
+    # --------------------------
+    # LOADING
+    # --------------------------
+
+    def load(self) -> None:
+        """Read doctors.json and the booking snapshot, then replay pending journal entries."""
+        with self._lock:
+            self._generation = self._read_generation()
+            with open(self.doctors_path, "r") as f:
+                doctors_db = json.load(f)
+
+            self._specialties = {}
+            self._by_id = {}
+
+            for specialty, doctors in doctors_db.items():
+                entries = []
+                for doctor in doctors:
+                    weekly, overrides = _compile_schedule(doctor)
+                    entry = {
+                        "doctor_id": doctor.get("doctor_id") or doctor_id_for(doctor["doctor_name"]),
+                        "doctor_name": doctor["doctor_name"],
+                        "qualification": doctor.get("qualification"),
+                        "experience": doctor.get("experience"),
+                        "specialty": specialty,
+                        "weekly": weekly,          # weekday → sorted minutes since midnight
+                        "overrides": overrides,    # date ordinal → sorted minutes ([] = closed)
+                        "booked": {},              # slot key → booking_id (or None)
+                    }
+                    entries.append(entry)
+                    self._by_id[entry["doctor_id"]] = entry
+                self._specialties[specialty] = entries
+            self._names = DoctorNameIndex([(doctor_id, d["doctor_name"]) for doctor_id, d in self._by_id.items()])
+
+            if os.path.exists(self.snapshot_path):
+                with open(self.snapshot_path, "r") as f:
+                    for booking in json.load(f).get("bookings", []):
+                        self._apply_book(booking)
+
+            self._journal_entries = 0
+            self._journal_offset = 0
+            self._replay_journal()
+            self._loaded = True
+
+            logger.info(
+                f"Loaded {len(self._by_id)} doctors in {len(self._specialties)} "
+                f"specialties ({self._journal_entries} journal entries replayed)"
+            )
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.load()
+        else:
+            self._sync()
+
+    def _sync(self) -> None:
+        """Apply journal entries appended by other processes since the last read."""
+        if self._read_generation() != self._generation:
+            # Another process compacted the journal into a new snapshot
+            self.load()
+            return
+
+        try:
+            size = os.path.getsize(self.journal_path)
+        except FileNotFoundError:
+            return
+
+        if size < self._journal_offset:
+            self.load()
+        elif size > self._journal_offset:
+            self._replay_journal()
+
+    def _read_generation(self) -> int:
+        """Compaction counter kept in the lock file; bumped every time the snapshot is rewritten."""
+        try:
+            with open(self.lock_path, "rb") as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            # Missing, or torn by a concurrent compaction → the next sync under the lock settles it
+            return -1
+
+    def _replay_journal(self) -> None:
+        try:
+            f = open(self.journal_path, "rb")
+        except FileNotFoundError:
+            return
+
+        with f:
+            f.seek(self._journal_offset)
+
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    # Another process is mid-append; pick the line up on the next sync
+                    break
+                self._journal_offset += len(raw)
+
+                line = raw.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A torn line from a crash mid-append; everything around it is valid
+                    logger.warning(f"Skipping unreadable journal line in {self.journal_path}")
+                    continue
+
+                op = entry.get("op")
+                if op == "book":
+                    self._apply_book(entry)
+                elif op == "release":
+                    self._apply_release(entry)
+                elif op == "move":
+                    self._apply_release(entry["from"])
+                    self._apply_book({**entry["to"], "booking_id": entry.get("booking_id")})
+                self._journal_entries += 1
+
+    @contextmanager
+    def _exclusive(self):
+        """Hold the inventory across threads of this process and across worker processes."""
+        with self._lock:
+            fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            with os.fdopen(fd, "r+b") as lock_file:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                try:
+                    self._ensure_loaded()
+                    self._lock_file = lock_file
+                    yield
+                finally:
+                    self._lock_file = None
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+
+    # --------------------------
+    # SLOT GENERATION
+    # --------------------------
+
+    def _bookable_days(self) -> tuple[int, int]:
+        today = datetime.date.today().toordinal()
+        return today, today + self.horizon_days - 1
+
+    def _template(self, doctor: dict, ordinal: int) -> list[int]:
+        minutes = doctor["overrides"].get(ordinal)
+        return doctor["weekly"][_weekday(ordinal)] if minutes is None else minutes
+
+    def _free_minutes(self, doctor: dict, ordinal: int) -> list[int]:
+        return _free_minutes(doctor, doctor["booked"], ordinal, *_now())
+
+    def _is_free(self, doctor: dict, slot: int) -> bool:
+        first, last = self._bookable_days()
+        ordinal, minute = split_key(slot)
+        if not first <= ordinal <= last or slot in doctor["booked"]:
+            return False
+        if ordinal == first:
+            now = datetime.datetime.now()
+            if minute <= now.hour * 60 + now.minute:
+                return False
+        return minute in self._template(doctor, ordinal)
+
+    # --------------------------
+    # LOOKUPS
+    # --------------------------
+
+    def specialties(self) -> list[str]:
+        with self._lock:
+            self._ensure_loaded()
+            return list(self._specialties)
+
+    def has_specialty(self, specialty: str) -> bool:
+        with self._lock:
+            self._ensure_loaded()
+            return specialty in self._specialties
+
+    def doctors_for(self, specialty: str) -> list[dict]:
+        """Return doctors for a specialty with their free slots for the next DOCTOR_LIST_DAYS days."""
+        with self._lock:
+            self._ensure_loaded()
+            return [self._public_view(doctor) for doctor in self._specialties.get(specialty, [])]
+
+    def has_slot(self, doctor_ref: str, slot: int) -> bool:
+        with self._lock:
+            self._ensure_loaded()
+            doctor = self._doctor(doctor_ref)
+            return doctor is not None and self._is_free(doctor, slot)
+
+    def _doctor(self, doctor_ref: str) -> dict | None:
+        """A doctor given by ID or by a name that resolves to exactly one doctor."""
+        doctor = self._by_id.get(doctor_ref)
+        if doctor is None:
+            doctor_id = self._names.resolve(doctor_ref).doctor_id
+            doctor = self._by_id.get(doctor_id) if doctor_id else None
+        return doctor
+
+    def nearest_slots(
+        self,
+        specialty: str,
+        slot_date: str,
+        end_date: str | None = None,
+        around: str | None = None,
+        earliest: str | None = None,
+        latest: str | None = None,
+        limit: int = MAX_ALTERNATIVES,
+        any_date: bool = False,
+    ) -> list[dict]:
+        """
+        Free slots for a specialty between slot_date and end_date (inclusive)
+        whose time falls in [earliest, latest], ranked by distance from
+        `around` on slot_date (or from the start of the window).
+        With any_date=True the whole booking horizon is considered.
+        Dates and times may be in any form slots.py understands.
+        Returns {"doctor_id", "doctor_name", "date", "time", "time_slot"} dicts.
+        """
+        first_day, last_day, anchor, window = _slot_query(slot_date, end_date, around, earliest, latest, any_date)
+
+        with self._lock:
+            self._ensure_loaded()
+            return self._nearest(
+                self._specialties.get(specialty, []), first_day, last_day, anchor, window, limit
+            )
+
+    def _nearest(
+        self,
+        doctors: list[dict],
+        first_day: int,
+        last_day: int | None,
+        anchor: int,
+        window: tuple[int, int],
+        limit: int,
+    ) -> list[dict]:
+        """Core of nearest_slots(); last_day=None searches the whole booking horizon."""
+        today, now_minute = _now()
+        free = [
+            functools.partial(_free_minutes, doctor, doctor["booked"], today=today, now_minute=now_minute)
+            for doctor in doctors
+        ]
+        return _rank_nearest(doctors, free, self._bookable_days(), first_day, last_day, anchor, window, limit)
+
+    def snapshot(self, specialty: str) -> "AvailabilitySnapshot | None":
+        """
+        Free slots of a specialty over the whole booking horizon, as of now.
+        Only the doctors' bookings are copied; a day's free slots are worked
+        out when a lookup first reaches it.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            doctors = self._specialties.get(specialty)
+            if doctors is None:
+                return None
+
+            now = _now()
+            free = [_FreeDays(doctor, now) for doctor in doctors]
+        return AvailabilitySnapshot(specialty, self._bookable_days(), list(doctors), free)
+
+    def _public_view(self, doctor: dict) -> dict:
+        return _doctor_view(doctor, functools.partial(self._free_minutes, doctor), self._bookable_days())
+
+    # --------------------------
+    # BOOKING
+    # --------------------------
+
+    def reserve(self, doctor_ref: str, slot: int, booking_id: int | None = None) -> Reservation:
+        """
+        Atomically check and claim a slot of a doctor (by ID or name),
+        recording which booking holds it. Returns a falsy Reservation with
+        the nearest free alternatives if the slot is taken, in the past,
+        beyond the horizon or unknown, or if the name fits several doctors.
+        """
+        with self._exclusive():
+            reservation, doctor = self._check_free(doctor_ref, slot)
+            if not reservation:
+                return reservation
+
+            doctor["booked"][slot] = booking_id
+            self._append_journal({
+                "op": "book",
+                "doctor_id": doctor["doctor_id"],
+                "doctor_name": doctor["doctor_name"],
+                "slot": slot,
+                "time_slot": format_slot(slot),
+                "booking_id": booking_id,
+                "at": datetime.datetime.now().isoformat(),
+            })
+            self._maybe_compact()
+
+            return reservation
+
+    def release(self, doctor_ref: str, slot: int, booking_id: int | None = None) -> bool:
+        """
+        Return a booked slot to the inventory.
+        Only the booking that holds the slot (or any caller, for slots booked
+        without an ID) can release it; returns False otherwise or if the
+        slot wasn't booked.
+        """
+        with self._exclusive():
+            doctor = self._holder_of(doctor_ref, slot, booking_id)
+            if doctor is None:
+                return False
+
+            del doctor["booked"][slot]
+            self._append_journal({
+                "op": "release",
+                "doctor_id": doctor["doctor_id"],
+                "doctor_name": doctor["doctor_name"],
+                "slot": slot,
+                "time_slot": format_slot(slot),
+                "booking_id": booking_id,
+                "at": datetime.datetime.now().isoformat(),
+            })
+            self._maybe_compact()
+            return True
+
+    def move(
+        self,
+        booking_id: int | None,
+        old: tuple[str, int] | None,
+        new: tuple[str, int],
+    ) -> Reservation:
+        """
+        Atomically release the (doctor, slot) `old` held by booking_id
+        and claim `new` for it, as a single journal entry.
+        If `new` can't be claimed nothing changes and the falsy Reservation
+        carries alternatives. An `old` slot that is None or no longer held
+        (past, legacy or already freed) is simply not released.
+        """
+        with self._exclusive():
+            reservation, doctor = self._check_free(*new)
+            if not reservation:
+                return reservation
+
+            old_doctor = self._holder_of(*old, booking_id) if old else None
+            if old_doctor is not None:
+                del old_doctor["booked"][old[1]]
+            doctor["booked"][new[1]] = booking_id
+
+            self._append_journal({
+                "op": "move",
+                "booking_id": booking_id,
+                "from": {
+                    "doctor_id": old_doctor["doctor_id"],
+                    "doctor_name": old_doctor["doctor_name"],
+                    "slot": old[1],
+                    "time_slot": format_slot(old[1]),
+                    "booking_id": booking_id,
+                } if old_doctor is not None else {},
+                "to": {
+                    "doctor_id": doctor["doctor_id"],
+                    "doctor_name": doctor["doctor_name"],
+                    "slot": new[1],
+                    "time_slot": format_slot(new[1]),
+                },
+                "at": datetime.datetime.now().isoformat(),
+            })
+            self._maybe_compact()
+
+            return reservation
+
+    def _check_free(self, doctor_ref: str, slot: int) -> tuple[Reservation, dict | None]:
+        """(Reservation, doctor) for a slot that may be claimed; a falsy Reservation otherwise."""
+        match = self._names.resolve(doctor_ref)
+        if match.ambiguous:
+            names = ", ".join(self._names.display_name(doctor_id) for doctor_id in match.candidates)
+            return Reservation(False, doctor_ref, slot, reason=f"the name fits {names}"), None
+        doctor = self._by_id.get(match.doctor_id) if match else None
+        if doctor is None:
+            return Reservation(False, doctor_ref, slot, reason="unknown doctor"), None
+
+        if not self._is_free(doctor, slot):
+            reservation = Reservation(
+                False,
+                doctor["doctor_name"],
+                slot,
+                alternatives=self._nearest_alternatives(doctor, slot),
+                reason="slot unavailable",
+                doctor_id=doctor["doctor_id"],
+            )
+            return reservation, None
+
+        return Reservation(True, doctor["doctor_name"], slot, doctor_id=doctor["doctor_id"]), doctor
+
+    def _holder_of(self, doctor_ref: str, slot: int, booking_id: int | None) -> dict | None:
+        """The doctor if the slot is booked and held by booking_id (or by nobody in particular)."""
+        doctor = self._doctor(doctor_ref)
+        if doctor is None or slot not in doctor["booked"]:
+            return None
+        holder = doctor["booked"][slot]
+        if holder is not None and booking_id is not None and holder != booking_id:
+            return None
+        return doctor
+
+    def _maybe_compact(self) -> None:
+        if self._journal_entries >= self.compact_every:
+            self._compact_locked()
+
+    def _nearest_alternatives(self, doctor: dict, slot: int) -> list[dict]:
+        """Free slots closest to the requested one: this doctor first, then the rest of the specialty."""
+        ordinal, minute = split_key(slot)
+        window = (0, MINUTES_PER_DAY - 1)
+        alternatives = self._nearest([doctor], ordinal, None, minute, window, MAX_ALTERNATIVES)
+        if len(alternatives) < MAX_ALTERNATIVES:
+            others = [d for d in self._specialties[doctor["specialty"]] if d is not doctor]
+            alternatives += self._nearest(
+                others, ordinal, None, minute, window, MAX_ALTERNATIVES - len(alternatives)
+            )
+        return alternatives
+
+    def _apply_book(self, entry: dict) -> None:
+        # Entries written before doctor IDs existed only carry the name
+        doctor = self._doctor(entry.get("doctor_id") or entry.get("doctor_name", ""))
+        slot = _entry_slot(entry)
+        if doctor is not None and slot is not None:
+            doctor["booked"][slot] = entry.get("booking_id")
+
+    def _apply_release(self, entry: dict) -> None:
+        if not entry:
+            return
+        slot = _entry_slot(entry)
+        doctor_ref = entry.get("doctor_id") or entry["doctor_name"]
+        doctor = self._holder_of(doctor_ref, slot, entry.get("booking_id")) if slot is not None else None
+        if doctor is not None:
+            del doctor["booked"][slot]
+
+    def _append_journal(self, entry: dict) -> None:
+        with open(self.journal_path, "ab") as f:
+            line = (json.dumps(entry) + "\n").encode()
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        # Only called under _exclusive(), after _sync(), so the write landed at our offset
+        self._journal_offset += len(line)
+        self._journal_entries += 1
+
+    # --------------------------
+    # COMPACTION
+    # --------------------------
+
+    def _compact_locked(self) -> None:
+        today = slot_key(datetime.date.today().toordinal(), 0)
+
+        bookings = []
+        for doctor in self._by_id.values():
+            # Bookings for past dates can never matter again
+            for slot in [s for s in doctor["booked"] if s < today]:
+                del doctor["booked"][slot]
+            for slot, booking_id in sorted(doctor["booked"].items()):
+                bookings.append({
+                    "doctor_id": doctor["doctor_id"],
+                    "doctor_name": doctor["doctor_name"],
+                    "slot": slot,
+                    "time_slot": format_slot(slot),
+                    "booking_id": booking_id,
+                })
+
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"bookings": bookings}, f)
+            f.flush()
+            os.fsync(f.fileno())
+
+        # Swap the snapshot in before dropping the journal so a crash
+        # in between only replays bookings that are already applied.
+        os.replace(tmp_path, self.snapshot_path)
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+
+        self._generation = max(self._generation, 0) + 1
+        self._lock_file.seek(0)
+        self._lock_file.write(b"%d\n" % self._generation)
+        self._lock_file.truncate()
+        self._lock_file.flush()
+
+        logger.info(f"Compacted {self._journal_entries} journal entries into {self.snapshot_path}")
+        self._journal_entries = 0
+        self._journal_offset = 0
+
+
+def _slot_query(
+    slot_date: str,
+    end_date: str | None,
+    around: str | None,
+    earliest: str | None,
+    latest: str | None,
+    any_date: bool,
+) -> tuple[int, int | None, int, tuple[int, int]]:
+    """(first day, last day or None for any, anchor minute, (earliest, latest) minute) of a nearest_slots() query."""
+    first_day = parse_date(slot_date)
+    if any_date:
+        last_day = None
+    else:
+        last_day = parse_date(end_date) if end_date else first_day
+    window = (
+        parse_time(earliest) if earliest else 0,
+        parse_time(latest) if latest else MINUTES_PER_DAY - 1,
+    )
+    anchor = parse_time(around) if around else window[0]
+    return first_day, last_day, anchor, window
+
+
+def _days_outward(
+    horizon: tuple[int, int], first_day: int, last_day: int | None, origin: int, window: tuple[int, int]
+):
+    """
+    (distance bound, ordinal) of the days to search, nearest to origin
+    first: no slot of that day or any later-yielded one can be closer
+    than the bound.
+    """
+    lo, hi = horizon
+    if last_day is not None:
+        lo, hi = max(first_day, lo), min(last_day, hi)
+    after, before = max(first_day, lo), min(first_day - 1, hi)
+    while after <= hi or before >= lo:
+        after_bound = slot_key(after, window[0]) - origin if after <= hi else None
+        before_bound = origin - slot_key(before, window[1]) if before >= lo else None
+        if before_bound is None or (after_bound is not None and after_bound <= before_bound):
+            yield max(after_bound, 0), after
+            after += 1
+        else:
+            yield max(before_bound, 0), before
+            before -= 1
+
+
+def _rank_nearest(
+    doctors: list[dict],
+    free: list,
+    horizon: tuple[int, int],
+    first_day: int,
+    last_day: int | None,
+    anchor: int,
+    window: tuple[int, int],
+    limit: int,
+) -> list[dict]:
+    """
+    The `limit` free slots nearest to anchor on first_day, from doctors in
+    rank order and, for each, a function giving its free minutes of a date
+    ordinal. Days are searched outward from first_day, and the search
+    stops once the next day could not hold anything closer than the
+    `limit` slots found so far, so a near match costs one or two days of
+    free lists rather than the whole horizon.
+    """
+    if limit <= 0:
+        return []
+    origin = slot_key(first_day, anchor)
+
+    # Max-heap (by negated key) of the best `limit` (distance, rank, slot) found so far
+    best: list[tuple[int, int, int]] = []
+    for bound, ordinal in _days_outward(horizon, first_day, last_day, origin, window):
+        if len(best) == limit and bound > -best[0][0]:
+            break
+        base = slot_key(ordinal, 0)
+        for rank, free_minutes in enumerate(free):
+            for minute in free_minutes(ordinal):
+                if window[0] <= minute <= window[1]:
+                    slot = base + minute
+                    key = (-abs(slot - origin), -rank, -slot)
+                    if len(best) < limit:
+                        heapq.heappush(best, key)
+                    elif key > best[0]:
+                        heapq.heapreplace(best, key)
+
+    return [
+        slot_dict(doctors[-rank]["doctor_name"], -slot, doctors[-rank]["doctor_id"])
+        for _, rank, slot in sorted(best, reverse=True)
+    ]
+
+
+def _doctor_view(doctor: dict, free_minutes, horizon: tuple[int, int]) -> dict:
+    """A doctor with their free slots for the next DOCTOR_LIST_DAYS days."""
+    first, last = horizon
+    available_slots = {}
+    for ordinal in range(first, min(first + DOCTOR_LIST_DAYS - 1, last) + 1):
+        minutes = free_minutes(ordinal)
+        if minutes:
+            available_slots[format_date(ordinal)] = [format_time(minute) for minute in minutes]
+
+    return {
+        "doctor_id": doctor["doctor_id"],
+        "doctor_name": doctor["doctor_name"],
+        "qualification": doctor["qualification"],
+        "experience": doctor["experience"],
+        "available_slots": available_slots,
+    }
+
+
+class _FreeDays:
+    """
+    A doctor's free minutes by date as of one moment: bookings are copied
+    up front, each day's list is built and kept on first use.
+    """
+
+    def __init__(self, doctor: dict, now: tuple[int, int]) -> None:
+        self.doctor = doctor
+        self.booked = dict(doctor["booked"])
+        self.today, self.now_minute = now
+        self._days: dict[int, list[int]] = {}
+
+    def __call__(self, ordinal: int) -> list[int]:
+        minutes = self._days.get(ordinal)
+        if minutes is None:
+            minutes = self._days[ordinal] = _free_minutes(
+                self.doctor, self.booked, ordinal, self.today, self.now_minute
+            )
+        return minutes
+
+
+class AvailabilitySnapshot:
+    """
+    Free slots of one specialty as SlotInventory.snapshot() saw them.
+
+    Answers has_specialty(), doctors_for() and nearest_slots() like the
+    inventory, but without its lock or journal sync. Slots booked since
+    the snapshot was taken still look free; reserve() has the final say.
+    """
+
+    def __init__(
+        self,
+        specialty: str,
+        horizon: tuple[int, int],
+        doctors: list[dict],
+        free: list[_FreeDays],
+    ) -> None:
+        self.specialty = specialty
+        self.horizon = horizon
+        self._doctors = doctors
+        self._free = free
+        self._views: list[dict] | None = None
+
+    def has_specialty(self, specialty: str) -> bool:
+        return specialty == self.specialty
+
+    def doctors_for(self, specialty: str) -> list[dict]:
+        if specialty != self.specialty:
+            return []
+        if self._views is None:
+            self._views = [
+                _doctor_view(doctor, free, self.horizon) for doctor, free in zip(self._doctors, self._free)
+            ]
+        return list(self._views)
+
+    def nearest_slots(
+        self,
+        specialty: str,
+        slot_date: str,
+        end_date: str | None = None,
+        around: str | None = None,
+        earliest: str | None = None,
+        latest: str | None = None,
+        limit: int = MAX_ALTERNATIVES,
+        any_date: bool = False,
+    ) -> list[dict]:
+        if specialty != self.specialty:
+            return []
+        first_day, last_day, anchor, window = _slot_query(slot_date, end_date, around, earliest, latest, any_date)
+        return _rank_nearest(self._doctors, self._free, self.horizon, first_day, last_day, anchor, window, limit)
+
+
+_inventory: SlotInventory | None = None
+_inventory_lock = threading.Lock()
+
+
+def get_inventory() -> SlotInventory:
+    """Return the process-wide inventory, loading it on first use."""
+    global _inventory
+
+    with _inventory_lock:
+        if _inventory is None:
+            inventory = SlotInventory()
+            inventory.load()
+            _inventory = inventory
+        return _inventory
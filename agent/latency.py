@@ -0,0 +1,265 @@
+import os
+import time
+import asyncio
+import logging
+import functools
+import threading
+from collections import deque
+
+from livekit.agents import AgentSession, get_job_context
+from livekit.agents.metrics import EOUMetrics, LLMMetrics, TTSMetrics
+
+from persistence import run_io, percentile, get_append_log
+
+logger = logging.getLogger(__name__)
+
+
+# Prometheus text-format file per worker process (e.g. for node_exporter's
+# textfile collector), rewritten every LATENCY_FLUSH_INTERVAL seconds
+LATENCY_METRICS_DIR = os.getenv("LATENCY_METRICS_DIR", "metrics")
+LATENCY_FLUSH_INTERVAL = float(os.getenv("LATENCY_FLUSH_INTERVAL", "10"))
+
+# Per-call latency summaries, one JSON line per finished call
+LATENCY_CALLS_FILE_PATH = "latency_calls.jsonl"
+
+LATENCY_SAMPLES = 1024        # most recent samples kept per series for quantiles
+QUANTILES = (50, 95, 99)
+
+# Stages recorded per turn
+#   stt_final        end of speech → final transcript
+#   end_of_utterance end of speech → turn committed (includes stt_final and turn detection)
+#   llm_ttft         LLM request → first token
+#   tool             one function tool call (labelled with the tool)
+#   tts_ttfb         TTS request → first audio byte
+#   mouth_to_ear     end of the caller's speech → agent audio starts playing
+#   first_greeting   job start → greeting starts playing
+#   prefetch_saved   inventory lookup time an availability prefetch saved (prefetch.py)
+#
+# Per call, the prompt tokens of each LLM request are summarised too
+# (mean and max), to relate TTFT to the size of the instructions.
+
+
+def current_room() -> str:
+    try:
+        return get_job_context().room.name
+    except RuntimeError:
+        return "-"
+
+
+class LatencySeries:
+    def __init__(self) -> None:
+        self.samples: deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def quantiles(self) -> dict[int, float]:
+        samples = list(self.samples)
+        return {q: percentile(samples, q) for q in QUANTILES}
+
+
+class LatencyRegistry:
+    """
+    Latency samples of this worker process, by (stage, tool, room).
+
+    Every sample is also counted under room "all", which is kept for the
+    life of the process; a room's own series are dropped when its call
+    ends, after a summary has been written to LATENCY_CALLS_FILE_PATH.
+    """
+
+    def __init__(self, metrics_dir: str = LATENCY_METRICS_DIR) -> None:
+        self.path = os.path.join(metrics_dir, f"healthline_{os.getpid()}.prom")
+        self._series: dict[tuple[str, str, str], LatencySeries] = {}
+        self._counters: dict[str, int] = {}
+        self._flush_task: asyncio.Task | None = None
+
+    def record(self, stage: str, seconds: float, room: str, tool: str = "") -> None:
+        if seconds < 0:
+            return
+        for scope in (room, "all"):
+            series = self._series.get((stage, tool, scope))
+            if series is None:
+                series = self._series[(stage, tool, scope)] = LatencySeries()
+            series.add(seconds)
+
+    def increment(self, counter: str, by: int = 1) -> None:
+        """Count a process-wide event, exposed as healthline_<counter>_total."""
+        self._counters[counter] = self._counters.get(counter, 0) + by
+
+    def counters(self) -> dict[str, int]:
+        return dict(self._counters)
+
+    def summary(self, room: str) -> dict:
+        """{stage or "tool:<name>": {"count", "p50_ms", "p95_ms", "p99_ms"}} for one room."""
+        summary = {}
+        for (stage, tool, scope), series in sorted(self._series.items()):
+            if scope != room:
+                continue
+            quantiles = series.quantiles()
+            summary[f"tool:{tool}" if tool else stage] = {
+                "count": series.count,
+                **{f"p{q}_ms": round(quantiles[q] * 1000, 1) for q in QUANTILES},
+            }
+        return summary
+
+    def drop_room(self, room: str) -> None:
+        for key in [key for key in self._series if key[2] == room]:
+            del self._series[key]
+
+    def render(self) -> str:
+        """Prometheus text exposition of every series as a summary with p50/p95/p99."""
+        lines = [
+            "# HELP healthline_latency_seconds Latency of voice pipeline stages and function tools.",
+            "# TYPE healthline_latency_seconds summary",
+        ]
+        pid = os.getpid()
+        for (stage, tool, room), series in sorted(self._series.items()):
+            labels = f'pid="{pid}",room="{_escape(room)}",stage="{stage}"'
+            if tool:
+                labels += f',tool="{tool}"'
+            for q, value in series.quantiles().items():
+                lines.append(f'healthline_latency_seconds{{{labels},quantile="{q / 100}"}} {value:.6f}')
+            lines.append(f"healthline_latency_seconds_sum{{{labels}}} {series.total:.6f}")
+            lines.append(f"healthline_latency_seconds_count{{{labels}}} {series.count}")
+        for counter, value in sorted(self._counters.items()):
+            lines.append(f"# TYPE healthline_{counter}_total counter")
+            lines.append(f'healthline_{counter}_total{{pid="{pid}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def write(self) -> None:
+        """Atomically replace this process's metrics file (blocking)."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Calls ending together flush concurrently on the I/O pool
+        tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render())
+        os.replace(tmp_path, self.path)
+
+    async def flush(self) -> None:
+        try:
+            await run_io(self.write)
+        except OSError as e:
+            logger.error(f"Failed to write latency metrics to {self.path}: {e}")
+
+    def start(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._run(), name="latency-metrics-flush")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(LATENCY_FLUSH_INTERVAL)
+            await self.flush()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_registry: LatencyRegistry | None = None
+
+
+def get_latency_registry() -> LatencyRegistry:
+    global _registry
+
+    if _registry is None:
+        _registry = LatencyRegistry()
+    return _registry
+
+
+class TurnTracer:
+    """
+    Records per-turn latencies of one AgentSession from its
+    metrics_collected and agent_state_changed events.
+    """
+
+    def __init__(self, session: AgentSession, room: str, job_started_at: float | None = None) -> None:
+        self.session = session
+        self.room = room
+        self.registry = get_latency_registry()
+
+        self._job_started_at = job_started_at     # wall clock
+        self._speech_ended_at: float | None = None
+        self._prompt_tokens: list[int] = []
+
+    def attach(self) -> None:
+        self.session.on("metrics_collected", self._on_metrics)
+        self.session.on("agent_state_changed", self._on_agent_state)
+        self.registry.start()
+
+    async def close(self) -> None:
+        """Write the call's summary and drop its series; call once the session is over."""
+        self.session.off("metrics_collected", self._on_metrics)
+        self.session.off("agent_state_changed", self._on_agent_state)
+
+        summary = self.registry.summary(self.room)
+        prompt_tokens = self.prompt_tokens()
+        logger.info(f"Latency for room {self.room}: {summary}, prompt tokens: {prompt_tokens}")
+        try:
+            await get_append_log(LATENCY_CALLS_FILE_PATH).append({
+                "room": self.room,
+                "ended_at": time.time(),
+                "latency": summary,
+                "prompt_tokens": prompt_tokens,
+            })
+        except Exception as e:
+            logger.error(f"Failed to write latency summary for room {self.room}: {e}")
+
+        self.registry.drop_room(self.room)
+        await self.registry.flush()
+
+    def prompt_tokens(self) -> dict:
+        tokens = self._prompt_tokens
+        return {
+            "requests": len(tokens),
+            "mean": round(sum(tokens) / len(tokens)) if tokens else 0,
+            "max": max(tokens, default=0),
+        }
+
+    def _on_metrics(self, ev) -> None:
+        m = ev.metrics
+        if isinstance(m, EOUMetrics):
+            self.registry.record("stt_final", m.transcription_delay, self.room)
+            self.registry.record("end_of_utterance", m.end_of_utterance_delay, self.room)
+            # EOU metrics are stamped once the turn is committed
+            self._speech_ended_at = m.timestamp - m.on_user_turn_completed_delay - m.end_of_utterance_delay
+        elif isinstance(m, LLMMetrics):
+            if not m.cancelled:
+                self.registry.record("llm_ttft", m.ttft, self.room)
+                self._prompt_tokens.append(m.prompt_tokens)
+        elif isinstance(m, TTSMetrics):
+            if not m.cancelled:
+                self.registry.record("tts_ttfb", m.ttfb, self.room)
+
+    def _on_agent_state(self, ev) -> None:
+        if ev.new_state != "speaking":
+            return
+        if self._job_started_at is not None:
+            latency = ev.created_at - self._job_started_at
+            self.registry.record("first_greeting", latency, self.room)
+            logger.info(f"First greeting for room {self.room} after {latency:.2f}s")
+            self._job_started_at = None
+        if self._speech_ended_at is not None:
+            self.registry.record("mouth_to_ear", ev.created_at - self._speech_ended_at, self.room)
+            self._speech_ended_at = None
+
+
+def traced_tool(fn):
+    """
+    Record every call of a function tool under stage "tool".
+    Goes below @function_tool(); the tool's signature is preserved.
+    """
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            get_latency_registry().record("tool", elapsed, current_room(), tool=fn.__name__)
+            logger.debug(f"{fn.__name__} took {elapsed * 1000:.0f} ms")
+
+    return wrapper
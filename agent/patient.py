@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import weakref
+
+from livekit import rtc
+from livekit.agents import AgentSession
+
+from persistence import run_io
+from latency import get_latency_registry
+from records import get_appointment_index, get_refill_index, normalize_phone
+
+logger = logging.getLogger(__name__)
+
+
+# Details every booking and refill needs, collected once per caller
+PROFILE_FIELDS = ("customer_name", "age", "phone", "address")
+
+
+class PatientProfile:
+    """
+    What is known about the caller of one session: their phone number
+    from caller ID, the name on their last booking or refill, and anything
+    they give during the call, which replaces both. Age and address are
+    never taken from records: a shared or reassigned number would hand
+    them to whoever calls from it next.
+    """
+
+    def __init__(self) -> None:
+        self.fields: dict[str, str] = {}
+        # Where each field came from: "caller_id", "records" or "call"
+        self.sources: dict[str, str] = {}
+
+    def known(self) -> dict[str, str]:
+        return {field: self.fields[field] for field in PROFILE_FIELDS if self.fields.get(field)}
+
+    def remember(self, source: str, **fields) -> None:
+        for field, value in fields.items():
+            if field in PROFILE_FIELDS and value and str(value).strip():
+                self.fields[field] = str(value).strip()
+                self.sources[field] = source
+
+    def fill(self, **given) -> dict[str, str]:
+        """The given tool arguments, with the empty ones taken from the profile."""
+        return {field: (value or "").strip() or self.fields.get(field, "") for field, value in given.items()}
+
+    def __repr__(self) -> str:
+        return f"PatientProfile({self.known()!r})"
+
+
+_profiles: "weakref.WeakKeyDictionary[AgentSession, PatientProfile]" = weakref.WeakKeyDictionary()
+
+
+def get_patient_profile(session: AgentSession) -> PatientProfile:
+    profile = _profiles.get(session)
+    if profile is None:
+        profile = _profiles[session] = PatientProfile()
+    return profile
+
+
+def caller_phone(participant: rtc.RemoteParticipant) -> str | None:
+    """Phone number of a SIP caller, from the participant's SIP attributes or identity."""
+    if participant.kind != rtc.ParticipantKind.PARTICIPANT_KIND_SIP and not participant.identity.startswith("sip"):
+        return None
+    number = participant.attributes.get("sip.phoneNumber") or participant.identity.removeprefix("sip:").removeprefix("sip_")
+    return normalize_phone(number) or None
+
+
+def last_known_details(phone: str) -> dict[str, str]:
+    """Blocking: the name on the caller's newest booking or refill that has one."""
+    records = get_appointment_index().find(phone=phone) + get_refill_index().find(phone=phone)
+    records.sort(key=lambda record: record.get("updated_at") or record.get("saved_at") or "")
+
+    details = {}
+    for record in records:
+        if record.get("customer_name"):
+            details["customer_name"] = record["customer_name"]
+    return details
+
+
+class PatientProfileLoader:
+    """
+    Seeds a session's PatientProfile from caller ID as soon as the SIP
+    participant is in the room, and looks up the name on file for that
+    number in the background for the assistant to confirm.
+    """
+
+    def __init__(self, session: AgentSession, room: rtc.Room) -> None:
+        self.session = session
+        self.room = room
+        self.profile = get_patient_profile(session)
+        self._task: asyncio.Task | None = None
+
+    def attach(self) -> None:
+        self.room.on("participant_connected", self._on_participant)
+        for participant in self.room.remote_participants.values():
+            self._on_participant(participant)
+
+    async def close(self) -> None:
+        self.room.off("participant_connected", self._on_participant)
+        if self._task is not None:
+            self._task.cancel()
+
+    def _on_participant(self, participant: rtc.RemoteParticipant) -> None:
+        phone = caller_phone(participant)
+        if phone is None or self._task is not None:
+            return
+        self.profile.remember("caller_id", phone=phone)
+        self._task = asyncio.create_task(self._load(phone))
+
+    async def _load(self, phone: str) -> None:
+        try:
+            details = await run_io(last_known_details, phone)
+        except Exception as e:
+            logger.warning(f"Patient profile lookup for room {self.room.name} failed: {e}")
+            return
+
+        registry = get_latency_registry()
+        if not details:
+            registry.increment("patient_profile_misses")
+            return
+        registry.increment("patient_profile_hits")
+        # Details the caller already gave in this call win
+        self.profile.remember("records", **{
+            field: value for field, value in details.items() if field not in self.profile.known()
+        })
+        logger.info(f"Found patient profile for room {self.room.name}: {sorted(details)}")
@@ -0,0 +1,398 @@
+import os
+import re
+import json
+import time
+import fcntl
+import queue
+import atexit
+import asyncio
+import datetime
+import logging
+import functools
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+# Blocking file I/O from tools runs on this many threads, never on the event loop
+IO_WORKERS = int(os.getenv("IO_WORKERS", "4"))
+
+# Loop stall monitor settings
+STALL_CHECK_INTERVAL = 0.05   # seconds between heartbeats
+STALL_THRESHOLD = 0.02        # lateness (s) above which a heartbeat counts as a stall
+STALL_WARN = 0.1              # stalls longer than this are logged
+STALL_HISTORY = 2048          # most recent stalls kept for percentiles
+LAG_WINDOW = 2.0              # seconds of heartbeats recent_lag() averages over
+
+# Append-log (appointments.jsonl / prescriptions.jsonl) settings
+#   "always"   → fsync every group commit; callers are acked only once durable
+#   "interval" → fsync at most every APPEND_LOG_FSYNC_INTERVAL seconds
+#   "never"    → leave it to the OS
+APPEND_LOG_FSYNC = os.getenv("APPEND_LOG_FSYNC", "always")
+APPEND_LOG_FSYNC_INTERVAL = float(os.getenv("APPEND_LOG_FSYNC_INTERVAL", "1.0"))
+APPEND_LOG_MAX_BATCH = 512                                                # records per group commit
+APPEND_LOG_MAX_BYTES = int(os.getenv("APPEND_LOG_MAX_BYTES", str(64 * 1024 * 1024)))  # 0 → no size rotation
+APPEND_LOG_ROTATE_DAILY = os.getenv("APPEND_LOG_ROTATE_DAILY", "1") == "1"
+
+
+_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="healthline-io")
+_io_in_flight = 0
+
+
+async def run_io(fn, *args, **kwargs):
+    """Run a blocking callable on the I/O thread pool and await its result."""
+    global _io_in_flight
+
+    loop = asyncio.get_running_loop()
+    _io_in_flight += 1
+    try:
+        return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+    finally:
+        _io_in_flight -= 1
+
+
+def io_in_flight() -> int:
+    """run_io() calls queued or running in this process."""
+    return _io_in_flight
+
+
+# --------------------------
+# GROUP-COMMITTED APPEND LOGS
+# --------------------------
+
+def _segment_key(path: str, name: str) -> tuple | None:
+    stem, ext = os.path.splitext(os.path.basename(path))
+    match = re.fullmatch(rf"{re.escape(stem)}\.(\d{{4}}-\d{{2}}-\d{{2}})(?:\.(\d+))?{re.escape(ext)}", name)
+    if match is None:
+        return None
+    return match.group(1), int(match.group(2) or 0)
+
+
+def list_segments(path: str) -> list[str]:
+    """
+    All files making up an append log, oldest first: rotated segments
+    (name.YYYY-MM-DD[.N].ext) followed by the active file.
+    """
+    directory = os.path.dirname(path) or "."
+    segments = []
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        names = []
+    for name in names:
+        key = _segment_key(path, name)
+        if key is not None:
+            segments.append((key, os.path.join(directory, name)))
+
+    result = [segment for _, segment in sorted(segments)]
+    if os.path.exists(path):
+        result.append(path)
+    return result
+
+
+def _resolve(future: asyncio.Future, error: Exception | None) -> None:
+    if future.cancelled():
+        return
+    if error is None:
+        future.set_result(None)
+    else:
+        future.set_exception(error)
+
+
+class AppendLogWriter:
+    """
+    Shared JSONL writer for one log file.
+
+    Records from every session are queued to a dedicated writer thread.
+    Whatever has queued up while the previous commit was in flight is
+    written with a single write() and, depending on the fsync policy, a
+    single fsync(), after which all of those callers are acknowledged.
+
+    Each commit holds an flock on the active file so several worker
+    processes can share it, and the file is rotated into dated segments
+    by size or at the first write of a new day.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        fsync_policy: str = APPEND_LOG_FSYNC,
+        max_batch: int = APPEND_LOG_MAX_BATCH,
+        max_bytes: int = APPEND_LOG_MAX_BYTES,
+        rotate_daily: bool = APPEND_LOG_ROTATE_DAILY,
+    ) -> None:
+        if fsync_policy not in ("always", "interval", "never"):
+            raise ValueError(f"Unknown fsync policy: {fsync_policy!r}")
+
+        self.path = path
+        self.fsync_policy = fsync_policy
+        self.max_batch = max_batch
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self._file = None
+        self._last_fsync = 0.0
+
+        self.commits = 0
+        self.records = 0
+
+    async def append(self, record: dict) -> None:
+        """Queue a record and return once it has been committed."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._ensure_started()
+        self._queue.put((json.dumps(record) + "\n", loop, future))
+        await future
+
+    def close(self) -> None:
+        """Commit everything queued so far and stop the writer thread."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _ensure_started(self) -> None:
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    name = f"append-log-{os.path.basename(self.path)}"
+                    self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+                    self._thread.start()
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            batch = [item]
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            error = None
+            try:
+                self._commit("".join(line for line, _, _ in batch).encode())
+            except Exception as e:
+                logger.error(f"Failed to commit {len(batch)} records to {self.path}: {e}", exc_info=True)
+                error = e
+
+            for _, loop, future in batch:
+                try:
+                    loop.call_soon_threadsafe(_resolve, future, error)
+                except RuntimeError:
+                    # The caller's loop has already shut down
+                    pass
+
+    def _commit(self, data: bytes) -> None:
+        f = self._lock_active_file()
+        try:
+            if self._should_rotate(f, len(data)):
+                f = self._rotate(f)
+
+            f.write(data)
+            f.flush()
+
+            now = time.monotonic()
+            if self.fsync_policy == "always" or (
+                self.fsync_policy == "interval" and now - self._last_fsync >= APPEND_LOG_FSYNC_INTERVAL
+            ):
+                os.fsync(f.fileno())
+                self._last_fsync = now
+
+            self.commits += 1
+            self.records += data.count(b"\n")
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _lock_active_file(self):
+        """Open (or reuse) the active file and lock it, following rotations done by other processes."""
+        while True:
+            if self._file is None:
+                self._file = open(self.path, "ab")
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+
+            try:
+                current = os.stat(self.path).st_ino == os.fstat(self._file.fileno()).st_ino
+            except FileNotFoundError:
+                current = False
+            if current:
+                return self._file
+
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+    def _should_rotate(self, f, incoming: int) -> bool:
+        stat = os.fstat(f.fileno())
+        if stat.st_size == 0:
+            return False
+        if self.max_bytes and stat.st_size + incoming > self.max_bytes:
+            return True
+        if self.rotate_daily:
+            return datetime.date.fromtimestamp(stat.st_mtime) != datetime.date.today()
+        return False
+
+    def _rotate(self, f):
+        """Rename the locked active file to its next segment name and lock a fresh one."""
+        stem, ext = os.path.splitext(self.path)
+        day = datetime.date.fromtimestamp(os.fstat(f.fileno()).st_mtime).isoformat()
+
+        segment = f"{stem}.{day}{ext}"
+        n = 0
+        while os.path.exists(segment):
+            n += 1
+            segment = f"{stem}.{day}.{n}{ext}"
+
+        if self.fsync_policy != "never":
+            os.fsync(f.fileno())
+        os.rename(self.path, segment)
+        logger.info(f"Rotated {self.path} → {segment}")
+
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        f.close()
+        self._file = None
+        return self._lock_active_file()
+
+
+_append_logs: dict[str, AppendLogWriter] = {}
+_append_logs_lock = threading.Lock()
+
+
+def get_append_log(path: str) -> AppendLogWriter:
+    """Return the process-wide writer for an append log."""
+    key = os.path.abspath(path)
+    with _append_logs_lock:
+        writer = _append_logs.get(key)
+        if writer is None:
+            writer = AppendLogWriter(path)
+            _append_logs[key] = writer
+        return writer
+
+
+@atexit.register
+def _close_append_logs() -> None:
+    for writer in list(_append_logs.values()):
+        writer.close()
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class LoopStallMonitor:
+    """
+    Measures how late the event loop runs a periodic heartbeat.
+    Any lateness is time the loop spent blocked, i.e. time STT/TTS
+    audio frames for every session on this worker were not pumped.
+    """
+
+    def __init__(
+        self,
+        interval: float = STALL_CHECK_INTERVAL,
+        threshold: float = STALL_THRESHOLD,
+        warn_after: float = STALL_WARN,
+    ) -> None:
+        self.interval = interval
+        self.threshold = threshold
+        self.warn_after = warn_after
+
+        self._stalls: deque[float] = deque(maxlen=STALL_HISTORY)
+        self._stall_count = 0
+        self._max_stall = 0.0
+        # Lateness of every heartbeat in the last LAG_WINDOW seconds
+        self._recent: deque[float] = deque(maxlen=max(1, int(LAG_WINDOW / interval)))
+        self._next_beat: float | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="loop-stall-monitor")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            expected = time.perf_counter() + self.interval
+            self._next_beat = expected
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - expected)
+            self._recent.append(lag)
+
+            if lag >= self.threshold:
+                self._stalls.append(lag)
+                self._stall_count += 1
+                self._max_stall = max(self._max_stall, lag)
+                if lag >= self.warn_after:
+                    logger.warning(f"Event loop stalled for {lag * 1000:.0f} ms")
+
+    def recent_lag(self) -> float:
+        """
+        Mean lateness of the heartbeats in the last LAG_WINDOW seconds, or
+        how long the loop has been blocked past the next heartbeat if that
+        is longer. Safe to call from other threads.
+        """
+        recent = list(self._recent)
+        mean = sum(recent) / len(recent) if recent else 0.0
+        next_beat = self._next_beat
+        overdue = time.perf_counter() - next_beat if next_beat is not None and self._task is not None else 0.0
+        return max(mean, overdue)
+
+    def mark(self) -> int:
+        """Position to pass to stats() later to cover only the stalls since now."""
+        return self._stall_count
+
+    def stats(self, since: int = 0) -> dict:
+        """
+        Stall durations in milliseconds, over the life of the process or
+        since a mark() (e.g. one call's lifetime; percentiles cover at most
+        the last STALL_HISTORY stalls).
+        """
+        count = self._stall_count - since
+        stalls = list(self._stalls)[-count:] if count else []
+        return {
+            "stalls": count,
+            "max_ms": round((max(stalls, default=0.0) if since else self._max_stall) * 1000, 1),
+            "p50_ms": round(percentile(stalls, 50) * 1000, 1),
+            "p95_ms": round(percentile(stalls, 95) * 1000, 1),
+            "p99_ms": round(percentile(stalls, 99) * 1000, 1),
+        }
+
+
+_loop_monitor: LoopStallMonitor | None = None
+
+
+def get_loop_monitor() -> LoopStallMonitor:
+    """Return this process's loop monitor, starting it on the running loop."""
+    global _loop_monitor
+
+    if _loop_monitor is None:
+        _loop_monitor = LoopStallMonitor()
+    _loop_monitor.start()
+    return _loop_monitor
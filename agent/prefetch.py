@@ -0,0 +1,151 @@
+import os
+import time
+import asyncio
+import logging
+import weakref
+
+from livekit.agents import AgentSession
+
+from inventory import AvailabilitySnapshot, get_inventory
+from persistence import run_io
+from latency import get_latency_registry
+from specialties import classify
+
+logger = logging.getLogger(__name__)
+
+
+# How long a prefetched snapshot answers availability queries. Slots taken
+# meanwhile by other callers still look free; booking them returns
+# alternatives, as for any race.
+AVAILABILITY_PREFETCH_TTL = float(os.getenv("AVAILABILITY_PREFETCH_TTL", "60"))
+
+# Tools that change availability; the session's snapshots are dropped after one runs
+BOOKING_TOOLS = {"save_appointment", "cancel_appointment", "reschedule_appointment"}
+
+
+def mentioned_specialties(text: str) -> list[str]:
+    """Specialties a transcript names or points to, best match first."""
+    return classify(text).ranked
+
+
+class AvailabilityCache:
+    """
+    Availability snapshots fetched for one session ahead of its tool calls,
+    by specialty.
+
+    A lookup is a hit when a fresh snapshot is there, or one is being
+    fetched (it is then awaited). The latency saved by a hit is what the
+    fetch took, less any time spent waiting for it.
+    """
+
+    def __init__(self, room: str, ttl: float = AVAILABILITY_PREFETCH_TTL) -> None:
+        self.room = room
+        self.ttl = ttl
+
+        # specialty → (expires at, snapshot, seconds the fetch took)
+        self._snapshots: dict[str, tuple[float, AvailabilitySnapshot, float]] = {}
+        self._inflight: dict[str, asyncio.Task] = {}
+
+        self.prefetches = 0
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def prefetch(self, specialty: str) -> None:
+        """Start fetching a specialty's availability unless it is fresh or already on its way."""
+        entry = self._snapshots.get(specialty)
+        if specialty in self._inflight or (entry is not None and entry[0] > time.monotonic()):
+            return
+        self.prefetches += 1
+        task = asyncio.create_task(self._fetch(specialty))
+        self._inflight[specialty] = task
+        task.add_done_callback(lambda _: self._inflight.pop(specialty, None))
+
+    async def _fetch(self, specialty: str) -> AvailabilitySnapshot | None:
+        started = time.perf_counter()
+        try:
+            snapshot = await run_io(get_inventory().snapshot, specialty)
+        except Exception as e:
+            logger.warning(f"Availability prefetch for {specialty} failed: {e}")
+            return None
+        took = time.perf_counter() - started
+        if snapshot is not None:
+            self._snapshots[specialty] = (time.monotonic() + self.ttl, snapshot, took)
+        return snapshot
+
+    async def lookup(self, specialty: str) -> AvailabilitySnapshot | None:
+        """The specialty's prefetched snapshot, or None if the caller should query the inventory."""
+        started = time.perf_counter()
+        task = self._inflight.get(specialty)
+        if task is not None:
+            await asyncio.shield(task)
+
+        entry = self._snapshots.get(specialty)
+        if entry is None or entry[0] <= time.monotonic():
+            self.misses += 1
+            get_latency_registry().increment("availability_prefetch_misses")
+            return None
+
+        _, snapshot, took = entry
+        saved = max(0.0, took - (time.perf_counter() - started))
+        self.hits += 1
+        self.saved_seconds += saved
+        registry = get_latency_registry()
+        registry.increment("availability_prefetch_hits")
+        registry.record("prefetch_saved", saved, self.room)
+        return snapshot
+
+    def invalidate(self) -> None:
+        """Forget every snapshot, e.g. after this session booked or released a slot."""
+        self._snapshots.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "prefetches": self.prefetches,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "saved_ms": round(self.saved_seconds * 1000, 1),
+        }
+
+
+_caches: "weakref.WeakKeyDictionary[AgentSession, AvailabilityCache]" = weakref.WeakKeyDictionary()
+
+
+def get_availability_cache(session: AgentSession) -> AvailabilityCache | None:
+    return _caches.get(session)
+
+
+class AvailabilityPrefetcher:
+    """
+    Warms a session's AvailabilityCache from what the caller says: a
+    specialty or symptom in any transcript (interim ones included) starts
+    a snapshot fetch, so find_available_slots and get_doctors_list
+    don't wait on the inventory later in the booking flow. Snapshots
+    are dropped once the session itself books or releases a slot.
+    """
+
+    def __init__(self, session: AgentSession, room: str) -> None:
+        self.session = session
+        self.room = room
+        self.cache = AvailabilityCache(room)
+
+    def attach(self) -> None:
+        _caches[self.session] = self.cache
+        self.session.on("user_input_transcribed", self._on_transcript)
+        self.session.on("function_tools_executed", self._on_tools_executed)
+
+    async def close(self) -> None:
+        self.session.off("user_input_transcribed", self._on_transcript)
+        self.session.off("function_tools_executed", self._on_tools_executed)
+        _caches.pop(self.session, None)
+        logger.info(f"Availability prefetch for room {self.room}: {self.cache.stats()}")
+
+    def _on_transcript(self, ev) -> None:
+        for specialty in mentioned_specialties(ev.transcript):
+            self.cache.prefetch(specialty)
+
+    def _on_tools_executed(self, ev) -> None:
+        if any(call.name in BOOKING_TOOLS for call in ev.function_calls):
+            self.cache.invalidate()
@@ -0,0 +1,436 @@
+import os
+import json
+import base64
+import hashlib
+import time
+import fcntl
+import queue
+import shutil
+import datetime
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+from livekit.agents import AgentSession, JobContext
+
+from persistence import run_io
+from latency import get_latency_registry
+
+logger = logging.getLogger(__name__)
+
+
+# Where recordings go; archiving is off without a bucket
+RECORDINGS_BUCKET = os.getenv("RECORDINGS_BUCKET") or os.getenv("AWS_BUCKET_NAME")
+RECORDINGS_PREFIX = os.getenv("RECORDINGS_PREFIX", "recordings")
+AWS_REGION = os.getenv("AWS_REGION", "ap-south-1")
+# Any S3-compatible endpoint, e.g. http://localhost:9000 for a local MinIO
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+
+# Finished calls' recordings wait here until uploaded, with their upload state
+RECORDINGS_SPOOL_DIR = os.getenv("RECORDINGS_SPOOL_DIR", "recordings")
+
+# Upload settings; memory per process is at most (concurrency + 1) parts
+RECORDING_PART_SIZE = int(os.getenv("RECORDING_PART_SIZE", str(8 * 1024 * 1024)))   # S3 minimum is 5 MiB
+RECORDING_UPLOAD_CONCURRENCY = int(os.getenv("RECORDING_UPLOAD_CONCURRENCY", "4"))  # parts in flight
+RECORDING_UPLOAD_RETRIES = 5          # attempts per request, with backoff (botocore "standard" mode)
+RECORDING_RETRY_AFTER = 30.0          # seconds before a failed upload is resumed; doubles per failure
+RECORDING_RETRY_MAX = 15 * 60.0
+
+MANIFEST_SUFFIX = ".upload.json"
+LOCK_SUFFIX = ".lock"
+
+
+def recording_key(room: str, started_at: float, suffix: str = ".ogg") -> str:
+    day = datetime.date.fromtimestamp(started_at).isoformat()
+    return f"{RECORDINGS_PREFIX}/{day}/{room}{suffix}"
+
+
+def _open_source(source: str, offset: int):
+    """Readable binary stream of a spooled recording from offset on."""
+    f = open(source, "rb")
+    f.seek(offset)
+    return f
+
+
+def _read_part(stream, size: int) -> bytes:
+    """Up to size bytes; short only at the end of the stream."""
+    chunks = []
+    while size:
+        chunk = stream.read(size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+class UploadJob:
+    """
+    One recording on its way to S3, and the state needed to resume it:
+    the multipart upload ID and the ETag of every part S3 has acknowledged,
+    kept in a manifest next to a spooled file.
+    """
+
+    def __init__(
+        self,
+        source: str,
+        key: str,
+        part_size: int = RECORDING_PART_SIZE,
+        manifest_path: str | None = None,
+        delete_after: bool = False,
+    ) -> None:
+        self.source = source
+        self.key = key
+        self.part_size = part_size
+        self.manifest_path = manifest_path
+        self.delete_after = delete_after
+
+        self.upload_id: str | None = None
+        self.parts: dict[int, str] = {}     # part number → ETag
+        self.failures = 0
+
+    def load(self) -> None:
+        if self.manifest_path is None:
+            return
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        self.key = manifest.get("key", self.key)
+        # Parts already uploaded fix the size of the rest
+        self.part_size = manifest.get("part_size", self.part_size)
+        self.upload_id = manifest.get("upload_id")
+        self.parts = {int(number): etag for number, etag in manifest.get("parts", {}).items()}
+
+    def save(self) -> None:
+        if self.manifest_path is None:
+            return
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"key": self.key, "part_size": self.part_size, "upload_id": self.upload_id, "parts": self.parts}, f)
+        os.replace(tmp_path, self.manifest_path)
+
+
+class RecordingArchiver:
+    """
+    Uploads call recordings to S3 from background threads, never from
+    the event loop.
+
+    Each recording is streamed in RECORDING_PART_SIZE parts through a
+    multipart upload. Parts are read one at a time and handed to a pool
+    of RECORDING_UPLOAD_CONCURRENCY upload threads; reading waits while
+    that many parts are in flight, so memory stays the same however long
+    the call was. Requests are retried by botocore. A recording that
+    still fails keeps its manifest and is resumed later, from the first
+    part S3 does not have, by this process or by the next one to start
+    (resume_pending()).
+    """
+
+    def __init__(
+        self,
+        bucket: str | None = RECORDINGS_BUCKET,
+        spool_dir: str = RECORDINGS_SPOOL_DIR,
+        endpoint_url: str | None = S3_ENDPOINT_URL,
+        part_size: int = RECORDING_PART_SIZE,
+        concurrency: int = RECORDING_UPLOAD_CONCURRENCY,
+        client=None,
+    ) -> None:
+        self.bucket = bucket
+        self.spool_dir = spool_dir
+        self.endpoint_url = endpoint_url
+        self.part_size = part_size
+        self.concurrency = concurrency
+        self._client = client
+
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="recording-upload")
+        self._timers: set[threading.Timer] = set()
+        self._stopping = False
+        self._pending = 0
+        self._idle = threading.Condition()
+
+        self.uploaded = 0
+        self.failed = 0
+        self.bytes_uploaded = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.bucket)
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = boto3.client(
+                "s3",
+                endpoint_url=self.endpoint_url,
+                region_name=AWS_REGION,
+                config=Config(
+                    retries={"max_attempts": RECORDING_UPLOAD_RETRIES, "mode": "standard"},
+                    max_pool_connections=self.concurrency,
+                    # Parts carry Content-MD5 instead, which every S3-compatible store checks
+                    request_checksum_calculation="when_required",
+                    s3={"addressing_style": "path"} if self.endpoint_url else None,
+                ),
+            )
+        return self._client
+
+    # --------------------------
+    # QUEUEING
+    # --------------------------
+
+    def spool(self, path: str, key: str) -> str:
+        """
+        Blocking: move a finished recording into the spool directory, so it
+        outlives the job's temporary directory, and queue its upload.
+        """
+        os.makedirs(self.spool_dir, exist_ok=True)
+        spooled = os.path.join(self.spool_dir, key.replace("/", "__"))
+        try:
+            os.replace(path, spooled)
+        except OSError:
+            # Different filesystem; copy in chunks
+            shutil.copyfile(path, spooled)
+            os.remove(path)
+        job = UploadJob(spooled, key, self.part_size, spooled + MANIFEST_SUFFIX, delete_after=True)
+        job.save()
+        self.submit(job)
+        return spooled
+
+    def resume_pending(self) -> int:
+        """Queue every spooled recording left unfinished, e.g. by a previous process."""
+        try:
+            names = os.listdir(self.spool_dir)
+        except FileNotFoundError:
+            return 0
+        count = 0
+        for name in names:
+            if not name.endswith(MANIFEST_SUFFIX):
+                continue
+            spooled = os.path.join(self.spool_dir, name[:-len(MANIFEST_SUFFIX)])
+            if os.path.exists(spooled):
+                job = UploadJob(spooled, "", self.part_size, spooled + MANIFEST_SUFFIX, delete_after=True)
+                job.load()
+                self.submit(job)
+                count += 1
+        return count
+
+    def submit(self, job: UploadJob) -> None:
+        with self._idle:
+            self._pending += 1
+        self._ensure_started()
+        self._queue.put(job)
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        """Block until every queued upload has finished or been scheduled for a retry."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self) -> None:
+        """Stop after the current upload; unfinished recordings stay spooled for resume_pending()."""
+        self._stopping = True
+        for timer in list(self._timers):
+            timer.cancel()
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        self._pool.shutdown(wait=True)
+
+    def _ensure_started(self) -> None:
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="recording-archiver", daemon=True)
+                    self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None or self._stopping:
+                break
+            try:
+                self._archive(job)
+            except Exception as e:
+                self._retry_later(job, e)
+            finally:
+                with self._idle:
+                    self._pending -= 1
+                    self._idle.notify_all()
+
+    def _retry_later(self, job: UploadJob, error: Exception) -> None:
+        job.failures += 1
+        self.failed += 1
+        get_latency_registry().increment("recording_upload_failures")
+        delay = min(RECORDING_RETRY_AFTER * 2 ** (job.failures - 1), RECORDING_RETRY_MAX)
+        logger.warning(f"Upload of recording {job.key} failed ({error}); resuming in {delay:.0f}s")
+
+        def resubmit():
+            self._timers.discard(timer)
+            self.submit(job)
+
+        timer = threading.Timer(delay, resubmit)
+        timer.daemon = True
+        self._timers.add(timer)
+        timer.start()
+
+    # --------------------------
+    # UPLOADING
+    # --------------------------
+
+    def _archive(self, job: UploadJob) -> None:
+        lock = None
+        if job.manifest_path is not None:
+            # Another worker process may already be resuming this recording
+            lock = open(job.source + LOCK_SUFFIX, "a")
+            try:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock.close()
+                return
+            if not os.path.exists(job.source):
+                lock.close()
+                return
+            job.load()
+
+        try:
+            started = time.perf_counter()
+            size = self._upload(job)
+            took = time.perf_counter() - started
+            self.uploaded += 1
+            get_latency_registry().increment("recordings_uploaded")
+            logger.info(f"Uploaded recording {job.key} ({size / 2**20:.1f} MiB) in {took:.1f}s")
+
+            if job.delete_after:
+                os.remove(job.source)
+                os.remove(job.manifest_path)
+        finally:
+            if lock is not None:
+                if job.delete_after and not os.path.exists(job.source):
+                    os.remove(lock.name)
+                lock.close()
+
+    def _upload(self, job: UploadJob) -> int:
+        client = self.client
+        if job.upload_id is not None:
+            self._reconcile(job)
+        if job.upload_id is None:
+            response = client.create_multipart_upload(Bucket=self.bucket, Key=job.key, ContentType=_content_type(job.key))
+            job.upload_id = response["UploadId"]
+            job.parts = {}
+            job.save()
+
+        # Resume from the first part S3 doesn't have; later parts it has are skipped
+        number = 1
+        while number in job.parts:
+            number += 1
+        offset = (number - 1) * job.part_size
+        size = offset
+
+        slots = threading.BoundedSemaphore(self.concurrency)
+        save_lock = threading.Lock()
+        futures = []
+
+        def upload_part(number: int, data: bytes) -> None:
+            try:
+                response = client.upload_part(
+                    Bucket=self.bucket, Key=job.key, UploadId=job.upload_id, PartNumber=number, Body=data,
+                    ContentMD5=base64.b64encode(hashlib.md5(data).digest()).decode(),
+                )
+                with save_lock:
+                    job.parts[number] = response["ETag"]
+                    job.save()
+                    self.bytes_uploaded += len(data)
+            finally:
+                slots.release()
+
+        with _open_source(job.source, offset) as stream:
+            while True:
+                slots.acquire()
+                if any(future.done() and future.exception() for future in futures):
+                    slots.release()
+                    break
+                data = _read_part(stream, job.part_size)
+                if not data and number > 1:
+                    slots.release()
+                    break
+                size += len(data)
+                if number not in job.parts:
+                    futures.append(self._pool.submit(upload_part, number, data))
+                else:
+                    slots.release()
+                number += 1
+                if len(data) < job.part_size:
+                    break
+
+        for future in futures:
+            # Raises the first part's error; its manifest keeps what did make it
+            future.result()
+
+        client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=job.key,
+            UploadId=job.upload_id,
+            MultipartUpload={"Parts": [{"PartNumber": n, "ETag": job.parts[n]} for n in sorted(job.parts)]},
+        )
+        return size
+
+    def _reconcile(self, job: UploadJob) -> None:
+        """Keep only the parts S3 still has for the upload in the manifest; forget an upload it dropped."""
+        try:
+            listed = {}
+            paginator = self.client.get_paginator("list_parts")
+            for page in paginator.paginate(Bucket=self.bucket, Key=job.key, UploadId=job.upload_id):
+                for part in page.get("Parts", []):
+                    listed[part["PartNumber"]] = part["ETag"]
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "NoSuchUpload":
+                raise
+            job.upload_id = None
+            job.parts = {}
+            return
+        job.parts = {number: etag for number, etag in job.parts.items() if listed.get(number) == etag}
+        job.save()
+
+
+def _content_type(key: str) -> str:
+    if key.endswith(".ogg"):
+        return "audio/ogg"
+    if key.endswith(".wav"):
+        return "audio/wav"
+    return "application/octet-stream"
+
+
+_archiver: RecordingArchiver | None = None
+
+
+def get_recording_archiver() -> RecordingArchiver:
+    global _archiver
+
+    if _archiver is None:
+        _archiver = RecordingArchiver()
+    return _archiver
+
+
+async def archive_call_recording(ctx: JobContext, session: AgentSession, started_at: float) -> None:
+    """
+    Shutdown callback: hand the session's recording to the archiver
+    before the job's temporary directory is removed.
+    """
+    archiver = get_recording_archiver()
+    if not archiver.enabled:
+        return
+    path = ctx.make_session_report(session).audio_recording_path
+    if path is None or not os.path.exists(path):
+        return
+    key = recording_key(ctx.room.name, started_at, os.path.splitext(path)[1] or ".ogg")
+    try:
+        await run_io(archiver.spool, str(path), key)
+    except OSError as e:
+        logger.error(f"Failed to spool recording for room {ctx.room.name}: {e}")
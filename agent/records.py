@@ -0,0 +1,221 @@
+import os
+import re
+import json
+import threading
+import logging
+
+from persistence import list_segments
+from slots import parse_date, format_date
+
+logger = logging.getLogger(__name__)
+
+
+APPOINTMENTS_FILE_PATH = "appointments.jsonl"
+PRESCRIPTIONS_FILE_PATH = "prescriptions.jsonl"
+
+
+def normalize_phone(phone: str) -> str:
+    """Digits only, without an Indian country code or trunk prefix."""
+    digits = re.sub(r"\D", "", phone or "")
+    if len(digits) > 10 and digits.startswith("91"):
+        digits = digits[2:]
+    return digits.lstrip("0")
+
+
+def _doctor_key(doctor_name: str) -> str:
+    return " ".join((doctor_name or "").split()).casefold()
+
+
+def _record_date(record: dict) -> str | None:
+    """ISO date an appointment is for (or a refill was placed on)."""
+    for field in ("time_slot", "saved_at"):
+        try:
+            return format_date(parse_date(record[field]))
+        except (KeyError, ValueError):
+            continue
+    return None
+
+
+class RecordIndex:
+    """
+    In-memory indexes over an append log (appointments.jsonl or
+    prescriptions.jsonl, including its rotated segments).
+
+    Only file positions are kept: by record ID, and secondary indexes by
+    phone, doctor name and date. Records are read back with one seek.
+    refresh() tails every segment from the offset it last reached, so
+    records appended by any process are indexed incrementally, never by
+    rescanning the log. For an ID that appears more than once (status
+    updates), the latest line wins.
+    """
+
+    def __init__(self, path: str, id_field: str) -> None:
+        self.path = path
+        self.id_field = id_field
+
+        self._lock = threading.Lock()
+        # inode → [path, indexed up to offset]; inodes survive rotation renames
+        self._segments: dict[int, list] = {}
+        self._active_inode: int | None = None
+
+        self._by_id: dict[int, tuple[int, int]] = {}   # id → (inode, offset)
+        self._by_phone: dict[str, set[int]] = {}
+        self._by_doctor: dict[str, set[int]] = {}
+        self._by_date: dict[str, set[int]] = {}
+
+    # --------------------------
+    # INDEXING
+    # --------------------------
+
+    def refresh(self) -> None:
+        """Index records appended since the last refresh."""
+        with self._lock:
+            try:
+                active_inode = os.stat(self.path).st_ino
+            except FileNotFoundError:
+                active_inode = None
+
+            if active_inode is not None and active_inode == self._active_inode:
+                self._tail(active_inode, self.path)
+                return
+
+            # First load or the log was rotated: walk every segment once
+            for segment in list_segments(self.path):
+                try:
+                    inode = os.stat(segment).st_ino
+                except FileNotFoundError:
+                    continue
+                self._tail(inode, segment)
+            self._active_inode = active_inode
+
+    def _tail(self, inode: int, path: str) -> None:
+        state = self._segments.setdefault(inode, [path, 0])
+        state[0] = path
+
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return
+
+        with f:
+            f.seek(state[1])
+            offset = state[1]
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    # Writer is mid-commit; pick it up next time
+                    break
+                self._add(raw, inode, offset)
+                offset += len(raw)
+            state[1] = offset
+
+    def _add(self, raw: bytes, inode: int, offset: int) -> None:
+        try:
+            record = json.loads(raw)
+            record_id = int(record[self.id_field])
+        except (ValueError, KeyError, TypeError):
+            # Blank, torn or legacy lines without an ID can't be looked up
+            return
+
+        self._by_id[record_id] = (inode, offset)
+
+        phone = normalize_phone(record.get("phone", ""))
+        if phone:
+            self._by_phone.setdefault(phone, set()).add(record_id)
+        doctor = _doctor_key(record.get("doctor_name") or record.get("consulted_doctor", ""))
+        if doctor:
+            self._by_doctor.setdefault(doctor, set()).add(record_id)
+        record_date = _record_date(record)
+        if record_date:
+            self._by_date.setdefault(record_date, set()).add(record_id)
+
+    # --------------------------
+    # QUERIES
+    # --------------------------
+
+    def get(self, record_id: int | str) -> dict | None:
+        """Latest version of a record by ID."""
+        self.refresh()
+        try:
+            record_id = int(record_id)
+        except (TypeError, ValueError):
+            return None
+        with self._lock:
+            return self._read(record_id)
+
+    def find(
+        self,
+        phone: str | None = None,
+        doctor_name: str | None = None,
+        record_date: str | None = None,
+    ) -> list[dict]:
+        """Latest versions of records matching every given filter, oldest ID first."""
+        self.refresh()
+
+        wanted = {}
+        if phone:
+            wanted["phone"] = (self._by_phone, normalize_phone(phone))
+        if doctor_name:
+            wanted["doctor"] = (self._by_doctor, _doctor_key(doctor_name))
+        if record_date:
+            wanted["date"] = (self._by_date, record_date)
+        if not wanted:
+            return []
+
+        with self._lock:
+            ids = None
+            for index, key in wanted.values():
+                matches = index.get(key, set())
+                ids = set(matches) if ids is None else ids & matches
+
+            records = []
+            for record_id in sorted(ids):
+                record = self._read(record_id)
+                # Secondary indexes keep old keys after an update; check against the latest version
+                if record is None:
+                    continue
+                if "phone" in wanted and normalize_phone(record.get("phone", "")) != wanted["phone"][1]:
+                    continue
+                if "doctor" in wanted and _doctor_key(
+                    record.get("doctor_name") or record.get("consulted_doctor", "")
+                ) != wanted["doctor"][1]:
+                    continue
+                if "date" in wanted and _record_date(record) != record_date:
+                    continue
+                records.append(record)
+            return records
+
+    def _read(self, record_id: int) -> dict | None:
+        location = self._by_id.get(record_id)
+        if location is None:
+            return None
+
+        inode, offset = location
+        path = self._segments[inode][0]
+        try:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                return json.loads(f.readline())
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to read record {record_id} from {path}: {e}")
+            return None
+
+
+_indexes: dict[str, RecordIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def _get_index(path: str, id_field: str) -> RecordIndex:
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = RecordIndex(path, id_field)
+            _indexes[path] = index
+        return index
+
+
+def get_appointment_index() -> RecordIndex:
+    return _get_index(APPOINTMENTS_FILE_PATH, "booking_id")
+
+
+def get_refill_index() -> RecordIndex:
+    return _get_index(PRESCRIPTIONS_FILE_PATH, "refill_id")
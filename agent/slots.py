@@ -0,0 +1,191 @@
+import re
+import datetime
+import functools
+
+
+MINUTES_PER_DAY = 24 * 60
+
+# Slot keys count minutes of local wall-clock time from 1970-01-01 00:00
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+_MONTH = (
+    r"(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?"
+    r"|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\.?"
+)
+_MONTHS = {name: n for n, name in enumerate(
+    ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"), start=1
+)}
+_DAY = r"(\d{1,2})(?:st|nd|rd|th)?"
+_WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+_ISO_DATE = re.compile(r"\b(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})(?=\b|t)")              # 2025-12-31
+_DMY_DATE = re.compile(r"\b(\d{1,2})[-/.](\d{1,2})[-/.](\d{4})\b")                   # 31/12/2025
+_DAY_MONTH = re.compile(rf"\b{_DAY}\s+(?:of\s+)?{_MONTH}\b,?(?:\s+(\d{{4}})\b)?")   # 31st December 2025
+_MONTH_DAY = re.compile(rf"\b{_MONTH}\s+{_DAY}\b,?(?:\s+(\d{{4}})\b)?")             # December 31, 2025
+_RELATIVE_DATE = re.compile(r"\b(day after tomorrow|today|tomorrow)\b")
+_WEEKDAY = re.compile(r"\b(?:(this|next|on)\s+)?(" + "|".join(_WEEKDAYS) + r")\b")
+
+_TIME_12H = re.compile(r"(?<![\d:])(\d{1,2})(?:[:.](\d{2}))?\s*([ap])\.?\s*m\b\.?")  # 9 AM, 9:30 p.m.
+_TIME_24H = re.compile(r"(?<![\d:.\-/])(\d{1,2})[:.](\d{2})(?![\d.\-/])")            # 14:30
+_TIME_NAMED = re.compile(r"\b(noon|midday|midnight)\b")
+_TIME_BARE_HOUR = re.compile(r"^(?:at\s+|@\s*)?(\d{1,2})(?:\s*o'?\s*clock)?$")                # (tomorrow) at 10
+
+_RELATIVE_DAYS = {"today": 0, "tomorrow": 1, "day after tomorrow": 2}
+_NAMED_TIMES = {"noon": 12 * 60, "midday": 12 * 60, "midnight": 0}
+
+# A bare hour from 1 to 7 is read as afternoon ("tomorrow at 3" → 3 PM), as no clinic opens then
+BARE_HOUR_PM_UNTIL = 7
+
+
+def _clean(text: str) -> str:
+    return " ".join(str(text).strip().casefold().split())
+
+
+def _today() -> int:
+    return datetime.date.today().toordinal()
+
+
+def _next_occurrence(month: int, day: int, today: int) -> int:
+    """Ordinal of the first month/day on or after today (for dates said without a year)."""
+    year = datetime.date.fromordinal(today).year
+    for candidate_year in (year, year + 1):
+        try:
+            ordinal = datetime.date(candidate_year, month, day).toordinal()
+        except ValueError:
+            continue
+        if ordinal >= today:
+            return ordinal
+    raise ValueError(f"Invalid date: day {day} of month {month}")
+
+
+@functools.lru_cache(maxsize=4096)
+def _match_date(text: str, today: int) -> tuple[int, int, int]:
+    """(ordinal, match start, match end) of the date mentioned in cleaned text."""
+    match = _ISO_DATE.search(text)
+    if match:
+        year, month, day = (int(g) for g in match.groups())
+        return datetime.date(year, month, day).toordinal(), match.start(), match.end()
+
+    match = _DMY_DATE.search(text)
+    if match:
+        day, month, year = (int(g) for g in match.groups())
+        return datetime.date(year, month, day).toordinal(), match.start(), match.end()
+
+    for pattern, day_group, month_group in ((_DAY_MONTH, 1, 2), (_MONTH_DAY, 2, 1)):
+        match = pattern.search(text)
+        if match:
+            day, month = int(match.group(day_group)), _MONTHS[match.group(month_group)[:3]]
+            if match.group(3):
+                ordinal = datetime.date(int(match.group(3)), month, day).toordinal()
+            else:
+                ordinal = _next_occurrence(month, day, today)
+            return ordinal, match.start(), match.end()
+
+    match = _RELATIVE_DATE.search(text)
+    if match:
+        return today + _RELATIVE_DAYS[match.group(1)], match.start(), match.end()
+
+    match = _WEEKDAY.search(text)
+    if match:
+        ahead = (_WEEKDAYS.index(match.group(2)) - datetime.date.fromordinal(today).weekday()) % 7
+        if ahead == 0 and match.group(1) == "next":
+            # "next Monday" said on a Monday is a week away
+            ahead = 7
+        return today + ahead, match.start(), match.end()
+
+    raise ValueError(f"Unrecognised date: {text!r}")
+
+
+@functools.lru_cache(maxsize=4096)
+def _match_time(text: str, bare_hour: bool = False) -> int:
+    match = _TIME_12H.search(text)
+    if match:
+        hour, minute = int(match.group(1)), int(match.group(2) or 0)
+        if not 1 <= hour <= 12 or minute > 59:
+            raise ValueError(f"Invalid time: {text!r}")
+        return (hour % 12 + (12 if match.group(3) == "p" else 0)) * 60 + minute
+
+    match = _TIME_24H.search(text)
+    if match:
+        hour, minute = int(match.group(1)), int(match.group(2))
+        if hour > 23 or minute > 59:
+            raise ValueError(f"Invalid time: {text!r}")
+        return hour * 60 + minute
+
+    match = _TIME_NAMED.search(text)
+    if match:
+        return _NAMED_TIMES[match.group(1)]
+
+    match = _TIME_BARE_HOUR.search(text.strip(" ,|-")) if bare_hour else None
+    if match:
+        hour = int(match.group(1))
+        if hour > 23:
+            raise ValueError(f"Invalid time: {text!r}")
+        return (hour + 12 if 1 <= hour <= BARE_HOUR_PM_UNTIL else hour) * 60
+
+    raise ValueError(f"Unrecognised time: {text!r}")
+
+
+def parse_date(text: str) -> int:
+    """
+    Date ordinal for "2025-12-31", "31/12/2025", "31st December",
+    "Dec 31, 2025", "tomorrow", "next Monday" and similar.
+    Dates without a year are the next such date from today.
+    """
+    return _match_date(_clean(text), _today())[0]
+
+
+def parse_time(text: str) -> int:
+    """Minutes since midnight for "9:00 AM", "09:00 am", "9 a.m.", "9.30pm", "14:30" or "noon"."""
+    return _match_time(_clean(text))
+
+
+def parse_slot(text: str) -> int:
+    """
+    Slot key for a date and time in one string, whatever joins them:
+    "2025-12-31 5:00 PM", "2025-12-31 | 5:00 PM", "2026-01-01T09:00",
+    "tomorrow at 10 am", or a bare hour after the date ("tomorrow 10",
+    "2025-12-31 at 3", see BARE_HOUR_PM_UNTIL)...
+    Raises ValueError if either part is missing or invalid.
+    """
+    text = _clean(text)
+    ordinal, start, end = _match_date(text, _today())
+    return slot_key(ordinal, _match_time(text[:start] + " " + text[end:], bare_hour=True))
+
+
+def slot_key(ordinal: int, minute: int) -> int:
+    return (ordinal - EPOCH_ORDINAL) * MINUTES_PER_DAY + minute
+
+
+def split_key(key: int) -> tuple[int, int]:
+    """(date ordinal, minutes since midnight) of a slot key."""
+    days, minute = divmod(key, MINUTES_PER_DAY)
+    return days + EPOCH_ORDINAL, minute
+
+
+def format_date(ordinal: int) -> str:
+    return datetime.date.fromordinal(ordinal).isoformat()
+
+
+def format_time(minute: int) -> str:
+    """Time in the doctors.json style ("9:00 AM", "12:30 PM")."""
+    hour, minute = divmod(minute, 60)
+    return f"{(hour - 1) % 12 + 1}:{minute:02d} {'AM' if hour < 12 else 'PM'}"
+
+
+def format_slot(key: int) -> str:
+    """Canonical time_slot string, e.g. "2025-12-31 5:00 PM"."""
+    ordinal, minute = split_key(key)
+    return f"{format_date(ordinal)} {format_time(minute)}"
+
+
+def slot_dict(doctor_name: str, key: int, doctor_id: str) -> dict:
+    """A slot as returned by the availability tools."""
+    ordinal, minute = split_key(key)
+    return {
+        "doctor_id": doctor_id,
+        "doctor_name": doctor_name,
+        "date": format_date(ordinal),
+        "time": format_time(minute),
+        "time_slot": format_slot(key),
+    }
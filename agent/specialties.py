@@ -0,0 +1,217 @@
+import re
+import functools
+
+
+# Specialty keys as in doctors.json, with what callers call them
+SPECIALTY_NAMES = {
+    "cardiologist": [
+        "cardiologist", "cardiology", "cardiac", "cardiac doctor", "heart doctor", "heart specialist",
+    ],
+    "dermatologist": ["dermatologist", "dermatology", "derma", "skin doctor", "skin specialist", "hair doctor"],
+    "general_physician": [
+        "general physician", "physician", "general doctor", "family doctor", "gp", "general practitioner",
+        "normal doctor", "any doctor",
+    ],
+    "orthopedic": ["orthopedic", "orthopaedic", "orthopedist", "ortho", "bone doctor", "bone specialist"],
+    "general_surgeon": ["general surgeon", "surgeon"],
+    "children_specialist": [
+        "children specialist", "child specialist", "pediatrician", "paediatrician", "pediatric", "child doctor",
+        "kids doctor", "baby doctor",
+    ],
+    "eye_specialist": [
+        "eye specialist", "eye doctor", "ophthalmologist", "ophthalmology", "optometrist", "eye clinic",
+    ],
+    "gynecologist": [
+        "gynecologist", "gynaecologist", "gynecology", "gynaecology", "gynecological", "gynaecological", "gynae",
+        "gyno", "women's doctor", "obgyn",
+    ],
+}
+
+# Symptoms and body parts that point to a specialty
+SPECIALTY_SYMPTOMS = {
+    "cardiologist": [
+        "heart", "palpitation", "racing heart", "irregular heartbeat", "blood pressure", "bp", "hypertension",
+        "high cholesterol", "cholesterol", "chest tightness", "swollen ankle",
+    ],
+    "dermatologist": [
+        "skin", "rash", "itch", "acne", "pimple", "eczema", "psoriasis", "hair fall", "hair loss", "dandruff",
+        "mole", "wart", "hive", "dry skin", "pigmentation", "allergy on skin", "nail",
+    ],
+    "general_physician": [
+        "fever", "cold", "cough", "flu", "headache", "body ache", "sore throat", "runny nose", "fatigue",
+        "tired", "weakness", "vomit", "nausea", "diarrhea", "diarrhoea", "loose motion", "stomach ache",
+        "stomach pain", "acidity", "diabetes", "sugar", "thyroid", "infection", "checkup", "check up",
+        "dizziness", "dizzy",
+    ],
+    "orthopedic": [
+        "bone", "joint", "knee", "back pain", "backache", "back ache", "neck pain", "shoulder", "hip", "fracture", "sprain",
+        "spine", "arthritis", "ankle pain", "wrist", "muscle pain", "sports injury", "slipped disc",
+    ],
+    "general_surgeon": [
+        "surgery", "operation", "hernia", "appendix", "appendicitis", "gallstone", "gall bladder", "lump",
+        "cyst", "abscess", "piles", "hemorrhoid", "wound", "stitch",
+    ],
+    "children_specialist": [
+        "child", "children", "kid", "baby", "infant", "toddler", "newborn", "son", "daughter", "vaccination",
+        "vaccine",
+    ],
+    "eye_specialist": [
+        "eye", "eyesight", "vision", "blurry", "blurred vision", "red eye", "itchy eye", "watery eye",
+        "glasses", "spectacles", "cataract", "squint",
+    ],
+    "gynecologist": [
+        "period", "menstrual", "menstruation", "pregnant", "pregnancy", "pcos", "pcod", "vaginal",
+        "white discharge", "menopause", "fertility", "breast lump",
+    ],
+}
+
+# Symptoms that need a human now rather than a booking
+RED_FLAGS = [
+    "chest pain", "pain in my chest", "heart attack", "difficulty breathing", "trouble breathing",
+    "can't breathe", "cannot breathe", "short of breath", "shortness of breath", "stroke", "face drooping",
+    "slurred speech", "numb on one side", "one side weak", "unconscious", "fainted", "passed out", "seizure",
+    "convulsion", "severe bleeding", "bleeding heavily", "coughing blood", "vomiting blood", "suicide", "suicidal",
+    "kill myself", "overdose", "poisoning", "severe burn", "not breathing", "choking",
+]
+
+# Naming a specialty outweighs any number of symptoms pointing elsewhere
+NAME_WEIGHT = 10
+SYMPTOM_WEIGHT = 1
+
+_TOKEN = re.compile(r"[a-z0-9']+")
+
+
+def _stem(word: str) -> str:
+    """Crude plural/gerund folding, applied to the index and to input alike."""
+    if word.endswith("aches"):
+        # headaches, backaches, aches → ...ache, as in the index
+        return word[:-1]
+    if len(word) > 5 and word.endswith("ing"):
+        return word[:-3]
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("ches", "shes", "sses", "xes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def _tokens(text: str) -> tuple[str, ...]:
+    return tuple(_stem(word) for word in _TOKEN.findall(text.casefold().replace("’", "'")))
+
+
+class Classification:
+    def __init__(self, scores: dict[str, int], matched: list[str], red_flags: list[str]) -> None:
+        self.ranked = sorted(scores, key=lambda specialty: -scores[specialty])
+        self.scores = scores
+        self.matched = matched
+        self.red_flags = red_flags
+
+    @property
+    def specialty(self) -> str | None:
+        return self.ranked[0] if self.ranked else None
+
+    def __repr__(self) -> str:
+        return f"Classification({self.ranked!r}, red_flags={self.red_flags!r})"
+
+
+class SpecialtyIndex:
+    """
+    Phrase index from caller wording to specialty keys.
+
+    Every name, synonym, symptom and red flag is tokenised and stemmed
+    once into a dict keyed by token tuple. Classifying text looks up each
+    of its n-grams up to the longest phrase, so the cost is a few dict
+    lookups per word.
+    """
+
+    def __init__(self, names=SPECIALTY_NAMES, symptoms=SPECIALTY_SYMPTOMS, red_flags=RED_FLAGS) -> None:
+        # token tuple → [(specialty, weight)]; red flags under specialty None
+        self._phrases: dict[tuple[str, ...], list[tuple[str | None, int]]] = {}
+        for weight, table in ((NAME_WEIGHT, names), (SYMPTOM_WEIGHT, symptoms)):
+            for specialty, phrases in table.items():
+                for phrase in phrases:
+                    self._add(phrase, specialty, weight)
+        for phrase in red_flags:
+            self._add(phrase, None, 0)
+
+        self.specialties = list(names)
+        self._max_len = max(len(key) for key in self._phrases)
+
+    def _add(self, phrase: str, specialty: str | None, weight: int) -> None:
+        self._phrases.setdefault(_tokens(phrase), []).append((specialty, weight))
+
+    def classify(self, text: str) -> Classification:
+        tokens = _tokens(text)
+        scores: dict[str, int] = {}
+        matched: list[str] = []
+        red_flags: list[str] = []
+
+        for start in range(len(tokens)):
+            for end in range(min(len(tokens), start + self._max_len), start, -1):
+                hits = self._phrases.get(tokens[start:end])
+                if hits is None:
+                    continue
+                phrase = " ".join(tokens[start:end])
+                for specialty, weight in hits:
+                    if specialty is None:
+                        red_flags.append(phrase)
+                    else:
+                        # Longer phrases are more specific
+                        scores[specialty] = scores.get(specialty, 0) + weight * (end - start)
+                        matched.append(phrase)
+                break
+
+        return Classification(scores, matched, red_flags)
+
+    def resolve(self, specialist: str) -> str | None:
+        """Specialty key for what the LLM passed as a specialist: a key, a synonym or symptoms."""
+        key = "_".join(_TOKEN.findall(specialist.casefold()))
+        if key in SPECIALTY_NAMES:
+            return key
+        return self.classify(specialist).specialty
+
+
+_index = SpecialtyIndex()
+
+
+@functools.lru_cache(maxsize=4096)
+def classify(text: str) -> Classification:
+    return _index.classify(text)
+
+
+def resolve_specialty(specialist: str) -> str | None:
+    return _index.resolve(specialist)
+
+
+# Caller wording → expected specialty, checked by running this module
+EXAMPLES = {
+    "I have headaches": "general_physician",
+    "I have a headache": "general_physician",
+    "my back aches": "orthopedic",
+    "stomach aches since yesterday": "general_physician",
+    "body aches and fevers": "general_physician",
+    "rashes on my arms": "dermatologist",
+    "my knees hurt": "orthopedic",
+    "my eyes are itching": "eye_specialist",
+    "I need a gynaecology appointment": "gynecologist",
+    "something cardiac": "cardiologist",
+    "palpitations at night": "cardiologist",
+}
+
+
+def main() -> None:
+    failed = 0
+    for text, expected in EXAMPLES.items():
+        got = classify(text).specialty
+        if got != expected:
+            failed += 1
+            print(f"{text!r}: expected {expected}, got {got}")
+    print(f"{len(EXAMPLES) - failed}/{len(EXAMPLES)} examples classified as expected")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+"""
+Structured call summaries, written off the event loop.
+
+When a call ends, its summary (room, duration, tool calls with their
+latencies, the booking and refill IDs it created or changed, and the
+transcript) is queued to a background writer. The writer stores each
+summary as its own gzip member in CALL_SUMMARIES_DIR/<date>.jsonl.gz,
+so `zcat` on a day's file prints it as JSON lines, and appends one line
+per summary to index.jsonl with the caller's phone and where the
+summary is. Lookups by date or phone read the index, then decompress
+only the summaries they return.
+
+    python agent/summaries.py --phone 9876543210
+    python agent/summaries.py --date 2026-01-05 --transcript
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import fcntl
+import queue
+import atexit
+import argparse
+import datetime
+import logging
+import threading
+
+from livekit.agents import AgentSession
+
+from latency import get_latency_registry
+from patient import get_patient_profile
+from records import normalize_phone
+from slots import parse_date, format_date
+
+logger = logging.getLogger(__name__)
+
+
+CALL_SUMMARIES_DIR = os.getenv("CALL_SUMMARIES_DIR", "call_summaries")
+CALL_SUMMARY_QUEUE = int(os.getenv("CALL_SUMMARY_QUEUE", "1000"))   # summaries waiting to be written
+CALL_SUMMARY_COMPRESSION = 6                                         # gzip level
+CALL_SUMMARY_MAX_BATCH = 64                                          # summaries per write
+
+# Tools whose result is the ID of a record they created or changed
+RECORD_TOOLS = {
+    "save_appointment": "booking_id",
+    "cancel_appointment": "booking_id",
+    "reschedule_appointment": "booking_id",
+    "save_medicine_refill_order": "refill_id",
+}
+
+
+def _result_id(output: str, field: str) -> int | None:
+    """Record ID in a tool's result: a bare ID, or the field of a JSON result; None for errors."""
+    output = (output or "").strip()
+    if output.isdigit():
+        return int(output)
+    try:
+        result = json.loads(output)
+    except ValueError:
+        return None
+    if isinstance(result, dict) and "error" not in result and str(result.get(field, "")).isdigit():
+        return int(result[field])
+    return None
+
+
+class CallSummaryRecorder:
+    """
+    Collects one session's tool calls while the call is up, and at the
+    end queues its summary to the process's SummaryWriter. Nothing here
+    blocks: building the summary only reads what the session already has
+    in memory.
+    """
+
+    def __init__(self, session: AgentSession, room: str, started_at: float | None = None) -> None:
+        self.session = session
+        self.room = room
+        self.started_at = started_at or time.time()
+        self.tool_calls: list[dict] = []
+
+    def attach(self) -> None:
+        self.session.on("function_tools_executed", self._on_tools_executed)
+
+    async def close(self, reason: str = "") -> None:
+        """Queue the call's summary; call once the session is over."""
+        self.session.off("function_tools_executed", self._on_tools_executed)
+        try:
+            summary = self.summary(reason)
+        except Exception as e:
+            logger.error(f"Failed to build call summary for room {self.room}: {e}", exc_info=True)
+            return
+        get_summary_writer().submit(summary)
+
+    def summary(self, reason: str = "") -> dict:
+        ended_at = time.time()
+        profile = get_patient_profile(self.session).known()
+
+        booking_ids, refill_ids = [], []
+        for call in self.tool_calls:
+            for field, ids in (("booking_id", booking_ids), ("refill_id", refill_ids)):
+                if field in call and call[field] not in ids:
+                    ids.append(call[field])
+
+        transcript = []
+        for item in self.session.history.items:
+            if item.type != "message" or item.role not in ("user", "assistant") or not item.text_content:
+                continue
+            line = {
+                "role": item.role,
+                "at_s": round(item.created_at - self.started_at, 1),
+                "text": item.text_content,
+            }
+            if item.interrupted:
+                line["interrupted"] = True
+            transcript.append(line)
+
+        return {
+            "room": self.room,
+            "started_at": datetime.datetime.fromtimestamp(self.started_at).isoformat(timespec="seconds"),
+            "duration_s": round(ended_at - self.started_at, 1),
+            "end_reason": reason,
+            "phone": profile.get("phone", ""),
+            "customer_name": profile.get("customer_name", ""),
+            "booking_ids": booking_ids,
+            "refill_ids": refill_ids,
+            "tool_calls": self.tool_calls,
+            "transcript": transcript,
+        }
+
+    def _on_tools_executed(self, ev) -> None:
+        for call, output in ev.zipped():
+            entry = {
+                "tool": call.name,
+                "at_s": round(call.created_at - self.started_at, 1),
+                # From the LLM emitting the call to its result being ready
+                "latency_ms": round(((output.created_at if output else ev.created_at) - call.created_at) * 1000, 1),
+                "ok": output is not None and not output.is_error,
+            }
+            field = RECORD_TOOLS.get(call.name)
+            if field and output is not None:
+                record_id = _result_id(output.output, field)
+                if record_id is not None:
+                    entry[field] = record_id
+            self.tool_calls.append(entry)
+
+
+class SummaryWriter:
+    """
+    Background writer of call summaries for this worker process.
+
+    submit() only puts the summary on a bounded queue, so a slow disk can
+    never hold up a call; if the queue is full the summary is dropped
+    and counted. A writer thread serialises and compresses whatever has
+    queued up, appends it to the day files and then indexes it in one
+    write, holding an flock on the index so worker processes can share
+    the directory.
+    """
+
+    def __init__(
+        self,
+        directory: str = CALL_SUMMARIES_DIR,
+        queue_size: int = CALL_SUMMARY_QUEUE,
+        compression: int = CALL_SUMMARY_COMPRESSION,
+        max_batch: int = CALL_SUMMARY_MAX_BATCH,
+    ) -> None:
+        self.directory = directory
+        self.index_path = os.path.join(directory, "index.jsonl")
+        self.compression = compression
+        self.max_batch = max_batch
+
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+
+        self.written = 0
+        self.dropped = 0
+
+    def submit(self, summary: dict) -> bool:
+        """Queue a summary for writing; False if it had to be dropped."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(summary)
+        except queue.Full:
+            self.dropped += 1
+            get_latency_registry().increment("call_summaries_dropped")
+            logger.warning(f"Call summary queue full, dropped summary for room {summary.get('room')}")
+            return False
+        get_latency_registry().increment("call_summaries")
+        return True
+
+    def close(self) -> None:
+        """Write everything queued so far and stop the writer thread."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _ensure_started(self) -> None:
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="call-summary-writer", daemon=True)
+                    self._thread.start()
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            batch = [item]
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            try:
+                self._write(batch)
+                self.written += len(batch)
+            except Exception as e:
+                logger.error(f"Failed to write {len(batch)} call summaries to {self.directory}: {e}", exc_info=True)
+
+    def _write(self, batch: list[dict]) -> None:
+        # day file → [(summary, compressed member)]
+        by_file: dict[str, list[tuple[dict, bytes]]] = {}
+        for summary in batch:
+            member = gzip.compress((json.dumps(summary) + "\n").encode(), self.compression)
+            by_file.setdefault(f"{summary['started_at'][:10]}.jsonl.gz", []).append((summary, member))
+
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.index_path, "ab") as index:
+            fcntl.flock(index.fileno(), fcntl.LOCK_EX)
+            try:
+                lines = []
+                for name, members in by_file.items():
+                    with open(os.path.join(self.directory, name), "ab") as f:
+                        offset = os.fstat(f.fileno()).st_size
+                        f.write(b"".join(member for _, member in members))
+                        f.flush()
+                        os.fsync(f.fileno())
+                    for summary, member in members:
+                        lines.append(json.dumps({
+                            "room": summary["room"],
+                            "date": summary["started_at"][:10],
+                            "started_at": summary["started_at"],
+                            "duration_s": summary["duration_s"],
+                            "phone": normalize_phone(summary["phone"]),
+                            "booking_ids": summary["booking_ids"],
+                            "refill_ids": summary["refill_ids"],
+                            "file": name,
+                            "offset": offset,
+                            "length": len(member),
+                        }) + "\n")
+                        offset += len(member)
+
+                # Indexed only once the summaries themselves are on disk
+                index.write("".join(lines).encode())
+                index.flush()
+                os.fsync(index.fileno())
+            finally:
+                fcntl.flock(index.fileno(), fcntl.LOCK_UN)
+
+
+_writer: SummaryWriter | None = None
+_writer_lock = threading.Lock()
+
+
+def get_summary_writer() -> SummaryWriter:
+    global _writer
+
+    with _writer_lock:
+        if _writer is None:
+            _writer = SummaryWriter()
+        return _writer
+
+
+@atexit.register
+def _close_summary_writer() -> None:
+    if _writer is not None:
+        _writer.close()
+
+
+class SummaryIndex:
+    """
+    In-memory view of a summaries directory's index.jsonl, by date and
+    by phone. refresh() reads only the index lines added since the last
+    refresh.
+    """
+
+    def __init__(self, directory: str = CALL_SUMMARIES_DIR) -> None:
+        self.directory = directory
+        self.index_path = os.path.join(directory, "index.jsonl")
+
+        self._lock = threading.Lock()
+        self._offset = 0
+        self._entries: list[dict] = []
+        self._by_date: dict[str, list[int]] = {}
+        self._by_phone: dict[str, list[int]] = {}
+
+    def refresh(self) -> None:
+        with self._lock:
+            try:
+                f = open(self.index_path, "rb")
+            except FileNotFoundError:
+                return
+            with f:
+                f.seek(self._offset)
+                for raw in f:
+                    if not raw.endswith(b"\n"):
+                        # Writer is mid-commit; pick it up next refresh
+                        break
+                    self._offset += len(raw)
+                    try:
+                        entry = json.loads(raw)
+                    except ValueError:
+                        continue
+                    position = len(self._entries)
+                    self._entries.append(entry)
+                    self._by_date.setdefault(entry["date"], []).append(position)
+                    if entry.get("phone"):
+                        self._by_phone.setdefault(entry["phone"], []).append(position)
+
+    def find(self, phone: str | None = None, date: str | None = None) -> list[dict]:
+        """Index entries of the calls matching every given filter, oldest first."""
+        self.refresh()
+        with self._lock:
+            positions = None
+            if phone:
+                positions = set(self._by_phone.get(normalize_phone(phone), ()))
+            if date:
+                on_date = set(self._by_date.get(format_date(parse_date(date)), ()))
+                positions = on_date if positions is None else positions & on_date
+            if positions is None:
+                positions = range(len(self._entries))
+            return [self._entries[position] for position in sorted(positions)]
+
+    def load(self, entry: dict) -> dict:
+        """The full summary an index entry points to."""
+        with open(os.path.join(self.directory, entry["file"]), "rb") as f:
+            f.seek(entry["offset"])
+            member = f.read(entry["length"])
+        return json.loads(gzip.decompress(member))
+
+
+_index: SummaryIndex | None = None
+
+
+def get_summary_index() -> SummaryIndex:
+    global _index
+
+    if _index is None:
+        _index = SummaryIndex()
+    return _index
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", default=CALL_SUMMARIES_DIR, help="where summaries are kept")
+    parser.add_argument("--phone", help="caller's phone number")
+    parser.add_argument("--date", help="day the call started")
+    parser.add_argument("--transcript", action="store_true", help="print full summaries, not just the index")
+    args = parser.parse_args()
+
+    index = SummaryIndex(args.dir)
+    started = time.perf_counter()
+    entries = index.find(phone=args.phone, date=args.date)
+    rows = [index.load(entry) for entry in entries] if args.transcript else entries
+    took = (time.perf_counter() - started) * 1000
+
+    print(json.dumps(rows, indent=2))
+    print(f"{len(rows)} calls in {took:.2f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
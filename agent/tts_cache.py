@@ -0,0 +1,322 @@
+import os
+import re
+import wave
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import AsyncIterable, AsyncIterator
+
+from livekit import rtc
+from livekit.agents import Agent, ModelSettings, tts
+
+from persistence import run_io
+from prompt import SCRIPTED_LINES
+
+logger = logging.getLogger(__name__)
+
+
+# Synthesised scripted lines, as one WAV file per (voice, line), shared by
+# every worker process on the host
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "tts_cache")
+TTS_CACHE_DISK_BYTES = int(os.getenv("TTS_CACHE_DISK_BYTES", str(256 * 2**20)))
+
+# Per process, in front of the files
+TTS_CACHE_MEMORY_BYTES = 32 * 2**20
+
+# Cached audio is played back in frames of this length
+FRAME_MS = 100
+
+
+# --------------------------
+# SCRIPTED LINES
+# --------------------------
+
+def _words(text: str) -> list[str]:
+    return re.findall(r"[\w']+", text.replace("’", "'").casefold())
+
+
+class ScriptedLines:
+    """
+    Matches the start of a streamed reply against lines spoken word for
+    word, ignoring case, spacing and punctuation.
+    """
+
+    def __init__(self, lines) -> None:
+        self._lines = [
+            (
+                line,
+                " ".join(_words(line)),
+                re.compile(r"\W*" + r"\W+".join(re.escape(word) for word in _words(line)) + r"[^\w\s]*", re.IGNORECASE),
+            )
+            for line in lines
+        ]
+
+    def could_start(self, text: str) -> bool:
+        """True while text may still turn out to begin with a scripted line."""
+        prefix = " ".join(_words(text))
+        return any(normalized.startswith(prefix) for _, normalized, _ in self._lines)
+
+    def match(self, text: str, complete: bool) -> tuple[str, str] | None:
+        """
+        (line, rest of text) if text begins with a whole scripted line.
+        Until the text is complete, something must follow the line, so
+        its closing punctuation is not split from it.
+        """
+        text = text.replace("’", "'")
+        for line, _, pattern in self._lines:
+            match = pattern.match(text)
+            if match and (complete or match.end() < len(text)):
+                return line, text[match.end():]
+        return None
+
+
+_scripted = ScriptedLines(SCRIPTED_LINES)
+
+
+# --------------------------
+# CACHE
+# --------------------------
+
+def cache_key(voice: str, line: str) -> str:
+    return hashlib.sha256(f"{voice}\n{' '.join(_words(line))}".encode()).hexdigest()
+
+
+class CachedAudio:
+    def __init__(self, sample_rate: int, num_channels: int, pcm: bytes) -> None:
+        self.sample_rate = sample_rate
+        self.num_channels = num_channels
+        self.pcm = pcm
+
+    def frames(self) -> list[rtc.AudioFrame]:
+        step = self.sample_rate * FRAME_MS // 1000 * self.num_channels * 2
+        return [
+            rtc.AudioFrame(
+                data=self.pcm[i:i + step],
+                sample_rate=self.sample_rate,
+                num_channels=self.num_channels,
+                samples_per_channel=len(self.pcm[i:i + step]) // (2 * self.num_channels),
+            )
+            for i in range(0, len(self.pcm), step)
+        ]
+
+
+class TTSCache:
+    """
+    Synthesised audio of scripted lines, by voice and normalised text.
+
+    A least-recently-used map in memory (bounded in bytes) sits in front
+    of a directory of WAV files, also bounded in bytes, where the least
+    recently read files are removed first. A line missing from both is
+    synthesised with the session's TTS, streamed as it arrives and
+    stored once complete.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = TTS_CACHE_DIR,
+        max_memory_bytes: int = TTS_CACHE_MEMORY_BYTES,
+        max_disk_bytes: int = TTS_CACHE_DISK_BYTES,
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+
+        self._memory: OrderedDict[str, CachedAudio] = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_lock = threading.Lock()
+        self._writes: set[asyncio.Task] = set()
+
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.wav")
+
+    def _remember(self, key: str, audio: CachedAudio) -> None:
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old.pcm)
+        self._memory[key] = audio
+        self._memory_bytes += len(audio.pcm)
+        while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted.pcm)
+
+    def _read_file(self, key: str) -> CachedAudio | None:
+        """Blocking: load a cached line from disk and mark it as recently used."""
+        path = self._path(key)
+        try:
+            with wave.open(path, "rb") as f:
+                audio = CachedAudio(f.getframerate(), f.getnchannels(), f.readframes(f.getnframes()))
+            os.utime(path)
+        except (OSError, EOFError, wave.Error):
+            return None
+        return audio
+
+    def _write_file(self, key: str, audio: CachedAudio) -> None:
+        """Blocking: store a line on disk, then trim the directory to its budget."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with wave.open(tmp_path, "wb") as f:
+            f.setnchannels(audio.num_channels)
+            f.setsampwidth(2)
+            f.setframerate(audio.sample_rate)
+            f.writeframes(audio.pcm)
+        os.replace(tmp_path, path)
+        self._trim_files()
+
+    def _trim_files(self) -> None:
+        with self._disk_lock:
+            files = []
+            with os.scandir(self.cache_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".wav"):
+                        stat = entry.stat()
+                        files.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_disk_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def preload(self, voice: str, lines=SCRIPTED_LINES) -> int:
+        """Blocking: load the lines already on disk into memory (from prewarm). Returns how many were."""
+        loaded = 0
+        for line in lines:
+            key = cache_key(voice, line)
+            audio = self._read_file(key)
+            if audio is not None:
+                self._remember(key, audio)
+                loaded += 1
+        return loaded
+
+    async def _load(self, key: str) -> CachedAudio | None:
+        audio = self._memory.get(key)
+        if audio is not None:
+            self._memory.move_to_end(key)
+            return audio
+        audio = await run_io(self._read_file, key)
+        if audio is not None:
+            self._remember(key, audio)
+        return audio
+
+    async def frames(self, line: str, voice: str, tts_engine: tts.TTS) -> AsyncIterator[rtc.AudioFrame]:
+        """Audio of a line: from the cache if there, else synthesised (and then cached)."""
+        key = cache_key(voice, line)
+        audio = await self._load(key)
+        if audio is not None:
+            self.hits += 1
+            for frame in audio.frames():
+                yield frame
+            return
+
+        self.misses += 1
+        synthesised = []
+        async for frame in _synthesize(tts_engine, line):
+            synthesised.append(frame)
+            yield frame
+
+        # Only a line played to the end is complete enough to keep
+        if synthesised:
+            first = synthesised[0]
+            audio = CachedAudio(
+                first.sample_rate,
+                first.num_channels,
+                b"".join(frame.data.tobytes() for frame in synthesised),
+            )
+            self._remember(key, audio)
+            task = asyncio.create_task(self._store(key, audio))
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+
+    async def _store(self, key: str, audio: CachedAudio) -> None:
+        try:
+            await run_io(self._write_file, key, audio)
+        except OSError as e:
+            logger.error(f"Failed to write cached TTS audio to {self._path(key)}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "lines_in_memory": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+        }
+
+
+async def _synthesize(tts_engine: tts.TTS, text: str) -> AsyncIterator[rtc.AudioFrame]:
+    if tts_engine.capabilities.streaming:
+        async with tts_engine.stream() as stream:
+            stream.push_text(text)
+            stream.end_input()
+            async for ev in stream:
+                yield ev.frame
+    else:
+        async with tts_engine.synthesize(text) as stream:
+            async for ev in stream:
+                yield ev.frame
+
+
+_cache: TTSCache | None = None
+
+
+def get_tts_cache() -> TTSCache:
+    global _cache
+
+    if _cache is None:
+        _cache = TTSCache()
+    return _cache
+
+
+# --------------------------
+# TTS NODE
+# --------------------------
+
+async def _chain(first: str, rest: AsyncIterator[str], ended: bool) -> AsyncIterator[str]:
+    if first:
+        yield first
+    if not ended:
+        async for chunk in rest:
+            yield chunk
+
+
+async def cached_tts_node(
+    agent: Agent, text: AsyncIterable[str], model_settings: ModelSettings, voice: str
+) -> AsyncIterator[rtc.AudioFrame]:
+    """
+    Agent.tts_node that plays a reply's scripted lines from the TTS cache.
+
+    Text is held back only while the reply may still begin with a scripted
+    line; as soon as it cannot, it goes to the session's TTS as usual.
+    Text after a scripted line is handled the same way.
+    """
+    chunks = text.__aiter__()
+    held = ""
+    ended = False
+    while not ended and _scripted.match(held, complete=False) is None and _scripted.could_start(held):
+        try:
+            held += await anext(chunks)
+        except StopAsyncIteration:
+            ended = True
+
+    match = _scripted.match(held, complete=ended)
+    if match is None:
+        if held.strip() or not ended:
+            async for frame in Agent.default.tts_node(agent, _chain(held, chunks, ended), model_settings):
+                yield frame
+        return
+
+    line, rest = match
+    async for frame in get_tts_cache().frames(line, voice, agent.session.tts):
+        yield frame
+
+    if rest.strip() or not ended:
+        async for frame in cached_tts_node(agent, _chain(rest, chunks, ended), model_settings, voice):
+            yield frame
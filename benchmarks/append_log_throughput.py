@@ -0,0 +1,112 @@
+"""
+Throughput of durable appends to appointments.jsonl-style logs.
+
+Compares the old per-record path (open, append, fsync, close on the
+I/O pool) with the group-committed AppendLogWriter, both with N
+concurrent sessions finishing a booking at the same time.
+
+    python benchmarks/append_log_throughput.py --sessions 200 --records 5
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "agent"))
+
+from persistence import AppendLogWriter, run_io  # noqa: E402
+
+
+RECORD = {
+    "booking_id": 0,
+    "customer_name": "Benchmark Caller",
+    "age": "30",
+    "phone": "9000000000",
+    "address": "1-1, Test Street, Hyderabad",
+    "symptoms": "Fever",
+    "doctor_name": "Dr. Ayesha Khan",
+    "time_slot": "2026-01-01 10:00 AM",
+}
+
+
+def _append_durable(path: str, record: dict) -> None:
+    with open(path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+async def per_record(path: str, sessions: int, records: int) -> float:
+    async def session(n):
+        for i in range(records):
+            await run_io(_append_durable, path, {**RECORD, "booking_id": n * records + i})
+
+    started = time.perf_counter()
+    await asyncio.gather(*(session(n) for n in range(sessions)))
+    return time.perf_counter() - started
+
+
+async def group_commit(path: str, sessions: int, records: int, fsync_policy: str) -> tuple[float, int]:
+    writer = AppendLogWriter(path, fsync_policy=fsync_policy, rotate_daily=False)
+
+    async def session(n):
+        for i in range(records):
+            await writer.append({**RECORD, "booking_id": n * records + i})
+
+    started = time.perf_counter()
+    await asyncio.gather(*(session(n) for n in range(sessions)))
+    elapsed = time.perf_counter() - started
+    writer.close()
+    return elapsed, writer.commits
+
+
+def _count_lines(path: str) -> int:
+    with open(path) as f:
+        return sum(1 for _ in f)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--records", type=int, default=5, help="records appended per session")
+    parser.add_argument("--fsync", default="always", choices=["always", "interval", "never"])
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="append-log-bench-")
+    try:
+        total = args.sessions * args.records
+
+        baseline_path = os.path.join(workdir, "baseline.jsonl")
+        baseline = await per_record(baseline_path, args.sessions, args.records)
+
+        grouped_path = os.path.join(workdir, "grouped.jsonl")
+        grouped, commits = await group_commit(grouped_path, args.sessions, args.records, args.fsync)
+
+        print(json.dumps({
+            "records": total,
+            "per_record": {
+                "elapsed_s": round(baseline, 3),
+                "records_per_s": round(total / baseline, 1),
+                "fsyncs": total,
+                "lines_written": _count_lines(baseline_path),
+            },
+            "group_commit": {
+                "fsync_policy": args.fsync,
+                "elapsed_s": round(grouped, 3),
+                "records_per_s": round(total / grouped, 1),
+                "commits": commits,
+                "records_per_commit": round(total / commits, 1),
+                "lines_written": _count_lines(grouped_path),
+            },
+        }, indent=2))
+
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,219 @@
+"""
+Local stand-in for the part of the S3 API the recording archiver uses
+(multipart uploads, plus HEAD/GET of the finished object), served over
+HTTP on 127.0.0.1 so boto3 talks to it through its normal endpoint_url
+path. Objects and parts are kept on disk, not in memory.
+
+Faults can be injected to exercise retries and resume:
+    fail_rate   fraction of UploadPart requests answered 503 SlowDown
+    down        while True, every request is answered 503
+"""
+import os
+import re
+import uuid
+import random
+import hashlib
+import shutil
+import tempfile
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+
+_PART = re.compile(r"<PartNumber>(\d+)</PartNumber>")
+
+
+class FakeS3:
+    def __init__(self, fail_rate: float = 0.0, seed: int = 1) -> None:
+        self.root = tempfile.mkdtemp(prefix="fake-s3-")
+        self.fail_rate = fail_rate
+        self.down = False
+        self.rng = random.Random(seed)
+
+        self.uploads: dict[str, dict[int, tuple[str, str]]] = {}   # upload ID → part → (path, ETag)
+        self.requests: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(self))
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-s3", daemon=True)
+
+    @property
+    def endpoint_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeS3":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def object_path(self, bucket: str, key: str) -> str:
+        return os.path.join(self.root, "objects", bucket, urllib.parse.quote(key, safe=""))
+
+    def count(self, operation: str) -> None:
+        with self._lock:
+            self.requests[operation] = self.requests.get(operation, 0) + 1
+
+
+def _handler(s3: FakeS3):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args) -> None:
+            pass
+
+        def _route(self):
+            url = urllib.parse.urlsplit(self.path)
+            bucket, _, key = url.path.lstrip("/").partition("/")
+            return bucket, urllib.parse.unquote(key), urllib.parse.parse_qs(url.query, keep_blank_values=True)
+
+        def _body(self) -> bytes:
+            return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        def _save_body(self, path: str) -> str:
+            """Stream the request body to a file; returns its MD5."""
+            digest = hashlib.md5()
+            remaining = int(self.headers.get("Content-Length", 0))
+            with open(path, "wb") as f:
+                while remaining:
+                    chunk = self.rfile.read(min(remaining, 1024 * 1024))
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    digest.update(chunk)
+                    remaining -= len(chunk)
+            return digest.hexdigest()
+
+        def _reply(self, status: int, body: bytes = b"", headers: dict | None = None) -> None:
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if body and self.command != "HEAD":
+                self.wfile.write(body)
+
+        def _error(self, status: int, code: str) -> None:
+            body = f"<Error><Code>{code}</Code><Message>{code}</Message></Error>".encode()
+            self._reply(status, body, {"Content-Type": "application/xml"})
+
+        def _unavailable(self) -> bool:
+            if s3.down:
+                self._body()
+                self._error(503, "ServiceUnavailable")
+                return True
+            return False
+
+        def do_POST(self) -> None:
+            if self._unavailable():
+                return
+            bucket, key, query = self._route()
+            body = self._body()
+            if "uploads" in query:
+                s3.count("CreateMultipartUpload")
+                upload_id = uuid.uuid4().hex
+                with s3._lock:
+                    s3.uploads[upload_id] = {}
+                xml = (
+                    f"<InitiateMultipartUploadResult><Bucket>{bucket}</Bucket><Key>{escape(key)}</Key>"
+                    f"<UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>"
+                )
+                return self._reply(200, xml.encode(), {"Content-Type": "application/xml"})
+
+            upload_id = query.get("uploadId", [""])[0]
+            s3.count("CompleteMultipartUpload")
+            parts = s3.uploads.get(upload_id)
+            if parts is None:
+                return self._error(404, "NoSuchUpload")
+            numbers = [int(n) for n in _PART.findall(body.decode())]
+            if not numbers or any(n not in parts for n in numbers):
+                return self._error(400, "InvalidPart")
+
+            path = s3.object_path(bucket, key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".tmp", "wb") as out:
+                for n in sorted(numbers):
+                    with open(parts[n][0], "rb") as part:
+                        shutil.copyfileobj(part, out)
+            os.replace(path + ".tmp", path)
+            for part_path, _ in parts.values():
+                os.remove(part_path)
+            with s3._lock:
+                del s3.uploads[upload_id]
+            xml = f"<CompleteMultipartUploadResult><Bucket>{bucket}</Bucket><Key>{escape(key)}</Key></CompleteMultipartUploadResult>"
+            self._reply(200, xml.encode(), {"Content-Type": "application/xml"})
+
+        def do_PUT(self) -> None:
+            if self._unavailable():
+                return
+            bucket, key, query = self._route()
+            if not key:
+                self._body()
+                s3.count("CreateBucket")
+                return self._reply(200)
+
+            upload_id = query.get("uploadId", [""])[0]
+            s3.count("UploadPart")
+            if upload_id not in s3.uploads or (s3.fail_rate and s3.rng.random() < s3.fail_rate):
+                self._body()
+                if upload_id not in s3.uploads:
+                    return self._error(404, "NoSuchUpload")
+                return self._error(503, "SlowDown")
+
+            number = int(query["partNumber"][0])
+            path = os.path.join(s3.root, f"{upload_id}.{number}")
+            digest = self._save_body(path)
+            with s3._lock:
+                s3.uploads[upload_id][number] = (path, f'"{digest}"')
+            self._reply(200, headers={"ETag": f'"{digest}"'})
+
+        def do_GET(self) -> None:
+            if self._unavailable():
+                return
+            bucket, key, query = self._route()
+            if "uploadId" in query:
+                s3.count("ListParts")
+                parts = s3.uploads.get(query["uploadId"][0])
+                if parts is None:
+                    return self._error(404, "NoSuchUpload")
+                items = "".join(
+                    f"<Part><PartNumber>{n}</PartNumber><ETag>{etag}</ETag>"
+                    f"<Size>{os.path.getsize(path)}</Size></Part>"
+                    for n, (path, etag) in sorted(parts.items())
+                )
+                xml = f"<ListPartsResult><Bucket>{bucket}</Bucket><Key>{escape(key)}</Key><IsTruncated>false</IsTruncated>{items}</ListPartsResult>"
+                return self._reply(200, xml.encode(), {"Content-Type": "application/xml"})
+            self._object(bucket, key)
+
+        def do_HEAD(self) -> None:
+            bucket, key, _ = self._route()
+            self._object(bucket, key)
+
+        def do_DELETE(self) -> None:
+            _, _, query = self._route()
+            s3.count("AbortMultipartUpload")
+            with s3._lock:
+                parts = s3.uploads.pop(query.get("uploadId", [""])[0], {})
+            for path, _ in parts.values():
+                os.remove(path)
+            self._reply(204)
+
+        def _object(self, bucket: str, key: str) -> None:
+            path = s3.object_path(bucket, key)
+            if not os.path.exists(path):
+                return self._error(404, "NoSuchKey")
+            size = os.path.getsize(path)
+            self.send_response(200)
+            self.send_header("Content-Length", str(size))
+            self.end_headers()
+            if self.command == "GET":
+                with open(path, "rb") as f:
+                    shutil.copyfileobj(f, self.wfile)
+
+    return Handler
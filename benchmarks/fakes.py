@@ -0,0 +1,269 @@
+"""
+Local stand-ins for the services a call depends on, so an AgentSession
+can run on a CPU-only box with no network:
+
+    SilentAudioInput   caller's microphone: real-time 20 ms frames of silence
+    SinkAudioOutput    caller's speaker: accepts agent audio, reports playout
+    FakeSTT            emits the utterances a script says() as final transcripts
+    ScriptedLLM        answers through a policy: spoken text or tool calls
+    FakeTTS            silent PCM, sized to the text
+
+Latencies of the fake services are configurable, so runs exercise the
+same timing paths (endpointing, TTFT, TTFB, playout) as real calls.
+"""
+import json
+import uuid
+import asyncio
+
+from livekit import rtc
+from livekit.agents import stt, tts, llm, APIConnectOptions
+from livekit.agents.types import DEFAULT_API_CONNECT_OPTIONS, NOT_GIVEN
+from livekit.agents.voice.io import AudioInput, AudioOutput, AudioOutputCapabilities
+
+
+SAMPLE_RATE = 16000
+FRAME_MS = 20
+
+
+# --------------------------
+# AUDIO I/O
+# --------------------------
+
+class SilentAudioInput(AudioInput):
+    """Real-time stream of silent frames, like an open but quiet SIP leg."""
+
+    def __init__(self) -> None:
+        super().__init__(label="silent-input")
+        self._samples = SAMPLE_RATE * FRAME_MS // 1000
+        self._closed = False
+
+    async def __anext__(self) -> rtc.AudioFrame:
+        if self._closed:
+            raise StopAsyncIteration
+        await asyncio.sleep(FRAME_MS / 1000)
+        return rtc.AudioFrame.create(SAMPLE_RATE, 1, self._samples)
+
+    def close(self) -> None:
+        self._closed = True
+
+
+class SinkAudioOutput(AudioOutput):
+    """
+    Discards agent audio. Each segment is reported as played out after
+    its audio duration times `playout_speed` (0 → immediately).
+    """
+
+    def __init__(self, playout_speed: float = 0.0) -> None:
+        super().__init__(label="sink-output", capabilities=AudioOutputCapabilities(pause=False))
+        self.playout_speed = playout_speed
+        self._pushed = 0.0
+        self._capturing = False
+        self._playout: asyncio.Task | None = None
+
+    async def capture_frame(self, frame: rtc.AudioFrame) -> None:
+        await super().capture_frame(frame)
+        self._capturing = True
+        self._pushed += frame.duration
+
+    def flush(self) -> None:
+        super().flush()
+        if not self._capturing:
+            # Nothing was captured, so no segment was opened
+            return
+        duration, self._pushed, self._capturing = self._pushed, 0.0, False
+        self._playout = asyncio.create_task(self._play(duration))
+
+    def clear_buffer(self) -> None:
+        if self._playout is not None and not self._playout.done():
+            self._playout.cancel()
+            self.on_playback_finished(playback_position=0.0, interrupted=True)
+        elif self._capturing:
+            self.on_playback_finished(playback_position=0.0, interrupted=True)
+        self._pushed, self._capturing = 0.0, False
+
+    async def _play(self, duration: float) -> None:
+        await asyncio.sleep(duration * self.playout_speed)
+        self.on_playback_finished(playback_position=duration, interrupted=False)
+
+
+# --------------------------
+# STT
+# --------------------------
+
+class FakeSTT(stt.STT):
+    """Streaming STT that hears exactly what the script says()."""
+
+    def __init__(self, delay: float = 0.1) -> None:
+        super().__init__(capabilities=stt.STTCapabilities(streaming=True, interim_results=False))
+        self.delay = delay
+        self._utterances: asyncio.Queue[str] = asyncio.Queue()
+
+    def say(self, text: str) -> None:
+        self._utterances.put_nowait(text)
+
+    async def _recognize_impl(self, buffer, *, language=NOT_GIVEN, conn_options=DEFAULT_API_CONNECT_OPTIONS):
+        raise NotImplementedError("FakeSTT only streams")
+
+    def stream(self, *, language=NOT_GIVEN, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS):
+        return _FakeRecognizeStream(stt=self, conn_options=conn_options)
+
+
+class _FakeRecognizeStream(stt.RecognizeStream):
+    async def _run(self) -> None:
+        async def drain():
+            async for _ in self._input_ch:
+                pass
+
+        drain_task = asyncio.create_task(drain())
+        next_utterance = None
+        try:
+            while True:
+                next_utterance = asyncio.create_task(self._stt._utterances.get())
+                await asyncio.wait({drain_task, next_utterance}, return_when=asyncio.FIRST_COMPLETED)
+                if not next_utterance.done():
+                    # Audio input closed → the stream is over
+                    next_utterance.cancel()
+                    return
+
+                text = next_utterance.result()
+                self._event_ch.send_nowait(stt.SpeechEvent(type=stt.SpeechEventType.START_OF_SPEECH))
+                self._event_ch.send_nowait(stt.SpeechEvent(type=stt.SpeechEventType.END_OF_SPEECH))
+                # The final transcript trails the end of speech, as with a real streaming STT
+                await asyncio.sleep(self._stt.delay)
+                self._event_ch.send_nowait(stt.SpeechEvent(
+                    type=stt.SpeechEventType.FINAL_TRANSCRIPT,
+                    alternatives=[stt.SpeechData(language="en", text=text, confidence=1.0)],
+                ))
+        finally:
+            drain_task.cancel()
+            if next_utterance is not None:
+                next_utterance.cancel()
+
+
+# --------------------------
+# LLM
+# --------------------------
+
+class Say:
+    def __init__(self, text: str) -> None:
+        self.text = text
+
+
+class Call:
+    def __init__(self, name: str, **arguments) -> None:
+        self.name = name
+        self.arguments = arguments
+
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(chat_ctx: llm.ChatContext) -> int:
+    """Rough prompt size of a chat context (about 4 characters per token)."""
+    chars = 0
+    for item in chat_ctx.items:
+        if item.type == "message":
+            chars += len(item.text_content or "")
+        elif item.type == "function_call":
+            chars += len(item.name) + len(item.arguments)
+        elif item.type == "function_call_output":
+            chars += len(item.output)
+    return chars // CHARS_PER_TOKEN
+
+
+class ScriptedLLM(llm.LLM):
+    """
+    LLM whose every reply is decided by `policy(chat_ctx)`, returning a
+    Say (streamed word by word) or a Call (one tool call).
+
+    Reports estimated prompt tokens as usage; TTFT grows by
+    `ttft_per_1k_tokens` per thousand of them, like a real model's prefill.
+    """
+
+    def __init__(self, policy, ttft: float = 0.3, token_interval: float = 0.01, ttft_per_1k_tokens: float = 0.0) -> None:
+        super().__init__()
+        self.policy = policy
+        self.ttft = ttft
+        self.token_interval = token_interval
+        self.ttft_per_1k_tokens = ttft_per_1k_tokens
+
+    def chat(self, *, chat_ctx, tools=None, conn_options=DEFAULT_API_CONNECT_OPTIONS, **kwargs):
+        return _ScriptedLLMStream(self, chat_ctx=chat_ctx, tools=tools or [], conn_options=conn_options)
+
+
+class _ScriptedLLMStream(llm.LLMStream):
+    async def _run(self) -> None:
+        request_id = uuid.uuid4().hex
+        prompt_tokens = estimate_tokens(self._chat_ctx)
+        await asyncio.sleep(self._llm.ttft + self._llm.ttft_per_1k_tokens * prompt_tokens / 1000)
+        step = self._llm.policy(self._chat_ctx)
+
+        if isinstance(step, Call):
+            completion_tokens = 1
+            self._event_ch.send_nowait(llm.ChatChunk(
+                id=request_id,
+                delta=llm.ChoiceDelta(role="assistant", tool_calls=[llm.FunctionToolCall(
+                    name=step.name,
+                    arguments=json.dumps(step.arguments),
+                    call_id=f"call_{uuid.uuid4().hex[:12]}",
+                )]),
+            ))
+        else:
+            words = step.text.split(" ")
+            completion_tokens = len(words)
+            for i, word in enumerate(words):
+                if i:
+                    await asyncio.sleep(self._llm.token_interval)
+                self._event_ch.send_nowait(llm.ChatChunk(
+                    id=request_id,
+                    delta=llm.ChoiceDelta(role="assistant", content=word if i == 0 else " " + word),
+                ))
+
+        self._event_ch.send_nowait(llm.ChatChunk(
+            id=request_id,
+            usage=llm.CompletionUsage(
+                completion_tokens=completion_tokens,
+                prompt_tokens=prompt_tokens,
+                total_tokens=prompt_tokens + completion_tokens,
+            ),
+        ))
+
+
+# --------------------------
+# TTS
+# --------------------------
+
+class FakeTTS(tts.TTS):
+    """Non-streaming TTS returning silence at `seconds_per_char` of audio per character."""
+
+    def __init__(self, ttfb: float = 0.15, seconds_per_char: float = 0.06, sample_rate: int = 24000) -> None:
+        super().__init__(
+            capabilities=tts.TTSCapabilities(streaming=False),
+            sample_rate=sample_rate,
+            num_channels=1,
+        )
+        self.ttfb = ttfb
+        self.seconds_per_char = seconds_per_char
+
+    def synthesize(self, text: str, *, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS):
+        return _FakeChunkedStream(tts=self, input_text=text, conn_options=conn_options)
+
+
+class _FakeChunkedStream(tts.ChunkedStream):
+    async def _run(self, output_emitter: tts.AudioEmitter) -> None:
+        await asyncio.sleep(self._tts.ttfb)
+        output_emitter.initialize(
+            request_id=uuid.uuid4().hex,
+            sample_rate=self._tts.sample_rate,
+            num_channels=1,
+            mime_type="audio/pcm",
+        )
+
+        # 100 ms chunks of 16-bit silence
+        samples = int(len(self._input_text) * self._tts.seconds_per_char * self._tts.sample_rate)
+        chunk = self._tts.sample_rate // 10
+        while samples > 0:
+            n = min(chunk, samples)
+            output_emitter.push(bytes(n * 2))
+            samples -= n
+        output_emitter.flush()
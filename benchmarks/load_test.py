@@ -0,0 +1,442 @@
+"""
+Offline load test: how many concurrent calls can one worker process carry?
+
+Runs N scripted booking calls in parallel through the real VoiceAssistant
+agent, AgentSession pipeline and functions.py tools, with local fakes for
+the caller's audio, Deepgram, OpenAI and ElevenLabs (benchmarks/fakes.py).
+No network, no LiveKit server, no GPU. Inventory, IDs and logs live in a
+temporary directory.
+
+Every call: greeting → "I need a <specialist> on <day> around <time>"
+(find_available_slots) → caller's details (save_appointment, retrying
+the offered alternatives on conflict) → goodbye.
+
+Reports calls and turns per second, event-loop lag, memory per session,
+per-turn latency (mouth-to-ear, tools, ...) and booking correctness:
+unique booking IDs, no slot booked twice, appointments.jsonl and the
+inventory agreeing with what callers were told, and every call's summary
+indexed with its booking.
+
+With --admission every call is first offered to the worker's admission
+control (agent/admission.py), which sees this process's loop lag and
+in-flight I/O, CPU and the calls in progress; calls it turns away are
+counted as rejected (another worker would take them) and not run. Latency
+is then that of the admitted calls, which should hold steady as the
+offered load steps up, while the rejected count grows instead. The run
+fails if the loop stalled but admission control never saw any loop lag
+(`python agent/admission.py` checks the job-process reporting path).
+
+    python benchmarks/load_test.py --sessions 10,50,100
+    python benchmarks/load_test.py --sessions 20,100,200 --admission
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import datetime
+import tempfile
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "agent"))
+
+from livekit.agents import AgentSession  # noqa: E402
+from livekit.agents.metrics import LLMMetrics  # noqa: E402
+
+from fakes import SilentAudioInput, SinkAudioOutput, FakeSTT, ScriptedLLM, FakeTTS, Say, Call  # noqa: E402
+import ids  # noqa: E402
+import latency  # noqa: E402
+import inventory  # noqa: E402
+import records  # noqa: E402
+import idempotency  # noqa: E402
+import flows  # noqa: E402
+import tts_cache  # noqa: E402
+from prefetch import AvailabilityPrefetcher  # noqa: E402
+import persistence  # noqa: E402
+import summaries  # noqa: E402
+import admission  # noqa: E402
+from agent import VoiceAssistant  # noqa: E402
+from prompt import SESSION_GREETING, GREETINGS, GOODBYE_MESSAGE  # noqa: E402
+from slots import parse_slot  # noqa: E402
+
+
+MAX_BOOKING_ATTEMPTS = 3
+
+
+class BookingCall:
+    """Caller script plus the LLM policy that plays the assistant's side of it."""
+
+    def __init__(self, n: int, rng: random.Random, specialists: list[str]) -> None:
+        self.n = n
+        self.specialist = specialists[n % len(specialists)]
+        self.date = (datetime.date.today() + datetime.timedelta(days=rng.randint(1, 7))).isoformat()
+        self.preferred_time = f"{rng.randint(9, 16)}:00"
+        self.phone = f"9{n:09d}"
+
+        self.offered: list[dict] = []
+        self.attempts = 0
+        self.booking_id: int | None = None
+        self.booked: dict | None = None
+        self.rejected = False
+
+    def utterances(self) -> list[str]:
+        return [
+            f"I need a {self.specialist.replace('_', ' ')} on {self.date} around {self.preferred_time}.",
+            f"Yes please. My name is Caller {self.n}, I am 30, phone {self.phone}, address {self.n} Test Street. I have a fever.",
+            "No, that's all. Thank you.",
+        ]
+
+    def __call__(self, chat_ctx):
+        items = chat_ctx.items
+        last = items[-1] if items else None
+        if last is not None and last.type == "function_call_output":
+            return self._after_tool(last)
+
+        user_turns = sum(1 for item in items if item.type == "message" and item.role == "user")
+        if user_turns == 0:
+            return Say(GREETINGS[self.n % len(GREETINGS)])
+        if user_turns == 1:
+            return Call(
+                "find_available_slots",
+                specialist=self.specialist,
+                date=self.date,
+                preferred_time=self.preferred_time,
+            )
+        if user_turns == 2 and self.offered:
+            return self._book(self.offered[0])
+        return Say(GOODBYE_MESSAGE)
+
+    def _after_tool(self, output):
+        if output.name == "find_available_slots":
+            result = json.loads(output.output)
+            self.offered = result.get("slots") or result.get("nearest_outside_request", [])
+            if not self.offered:
+                return Say("I'm sorry, there are no free slots. Anything else?")
+            slot = self.offered[0]
+            return Say(f"{slot['doctor_name']} is available on {slot['time_slot']}. Shall I book it?")
+
+        if output.name == "save_appointment":
+            if output.output.isdigit():
+                self.booking_id = int(output.output)
+                return Say(f"Your booking has been confirmed. Your booking ID is {self.booking_id}.")
+            try:
+                alternatives = json.loads(output.output).get("alternatives", [])
+            except ValueError:
+                alternatives = []
+            if alternatives and self.attempts < MAX_BOOKING_ATTEMPTS:
+                return self._book(alternatives[0])
+            self.booked = None
+            return Say("I'm sorry, I am unable to confirm your booking right now.")
+
+        return Say("Okay.")
+
+    def _book(self, slot: dict):
+        self.attempts += 1
+        self.booked = slot
+        return Call(
+            "save_appointment",
+            customer_name=f"Caller {self.n}",
+            age="30",
+            phone=self.phone,
+            address=f"{self.n} Test Street",
+            symptoms="Fever",
+            doctor_name=slot["doctor_name"],
+            time_slot=slot["time_slot"],
+            doctor_id=slot["doctor_id"],
+        )
+
+
+async def run_call(n: int, call: BookingCall, args, stats: Counter) -> None:
+    fake_stt = FakeSTT(delay=args.stt_delay)
+    audio_input = SilentAudioInput()
+    session = AgentSession(
+        stt=fake_stt,
+        llm=ScriptedLLM(call, ttft=args.llm_ttft, ttft_per_1k_tokens=args.llm_ttft_per_1k_tokens),
+        tts=FakeTTS(ttfb=args.tts_ttfb),
+        turn_detection="stt",
+    )
+    session.input.audio = audio_input
+    session.output.audio = SinkAudioOutput(playout_speed=args.playout_speed)
+
+    # One reply is done when the agent goes back from speaking to listening
+    replies: asyncio.Queue = asyncio.Queue()
+
+    def on_agent_state(ev):
+        if ev.old_state == "speaking" and ev.new_state == "listening":
+            replies.put_nowait(ev.created_at)
+
+    def on_metrics(ev):
+        if isinstance(ev.metrics, LLMMetrics) and not ev.metrics.cancelled:
+            stats["llm_requests"] += 1
+            stats["prompt_tokens"] += ev.metrics.prompt_tokens
+
+    session.on("agent_state_changed", on_agent_state)
+    session.on("metrics_collected", on_metrics)
+    tracer = latency.TurnTracer(session, f"load-{n}", job_started_at=time.time())
+    tracer.attach()
+    prefetcher = AvailabilityPrefetcher(session, f"load-{n}")
+    if args.prefetch:
+        prefetcher.attach()
+    recorder = summaries.CallSummaryRecorder(session, f"load-{n}")
+    recorder.attach()
+
+    try:
+        await session.start(agent=VoiceAssistant(tts_voice="fake"), record=False)
+        session.generate_reply(instructions=SESSION_GREETING)
+        await asyncio.wait_for(replies.get(), args.turn_timeout)
+
+        for utterance in call.utterances():
+            fake_stt.say(utterance)
+            await asyncio.wait_for(replies.get(), args.turn_timeout)
+            stats["turns"] += 1
+        stats["completed"] += 1
+
+    except asyncio.TimeoutError:
+        stats["timed_out"] += 1
+    finally:
+        audio_input.close()
+        await session.aclose()
+        if args.prefetch:
+            await prefetcher.close()
+            stats["prefetch_saved_ms"] += prefetcher.cache.saved_seconds * 1000
+        await tracer.close()
+        await recorder.close()
+
+
+def _rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+async def _track_peak_rss(peak: list) -> None:
+    while True:
+        peak[0] = max(peak[0], _rss_bytes())
+        await asyncio.sleep(0.2)
+
+
+def _isolate(workdir: str) -> None:
+    """
+    Point inventory, ID allocation and the record logs at a scratch
+    directory, with fresh idempotency and latency state, so each load
+    level starts from scratch (callers repeat across levels).
+    """
+    shutil.copy(inventory.DOCTORS_FILE_PATH, os.path.join(workdir, "doctors.json"))
+    inv = inventory.SlotInventory(
+        os.path.join(workdir, "doctors.json"),
+        os.path.join(workdir, "doctors.journal.jsonl"),
+        os.path.join(workdir, "doctors.lock"),
+    )
+    inv.load()
+    inventory._inventory = inv
+    ids._allocator = ids.IdAllocator(os.path.join(workdir, "ids.json"))
+    records._indexes.clear()
+    idempotency._cache = idempotency.IdempotencyCache()
+    latency._registry = None
+    tts_cache._cache = None
+    summaries._writer = None
+    os.chdir(workdir)
+
+
+def _release(workdir: str) -> None:
+    """Stop the latency flusher and close the append logs of a finished level."""
+    registry = latency._registry
+    if registry is not None and registry._flush_task is not None:
+        registry._flush_task.cancel()
+    if summaries._writer is not None:
+        summaries._writer.close()
+    for path, writer in list(persistence._append_logs.items()):
+        if path.startswith(workdir):
+            writer.close()
+            del persistence._append_logs[path]
+
+
+def _check_bookings(workdir: str, calls: list[BookingCall]) -> dict:
+    booked = [call for call in calls if call.booking_id is not None]
+    booking_ids = [call.booking_id for call in booked]
+
+    index = records.get_appointment_index()
+    mismatched = 0
+    for call in booked:
+        record = index.get(call.booking_id)
+        if record is None or (record["doctor_id"], record["time_slot"]) != (
+            call.booked["doctor_id"], call.booked["time_slot"]
+        ):
+            mismatched += 1
+
+    saved = []
+    if os.path.exists(records.APPOINTMENTS_FILE_PATH):
+        with open(records.APPOINTMENTS_FILE_PATH) as f:
+            saved = [json.loads(line) for line in f if line.strip()]
+    held = Counter((r["doctor_id"], parse_slot(r["time_slot"])) for r in saved)
+
+    # A fresh process replaying the journal must see every booked slot as taken
+    fresh = inventory.SlotInventory(
+        os.path.join(workdir, "doctors.json"),
+        os.path.join(workdir, "doctors.journal.jsonl"),
+        os.path.join(workdir, "doctors.lock"),
+    )
+    fresh.load()
+    free_but_booked = sum(1 for doctor, slot in held if fresh.has_slot(doctor, slot))
+
+    return {
+        "booked": len(booked),
+        "not_booked": len(calls) - len(booked),
+        "save_attempts": sum(call.attempts for call in calls),
+        "duplicate_ids": len(booking_ids) - len(set(booking_ids)),
+        "double_booked": sum(1 for count in held.values() if count > 1),
+        "records_mismatched": mismatched,
+        "records_saved": len(saved),
+        "inventory_consistent": free_but_booked == 0 and len(saved) == len(booked),
+    }
+
+
+def _check_summaries(calls: list[BookingCall]) -> dict:
+    """Every call's summary indexed under its caller's phone, with the booking it made."""
+    summaries.get_summary_writer().close()
+    index = summaries.SummaryIndex()
+    started = time.perf_counter()
+    found = [index.find(phone=call.phone) for call in calls]
+    lookup_ms = (time.perf_counter() - started) * 1000 / max(len(calls), 1)
+
+    missing_booking = 0
+    for call, entries in zip(calls, found):
+        if call.booking_id is not None and not any(call.booking_id in entry["booking_ids"] for entry in entries):
+            missing_booking += 1
+    sizes = [entry["length"] for entries in found for entry in entries]
+    return {
+        "indexed": len(index.find()),
+        "missing_booking": missing_booking,
+        "mean_compressed_bytes": round(sum(sizes) / max(len(sizes), 1)),
+        "lookup_by_phone_ms": round(lookup_ms, 3),
+    }
+
+
+async def run_level(sessions: int, args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="load-test-")
+    cwd = os.getcwd()
+    try:
+        _isolate(workdir)
+        rng = random.Random(args.seed)
+        specialists = args.specialists or inventory.get_inventory().specialties()
+        calls = [BookingCall(n, rng, specialists) for n in range(sessions)]
+        stats: Counter = Counter()
+
+        monitor = persistence.LoopStallMonitor()
+        monitor.start()
+        baseline = _rss_bytes()
+        peak = [baseline]
+        rss_task = asyncio.create_task(_track_peak_rss(peak))
+        controller = admission.AdmissionController(local_monitor=monitor) if args.admission else None
+        active = [0]
+        peak_load: list[admission.LoadSignals] = []
+        max_lag = [0.0]
+
+        async def start_later(n, call):
+            await asyncio.sleep(args.ramp * n / max(sessions, 1))
+            if controller is not None:
+                admitted = controller.admit(active[0])
+                if not peak_load or controller.last.load() > peak_load[0].load():
+                    peak_load[:] = [controller.last]
+                max_lag[0] = max(max_lag[0], controller.last.loop_lag)
+                if not admitted:
+                    call.rejected = True
+                    return
+            active[0] += 1
+            try:
+                await run_call(n, call, args, stats)
+            finally:
+                active[0] -= 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(start_later(n, call) for n, call in enumerate(calls)))
+        elapsed = time.perf_counter() - started
+
+        rss_task.cancel()
+        await monitor.stop()
+        calls = [call for call in calls if not call.rejected]
+
+        correctness = _check_bookings(workdir, calls)
+        summary_check = _check_summaries(calls)
+        summary = latency.get_latency_registry().summary("all")
+        counters = latency.get_latency_registry().counters()
+
+        return {
+            "sessions": sessions,
+            "admission": {
+                "admitted": controller.accepted,
+                "rejected": controller.rejected,
+                "peak_load": peak_load[0].as_dict() if peak_load else None,
+                "max_loop_lag_ms": round(max_lag[0] * 1000, 1),
+            } if controller is not None else None,
+            "completed": stats["completed"],
+            "timed_out": stats["timed_out"],
+            "elapsed_s": round(elapsed, 2),
+            "calls_per_s": round(stats["completed"] / elapsed, 2),
+            "turns_per_s": round(stats["turns"] / elapsed, 2),
+            "prompt_tokens_per_request": round(stats["prompt_tokens"] / max(stats["llm_requests"], 1)),
+            "loop_lag": monitor.stats(),
+            "memory": {
+                "baseline_mb": round(baseline / 2**20, 1),
+                "peak_mb": round(peak[0] / 2**20, 1),
+                "per_session_kb": round((peak[0] - baseline) / 1024 / max(len(calls), 1), 1),
+            },
+            "latency_ms": summary,
+            "tts_cache": tts_cache.get_tts_cache().stats(),
+            "availability_prefetch": {
+                "hits": counters.get("availability_prefetch_hits", 0),
+                "misses": counters.get("availability_prefetch_misses", 0),
+                "saved_ms": round(stats["prefetch_saved_ms"], 1),
+            },
+            "bookings": correctness,
+            "call_summaries": summary_check,
+        }
+    finally:
+        _release(workdir)
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", default="20", help="concurrent calls; comma-separated to step the load up")
+    parser.add_argument("--ramp", type=float, default=2.0, help="seconds over which calls are started")
+    parser.add_argument("--stt-delay", type=float, default=0.1, help="end of speech → final transcript")
+    parser.add_argument("--llm-ttft", type=float, default=0.3)
+    parser.add_argument("--llm-ttft-per-1k-tokens", type=float, default=0.0, help="extra TTFT per 1000 prompt tokens")
+    parser.add_argument("--no-prefetch", dest="prefetch", action="store_false", help="don't prefetch availability")
+    parser.add_argument("--full-prompt", action="store_true", help="send every flow's instructions on every turn")
+    parser.add_argument("--tts-ttfb", type=float, default=0.15)
+    parser.add_argument("--playout-speed", type=float, default=0.0, help="1.0 plays agent audio in real time")
+    parser.add_argument("--turn-timeout", type=float, default=30.0)
+    parser.add_argument("--specialists", type=lambda s: s.split(","), help="default: every specialty in doctors.json")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--admission", action="store_true", help="offer each call to admission control first")
+    parser.add_argument("--max-sessions", type=int, help="ADMISSION_MAX_SESSIONS for this run")
+    args = parser.parse_args()
+    flows.FLOW_PROMPTS = not args.full_prompt
+    if args.max_sessions:
+        admission.ADMISSION_MAX_SESSIONS = args.max_sessions
+
+    results = []
+    for sessions in (int(n) for n in args.sessions.split(",")):
+        results.append(await run_level(sessions, args))
+        print(json.dumps(results[-1], indent=2), flush=True)
+
+    if any(
+        r["bookings"]["duplicate_ids"] or r["bookings"]["double_booked"]
+        or r["bookings"]["records_mismatched"] or not r["bookings"]["inventory_consistent"]
+        for r in results
+    ):
+        sys.exit(1)
+
+    # The loop stalled, so the admission signal must have seen some lag
+    if any(r["admission"] and r["loop_lag"]["stalls"] and not r["admission"]["max_loop_lag_ms"] for r in results):
+        print("Admission control saw no loop lag although the loop stalled", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,162 @@
+"""
+Recording archiver: throughput, memory and resume.
+
+Writes a recording of --size-mb random bytes (a long call), spools it to
+the RecordingArchiver and uploads it to a local S3 stand-in
+(benchmarks/fake_s3.py), or to --endpoint-url, e.g. a local MinIO.
+Reports upload time, peak memory growth against the part size, and
+whether the stored object matches the recording byte for byte.
+
+With --outage-after N the stand-in goes down once N parts are stored.
+The upload fails, keeps its manifest, and a fresh archiver (as after a
+worker restart) resumes it with resume_pending(), uploading only the
+missing parts. --fail-rate makes that fraction of part uploads answer
+503 to exercise retries.
+
+    python benchmarks/recording_upload.py --size-mb 200
+    python benchmarks/recording_upload.py --size-mb 100 --outage-after 5 --fail-rate 0.1
+"""
+import os
+import sys
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import threading
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "agent"))
+
+import recordings  # noqa: E402
+from recordings import RecordingArchiver  # noqa: E402
+from fake_s3 import FakeS3  # noqa: E402
+
+
+MB = 1024 * 1024
+
+
+def _write_recording(path: str, size: int) -> str:
+    digest = hashlib.md5()
+    with open(path, "wb") as f:
+        remaining = size
+        while remaining:
+            chunk = os.urandom(min(remaining, MB))
+            f.write(chunk)
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+def _stored_md5(archiver: RecordingArchiver, key: str) -> str:
+    digest = hashlib.md5()
+    body = archiver.client.get_object(Bucket=archiver.bucket, Key=key)["Body"]
+    for chunk in iter(lambda: body.read(MB), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _archiver(args, endpoint_url: str, spool_dir: str) -> RecordingArchiver:
+    return RecordingArchiver(
+        bucket=args.bucket,
+        spool_dir=spool_dir,
+        endpoint_url=endpoint_url,
+        part_size=args.part_mb * MB,
+        concurrency=args.concurrency,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=200, help="size of the recording")
+    parser.add_argument("--part-mb", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--endpoint-url", help="S3-compatible endpoint; default: start the local stand-in")
+    parser.add_argument("--bucket", default="healthline-recordings")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="stand-in only: share of parts answered 503")
+    parser.add_argument("--outage-after", type=int, default=0, help="stand-in only: go down after N parts")
+    args = parser.parse_args()
+
+    # A failed upload is left to the restarted archiver below, not retried in place
+    recordings.RECORDING_RETRY_AFTER = 3600.0
+
+    fake = None
+    endpoint_url = args.endpoint_url
+    if endpoint_url is None:
+        fake = FakeS3(fail_rate=args.fail_rate).start()
+        endpoint_url = fake.endpoint_url
+        # The stand-in accepts any credentials
+        os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+        os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+
+    workdir = tempfile.mkdtemp(prefix="recording-upload-")
+    spool_dir = os.path.join(workdir, "spool")
+    try:
+        archiver = _archiver(args, endpoint_url, spool_dir)
+        try:
+            archiver.client.create_bucket(Bucket=args.bucket)
+        except archiver.client.exceptions.BucketAlreadyOwnedByYou:
+            pass
+
+        source = os.path.join(workdir, "audio.ogg")
+        expected = _write_recording(source, args.size_mb * MB)
+        key = recordings.recording_key("benchmark-room", time.time())
+
+        if fake is not None and args.outage_after:
+            def outage():
+                while fake.requests.get("UploadPart", 0) < args.outage_after:
+                    time.sleep(0.01)
+                fake.down = True
+            threading.Thread(target=outage, daemon=True).start()
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        archiver.spool(source, key)
+        archiver.wait_idle()
+        elapsed = time.perf_counter() - started
+        first_run = {"uploaded": archiver.uploaded, "failed": archiver.failed, "mib": round(archiver.bytes_uploaded / MB, 1)}
+        archiver.close()
+
+        resumed = None
+        if archiver.uploaded == 0:
+            # Worker restart: a new archiver picks the recording up from its manifest
+            if fake is not None:
+                fake.down = False
+            parts_before = fake.requests.get("UploadPart", 0) if fake else 0
+            archiver = _archiver(args, endpoint_url, spool_dir)
+            started = time.perf_counter()
+            pending = archiver.resume_pending()
+            archiver.wait_idle()
+            elapsed += time.perf_counter() - started
+            resumed = {
+                "pending": pending,
+                "uploaded": archiver.uploaded,
+                "mib": round(archiver.bytes_uploaded / MB, 1),
+                "part_requests": (fake.requests.get("UploadPart", 0) - parts_before) if fake else None,
+            }
+            archiver.close()
+
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        stored = _stored_md5(archiver, key)
+        print(f"recording:          {args.size_mb} MiB in {args.part_mb} MiB parts, {args.concurrency} in flight")
+        print(f"upload:             {elapsed:.2f}s ({args.size_mb / elapsed:.0f} MiB/s)")
+        print(f"peak traced memory: {peak / MB:.1f} MiB (bound: {(args.concurrency + 1) * args.part_mb} MiB)")
+        print(f"first run:          {first_run}")
+        if resumed is not None:
+            print(f"resumed:            {resumed}")
+        if fake is not None:
+            print(f"S3 requests:        {fake.requests}")
+        print(f"object matches:     {stored == expected}")
+        print(f"spool empty:        {not os.listdir(spool_dir)}")
+        if stored != expected or os.listdir(spool_dir):
+            sys.exit(1)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        if fake is not None:
+            fake.stop()
+
+
+if __name__ == "__main__":
+    main()
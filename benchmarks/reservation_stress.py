@@ -0,0 +1,118 @@
+"""
+Stress benchmark for SlotInventory.reserve().
+
+Spawns several worker processes, each firing many concurrent bookings
+(asyncio tasks dispatched onto threads) at the same small set of slots,
+then checks that every slot was claimed at most once and that the
+journal agrees with what the callers were told.
+
+    python benchmarks/reservation_stress.py --processes 4 --bookings 200
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+import multiprocessing
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "agent"))
+
+from inventory import DOCTORS_FILE_PATH, SlotInventory  # noqa: E402
+from slots import parse_slot  # noqa: E402
+
+
+def _paths(workdir: str) -> dict:
+    return {
+        "doctors_path": os.path.join(workdir, "doctors.json"),
+        "journal_path": os.path.join(workdir, "doctors.journal.jsonl"),
+        "lock_path": os.path.join(workdir, "doctors.lock"),
+    }
+
+
+def _candidate_slots(workdir: str, specialty: str) -> list[tuple[str, int]]:
+    inventory = SlotInventory(**_paths(workdir))
+    slots = []
+    for doctor in inventory.doctors_for(specialty):
+        for slot_date, times in doctor["available_slots"].items():
+            for slot_time in times:
+                slots.append((doctor["doctor_name"], parse_slot(f"{slot_date} {slot_time}")))
+    return slots
+
+
+def _worker(workdir: str, slots: list, bookings: int, compact_every: int, seed: int, out) -> None:
+    inventory = SlotInventory(**_paths(workdir), compact_every=compact_every)
+    inventory.load()
+    rng = random.Random(seed)
+
+    async def run() -> list:
+        async def one(slot):
+            reservation = await asyncio.to_thread(inventory.reserve, *slot)
+            return list(slot) if reservation.ok else None
+
+        results = await asyncio.gather(*(one(rng.choice(slots)) for _ in range(bookings)))
+        return [r for r in results if r is not None]
+
+    out.put(asyncio.run(run()))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--bookings", type=int, default=200, help="bookings fired per process")
+    parser.add_argument("--specialty", default="cardiologist")
+    parser.add_argument("--compact-every", type=int, default=25, help="low, to exercise compaction under contention")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="reservation-stress-")
+    try:
+        shutil.copy(DOCTORS_FILE_PATH, _paths(workdir)["doctors_path"])
+        slots = _candidate_slots(workdir, args.specialty)
+
+        out = multiprocessing.Queue()
+        workers = [
+            multiprocessing.Process(
+                target=_worker,
+                args=(workdir, slots, args.bookings, args.compact_every, seed, out),
+            )
+            for seed in range(args.processes)
+        ]
+
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        claimed = [tuple(slot) for _ in workers for slot in out.get()]
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        attempts = args.processes * args.bookings
+        double_booked = [slot for slot, count in Counter(claimed).items() if count > 1]
+
+        # What is left in the inventory must be exactly the slots nobody was told they got
+        final = set(_candidate_slots(workdir, args.specialty))
+        expected = set(slots) - set(claimed)
+
+        print(json.dumps({
+            "attempts": attempts,
+            "claimed": len(claimed),
+            "distinct_slots": len(slots),
+            "double_booked": len(double_booked),
+            "inventory_consistent": final == expected,
+            "elapsed_s": round(elapsed, 3),
+            "bookings_per_s": round(attempts / elapsed, 1),
+        }, indent=2))
+
+        if double_booked or final != expected:
+            sys.exit(1)
+
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()